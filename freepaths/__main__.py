@@ -6,6 +6,9 @@ from colorama import Fore, Style
 
 import freepaths.main_tracing
 import freepaths.main_mfp_sampling
+import freepaths.main_temperature_sweep
+import freepaths.main_cell_transfer
+import freepaths.main_ballistic_transmission
 
 __version__ = "2.1"
 
@@ -19,6 +22,10 @@ parser = argparse.ArgumentParser(
                 )
 parser.add_argument('input_file', nargs='?', default=None, help='The input file')
 parser.add_argument("-s", "--sampling", help="Run in MFP sampling mode", action="store_true")
+parser.add_argument("-d", "--deviational", help="Run in deviational mode", action="store_true")
+parser.add_argument("-t", "--temperatures", help="Run in temperature sweep mode", action="store_true")
+parser.add_argument("-c", "--cells", help="Run in cell transfer mode", action="store_true")
+parser.add_argument("-b", "--ballistic", help="Run in ballistic transmission mode", action="store_true")
 args = parser.parse_args()
 
 
@@ -27,6 +34,14 @@ def run():
     print(f"\n{Fore.BLUE}FreePATHS v{__version__}{Style.RESET_ALL}")
     if args.sampling:
         freepaths.main_mfp_sampling.main(args.input_file)
+    elif args.temperatures:
+        freepaths.main_temperature_sweep.main(args.input_file)
+    elif args.cells:
+        freepaths.main_cell_transfer.main(args.input_file)
+    elif args.ballistic:
+        freepaths.main_ballistic_transmission.main(args.input_file)
+    elif args.deviational:
+        freepaths.main_tracing.main(args.input_file, deviational=True)
     else:
         freepaths.main_tracing.main(args.input_file)
 
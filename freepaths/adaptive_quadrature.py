@@ -0,0 +1,166 @@
+"""
+Module that integrates the phonon dispersion adaptively in the MFP sampling mode.
+We start from a coarse grid of wavevectors and trace phonons at the two Gauss-Legendre nodes of each interval.
+These wavevectors are the same in every run, so these phonons can be taken from the MFP cache.
+Then, phonons at random wavevectors are added only to the interval with the largest error. If this error is caused
+by the variation of the integrand across the interval rather than by the spread of mean free paths,
+the interval is bisected and its phonons are distributed between the halves.
+Phonons added during the refinement are always traced, because the MFP cache would return
+phonons of a nearby frequency for them and underestimate the spread of mean free paths.
+"""
+
+from math import pi, sqrt
+from random import random
+import numpy as np
+
+from freepaths.config import cf
+from freepaths.phonon import Phonon
+from freepaths.temperature_sweep import heat_capacity
+
+PHONONS_PER_NEW_INTERVAL = 2
+QUADRATURE_NODES = (0.5 - sqrt(3) / 6, 0.5 + sqrt(3) / 6)  # Gauss-Legendre nodes as fractions of the interval
+
+
+class Interval:
+    """Interval of wavevectors with phonons traced at various wavevectors within it"""
+
+    def __init__(self, k_start, k_end):
+        """Initialize an empty interval"""
+        self.k_start = k_start
+        self.k_end = k_end
+        self.samples = []
+
+    @property
+    def d_k(self):
+        """Width of the interval"""
+        return self.k_end - self.k_start
+
+    @property
+    def k_center(self):
+        """Wavevector in the center of the interval"""
+        return (self.k_start + self.k_end) / 2
+
+    @property
+    def weights(self):
+        """Weights of all phonons traced in this interval"""
+        return np.array([weight for _, _, _, weight, _ in self.samples])
+
+    @property
+    def mean_free_paths(self):
+        """Mean free paths of all phonons traced in this interval"""
+        return np.array([mean_free_path for _, _, _, _, mean_free_path in self.samples])
+
+    @property
+    def contribution(self):
+        """Monte Carlo estimate of the integral over the interval"""
+        return np.mean(self.weights * self.mean_free_paths) * self.d_k
+
+    @property
+    def error(self):
+        """Standard error of the contribution"""
+        return np.std(self.weights * self.mean_free_paths, ddof=1) * self.d_k / sqrt(len(self.samples))
+
+
+class AdaptiveQuadrature:
+    """Adaptive integration of the thermal conductivity over the dispersion of one branch"""
+
+    def __init__(self, material, branch_number, trace):
+        """
+        Initialize the quadrature, where trace(phonon, use_cache) runs a phonon or takes it from the MFP cache
+        and returns its flight and mean free path
+        """
+        self.material = material
+        self.branch_number = branch_number
+        self.trace = trace
+        self.budget = cf.number_of_phonons
+        self.number_of_traced_phonons = 0
+        self.intervals = []
+
+    def frequency(self, k_vector):
+        """Frequency at given wavevectors"""
+        return np.interp(k_vector, self.material.dispersion[:, 0], self.material.dispersion[:, self.branch_number + 1])
+
+    def weight(self, k_vector):
+        """Thermal conductivity per unit mean free path and unit wavevector, Ref. Phys. Rev. 132 2461 (1963)"""
+        k_vector = np.atleast_1d(k_vector)
+        frequencies = self.frequency(k_vector)
+        speeds = self.material.group_velocities(self.branch_number, frequencies)
+        return heat_capacity(frequencies, cf.temp) * speeds * k_vector**2 / (6 * pi**2)
+
+    def add_sample(self, interval, position=None, use_cache=False):
+        """Trace one more phonon at given position within the interval, as a fraction of its width, or at a random one"""
+        k_vector = interval.k_start + (random() if position is None else position) * interval.d_k
+        phonon = Phonon(self.material, self.branch_number, 0)
+        phonon.f = float(self.frequency(k_vector))
+        phonon.assign_speed(self.material)
+        phonon.assign_internal_scattering_time(self.material)
+        flight, mean_free_path = self.trace(phonon, use_cache)
+        interval.samples.append((phonon, flight, k_vector, float(self.weight(k_vector)[0]), mean_free_path))
+        self.number_of_traced_phonons += 1
+
+    def add_interval(self, k_start, k_end, samples=()):
+        """Create a new interval with given phonons and trace more phonons in it if necessary"""
+        interval = Interval(k_start, k_end)
+        interval.samples = [sample for sample in samples if k_start <= sample[2] < k_end]
+        while len(interval.samples) < PHONONS_PER_NEW_INTERVAL:
+            self.add_sample(interval)
+        self.intervals.append(interval)
+
+    def add_node_interval(self, k_start, k_end):
+        """Create a new interval with phonons at the quadrature nodes, which may be taken from the cache"""
+        interval = Interval(k_start, k_end)
+        for position in QUADRATURE_NODES:
+            self.add_sample(interval, position, use_cache=True)
+        self.intervals.append(interval)
+
+    def is_weight_variation_dominant(self, interval):
+        """Check if the spread of contributions is caused by the variation of the weight rather than of mean free paths"""
+        edge_weights = self.weight(np.array([interval.k_start, interval.k_end]))
+        weight_spread = abs(edge_weights[1] - edge_weights[0]) / sqrt(12) * np.mean(interval.mean_free_paths)
+        mean_free_path_spread = np.mean(interval.weights) * np.std(interval.mean_free_paths, ddof=1)
+        return weight_spread > mean_free_path_spread
+
+    @property
+    def thermal_conductivity(self):
+        """Thermal conductivity of the branch"""
+        return sum(interval.contribution for interval in self.intervals)
+
+    @property
+    def error(self):
+        """Estimated standard error of the thermal conductivity of the branch"""
+        return sqrt(sum(interval.error**2 for interval in self.intervals))
+
+    def integrate(self):
+        """Refine the integration until the tolerance is reached or the phonon budget is spent"""
+        k_max = self.material.dispersion[-1, 0]
+        number_of_intervals = max(1, self.budget // (4 * PHONONS_PER_NEW_INTERVAL))
+        edges = np.linspace(0, k_max, number_of_intervals + 1)
+        for k_start, k_end in zip(edges[:-1], edges[1:]):
+            self.add_node_interval(k_start, k_end)
+
+        while self.number_of_traced_phonons < self.budget:
+            if self.error <= cf.adaptive_quadrature_tolerance * abs(self.thermal_conductivity):
+                break
+
+            # In the interval with the largest error, either add a phonon or bisect the interval:
+            index = int(np.argmax([interval.error for interval in self.intervals]))
+            interval = self.intervals[index]
+            if self.is_weight_variation_dominant(interval):
+                self.intervals.pop(index)
+                self.add_interval(interval.k_start, interval.k_center, interval.samples)
+                self.add_interval(interval.k_center, interval.k_end, interval.samples)
+            else:
+                self.add_sample(interval)
+
+        self.assign_thermal_conductivity_to_flights()
+
+    def assign_thermal_conductivity_to_flights(self):
+        """Distribute the contribution of each interval among its phonons"""
+        for interval in self.intervals:
+            for _, flight, _, weight, mean_free_path in interval.samples:
+                flight.thermal_conductivity = weight * mean_free_path * interval.d_k / len(interval.samples)
+
+    @property
+    def traced_phonons(self):
+        """All phonons and flights traced during the integration"""
+        return [(phonon, flight) for interval in self.intervals for phonon, flight, _, _, _ in interval.samples]
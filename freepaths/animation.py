@@ -6,6 +6,7 @@ import shutil
 import imageio
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import PatchCollection
 
 from freepaths.config import cf
 from freepaths.output_structure import draw_structure_top_view
@@ -29,9 +30,7 @@ def generate_frames_xy():
 
         # Draw the structure:
         patches = draw_structure_top_view(cf, color_back=cf.output_structure_color)
-
-        for patch in patches:
-            ax.add_patch(patch)
+        ax.add_collection(PatchCollection(patches, match_original=True))
 
         # Draw the paths:
         for phonon_num in range(number_of_phonons):
@@ -0,0 +1,125 @@
+"""
+Module that selects time parameters of the simulation automatically.
+The timestep is derived from the smallest feature of the structure and the maximum group velocity of the material,
+while the number of timesteps is derived from the distribution of travel times in a short pilot run.
+"""
+
+import sys
+import math
+import numpy as np
+from scipy.spatial import cKDTree
+from colorama import Fore, Style
+
+from freepaths.config import cf
+from freepaths.phonon import Phonon
+from freepaths.flight import Flight
+from freepaths.run_phonon import run_phonon
+from freepaths.step_kernel import StepKernel
+from freepaths.data import ScatteringData, SegmentData, TriangleScatteringData
+from freepaths.maps import ScatteringMap, ThermalMaps
+from freepaths.initial_states import InitialStateGenerator
+
+STEPS_PER_FEATURE = 10           # Number of steps that a phonon makes across the smallest feature
+PILOT_HORIZON_FACTOR = 3         # How many times longer than NUMBER_OF_TIMESTEPS the pilot phonons can fly
+TRAVEL_TIME_QUANTILE = 0.99      # Fraction of phonons that should arrive within the stabilization period
+
+
+def feature_sizes(obstacle):
+    """Characteristic sizes of a hole or a pillar"""
+    names = ['diameter', 'size_x', 'size_y', 'thickness', 'depth', 'height']
+    return [getattr(obstacle, name) for name in names if getattr(obstacle, name, None)]
+
+
+def smallest_feature_size():
+    """Smallest size among the structure dimensions, obstacles, and necks between neighbouring obstacles"""
+    sizes = [cf.width, cf.length]
+    if not cf.is_two_dimensional_material:
+        sizes.append(cf.thickness)
+
+    obstacles = [obstacle for obstacle in cf.holes + cf.pillars if feature_sizes(obstacle)]
+    for obstacle in obstacles:
+        sizes.extend(feature_sizes(obstacle))
+
+    # Necks between neighbouring obstacles, assuming that they extend over their largest size:
+    centered_obstacles = [obstacle for obstacle in obstacles if hasattr(obstacle, 'x0') and hasattr(obstacle, 'y0')]
+    if len(centered_obstacles) > 1:
+        centers = np.array([(obstacle.x0, obstacle.y0) for obstacle in centered_obstacles])
+        extents = np.array([max(feature_sizes(obstacle)) / 2 for obstacle in centered_obstacles])
+        distances, indices = cKDTree(centers).query(centers, k=2)
+        necks = distances[:, 1] - extents - extents[indices[:, 1]]
+        sizes.extend(necks[necks > 0])
+    return min(sizes)
+
+
+def maximum_group_velocity(material):
+    """Maximum group velocity among all branches of the material dispersion"""
+    d_w = 2 * math.pi * np.abs(np.diff(material.dispersion[:, 1:], axis=0))
+    d_k = np.diff(material.dispersion[:, 0])[:, np.newaxis]
+    return np.max(d_w / d_k)
+
+
+def pilot_travel_times(material, number_of_phonons, vol_pixel_ratio=None):
+    """Run a few phonons with a long horizon and return their travel times, where zeros mean that they did not arrive"""
+    scatter_stats = ScatteringData()
+    segment_stats = SegmentData()
+    places_stats = TriangleScatteringData()
+    scatter_maps = ScatteringMap()
+    thermal_maps = ThermalMaps(vol_pixel_ratio)
+    initial_states = InitialStateGenerator(material, number_of_phonons)
+    kernel = StepKernel()
+    travel_times = []
+    for _ in range(number_of_phonons):
+        phonon = Phonon(material, initial_state=initial_states.next_state())
+        flight = Flight(phonon)
+        run_phonon(phonon, flight, scatter_stats, places_stats, segment_stats, thermal_maps, scatter_maps, material, kernel)
+        travel_times.append(flight.travel_time)
+    return np.array(travel_times)
+
+
+def adjust_time_parameters(material, vol_pixel_ratio=None):
+    """Select time parameters automatically and return them as a dictionary of overrides for the config"""
+    overrides = {}
+
+    if cf.auto_timestep:
+        # Phonons should make several steps across the smallest feature and not skip pixels of the maps:
+        pixel_size = min(cf.length / cf.number_of_pixels_y, cf.width / cf.number_of_pixels_x)
+        step_length = min(smallest_feature_size() / STEPS_PER_FEATURE, pixel_size)
+        timestep = step_length / maximum_group_velocity(material)
+        timestep = float(f"{timestep:.1e}")
+        ratio = cf.timestep / timestep
+        overrides['timestep'] = timestep
+        overrides['number_of_timesteps'] = int(math.ceil(cf.number_of_timesteps * ratio))
+        overrides['number_of_virtual_timesteps'] = int(math.ceil(cf.number_of_virtual_timesteps * ratio))
+        apply_overrides(overrides)
+
+    if cf.auto_number_of_timesteps:
+        sys.stdout.write(f"\rRunning {cf.number_of_pilot_phonons} pilot phonons...")
+        horizon = cf.number_of_timesteps
+        cf.number_of_timesteps = PILOT_HORIZON_FACTOR * horizon
+        travel_times = pilot_travel_times(material, cf.number_of_pilot_phonons, vol_pixel_ratio)
+        cf.number_of_timesteps = horizon
+
+        # Stabilization period should be longer than travel times of almost all phonons:
+        if np.count_nonzero(travel_times) < TRAVEL_TIME_QUANTILE * len(travel_times):
+            sys.stdout.write(f"\r{Fore.RED}Many pilot phonons did not arrive, so NUMBER_OF_TIMESTEPS is based on the pilot horizon{Style.RESET_ALL}\n")
+            travel_time = PILOT_HORIZON_FACTOR * horizon * cf.timestep
+        else:
+            travel_time = np.quantile(travel_times[travel_times > 0], TRAVEL_TIME_QUANTILE)
+        stabilization_fraction = cf.number_of_stabilization_timeframes / cf.number_of_timeframes
+        number_of_timesteps = int(math.ceil(travel_time / stabilization_fraction / cf.timestep))
+        number_of_timesteps = max(number_of_timesteps, cf.number_of_timeframes)
+        ratio = number_of_timesteps / cf.number_of_timesteps
+        overrides['number_of_timesteps'] = number_of_timesteps
+        overrides['number_of_virtual_timesteps'] = int(math.ceil(cf.number_of_virtual_timesteps * ratio))
+        apply_overrides(overrides)
+
+    if overrides:
+        sys.stdout.write(f"\rTimestep = {cf.timestep} s, number of timesteps = {cf.number_of_timesteps}, "
+                         f"number of virtual timesteps = {cf.number_of_virtual_timesteps}\n")
+    return overrides
+
+
+def apply_overrides(overrides):
+    """Apply parameters selected in the main process, for example, in a worker process"""
+    for name, value in overrides.items():
+        setattr(cf, name, value)
@@ -0,0 +1,195 @@
+"""
+Module that calculates the ballistic transmission function of the structure, i.e. the probability of phonons
+emitted by the phonon sources to reach a cold side, for each polarization branch and frequency bin.
+Internal scattering is not included, so phonons fly straight between collisions with the boundaries. Each free flight
+is made in one jump to the nearest wall or bounding box of a hole, and only the collisions are resolved
+by the usual step functions, so all the scatterers and roughness models work as in the main mode.
+The thermal conductance is then obtained by the Landauer integration of the transmission over the dispersion.
+"""
+
+from math import acos, degrees, inf
+import numpy as np
+
+from freepaths.config import cf
+from freepaths.data import Data
+from freepaths.phonon import Phonon
+from freepaths.flight import Flight
+from freepaths.progress import Progress
+from freepaths.step_kernel import StepKernel
+from freepaths.scattering_types import ScatteringTypes
+from freepaths.landauer import mode_fluxes, thermal_conductance, draw_mode
+
+
+def build_transmission_check():
+    """Build a function that checks if the phonon that left the structure crossed one of the cold sides"""
+    checks = []
+    if cf.cold_side_position_top:
+        checks.append(lambda ph: ph.y >= cf.length)
+    if cf.cold_side_position_bottom:
+        checks.append(lambda ph: ph.y <= 0)
+    if cf.cold_side_position_right:
+        checks.append(lambda ph: ph.x >= cf.width / 2.0)
+    if cf.cold_side_position_left:
+        checks.append(lambda ph: ph.x <= - cf.width / 2.0)
+    return lambda ph: any(check(ph) for check in checks)
+
+
+def open_hot_sides():
+    """Make phonons exit through the hot sides, instead of re-thermalization, as they return into the hot reservoir"""
+    cf.cold_side_position_top = cf.cold_side_position_top or cf.hot_side_position_top
+    cf.cold_side_position_bottom = cf.cold_side_position_bottom or cf.hot_side_position_bottom
+    cf.cold_side_position_right = cf.cold_side_position_right or cf.hot_side_position_right
+    cf.cold_side_position_left = cf.cold_side_position_left or cf.hot_side_position_left
+    cf.hot_side_position_top = False
+    cf.hot_side_position_bottom = False
+    cf.hot_side_position_right = False
+    cf.hot_side_position_left = False
+    cf.include_internal_scattering = False
+
+
+def free_flight_length(phonon, hole_index):
+    """Length of the path along which the phonon cannot hit any wall or hole"""
+    d_x, d_y, d_z = phonon.direction
+    length = hole_index.free_length(phonon.x, phonon.y, d_x, d_y)
+    if d_z > 0:
+        length = min(length, (cf.thickness / 2 - phonon.z) / d_z)
+    elif d_z < 0:
+        length = min(length, (- cf.thickness / 2 - phonon.z) / d_z)
+    return length
+
+
+def exit_angle(phonon):
+    """Angle between the direction of the phonon and the normal of the side through which it exited, in degrees"""
+    d_x, d_y, _ = phonon.direction
+    if phonon.y >= cf.length or phonon.y <= 0:
+        return degrees(acos(min(abs(d_y), 1.0)))
+    return degrees(acos(min(abs(d_x), 1.0)))
+
+
+def trace_ray(phonon, is_transmitted, kernel):
+    """
+    Run the phonon from collision to collision until it exits the structure.
+    Return whether it was transmitted, its exit angle, path length, and number of scattering events,
+    or None if it did not exit within the number of timesteps.
+    """
+    flight = Flight(phonon)
+    scattering_types = ScatteringTypes()
+    can_jump = not (cf.pillars or cf.interfaces)
+    path_length = 0.0
+    number_of_scatterings = 0
+    for _ in range(cf.number_of_timesteps):
+
+        # Fly to the vicinity of the next obstacle, leaving one step to resolve the collision:
+        step_length = phonon.speed * cf.timestep
+        if can_jump:
+            jump = free_flight_length(phonon, kernel.hole_index) - step_length
+            if step_length < jump < inf:
+                d_x, d_y, d_z = phonon.direction
+                phonon.x, phonon.y, phonon.z = phonon.x + d_x * jump, phonon.y + d_y * jump, phonon.z + d_z * jump
+                path_length += jump
+
+        kernel.scattering(phonon, flight, scattering_types)
+        if scattering_types.is_scattered:
+            number_of_scatterings += 1
+        scattering_types.reset()
+        phonon.x, phonon.y, phonon.z = kernel.move(phonon, cf.timestep)
+        path_length += step_length
+
+        if not kernel.is_in_system(phonon):
+            return is_transmitted(phonon), exit_angle(phonon), path_length, number_of_scatterings
+    return None
+
+
+class BallisticTransmission(Data):
+    """Transmission of phonons of each polarization branch and frequency bin, and the resulting conductance"""
+
+    def __init__(self, material):
+        """Split the dispersion into frequency bins and calculate the heat flux emitted in each bin"""
+        self.material = material
+        self.frequencies, self.fluxes = mode_fluxes(material, cf.temp)
+        self.bins = np.array_split(np.arange(self.frequencies.shape[1]), cf.transmission_frequency_bins)
+        shape = (3, len(self.bins))
+        self.number_of_phonons = np.zeros(shape)
+        self.number_of_transmitted = np.zeros(shape)
+        self.number_of_lost = np.zeros(shape)
+        self.path_lengths = np.zeros(shape)
+        self.scatterings = np.zeros(shape)
+        self.rays = []
+
+        # Area of the hot side and the distance to the cold side, before the hot sides are opened:
+        is_along_x = cf.hot_side_position_right or cf.hot_side_position_left
+        self.cross_section_area = (cf.length if is_along_x else cf.width) * cf.thickness
+        self.structure_length = cf.width if is_along_x else cf.length
+
+    def trace(self, is_transmitted):
+        """Trace phonons of each branch and frequency bin from the phonon sources"""
+        kernel = StepKernel()
+        progress = Progress()
+        number_of_modes = 3 * len(self.bins)
+        for branch_number in range(3):
+            for bin_number, indexes in enumerate(self.bins):
+                progress.render(branch_number * len(self.bins) + bin_number, number_of_modes)
+                fluxes = self.fluxes[branch_number, indexes]
+                if np.sum(fluxes) == 0:
+                    continue
+                for _ in range(cf.transmission_phonons_per_bin):
+                    phonon = Phonon(self.material, branch_number, draw_mode(indexes, fluxes))
+                    self.trace_phonon(phonon, bin_number, is_transmitted, kernel)
+        progress.render(number_of_modes, number_of_modes)
+
+    def trace_phonon(self, phonon, bin_number, is_transmitted, kernel):
+        """Trace one phonon with the step functions of the kernel and record its exit"""
+        self.number_of_phonons[phonon.branch_number, bin_number] += 1
+        result = trace_ray(phonon, is_transmitted, kernel)
+        if result is None:
+            self.number_of_lost[phonon.branch_number, bin_number] += 1
+            return
+        transmitted, angle, path_length, number_of_scatterings = result
+        self.number_of_transmitted[phonon.branch_number, bin_number] += transmitted
+        self.path_lengths[phonon.branch_number, bin_number] += path_length
+        self.scatterings[phonon.branch_number, bin_number] += number_of_scatterings
+        self.rays.append((phonon.branch_number, phonon.f, transmitted, angle, path_length, number_of_scatterings))
+
+    def calculate_conductance(self):
+        """Calculate the transmission of each bin, the conductance, and the effective thermal conductivity"""
+        shape = (3, len(self.bins))
+        self.bin_frequencies, self.bin_fluxes = np.zeros(shape), np.zeros(shape)
+        for branch_number in range(3):
+            for bin_number, indexes in enumerate(self.bins):
+                fluxes = self.fluxes[branch_number, indexes]
+                self.bin_fluxes[branch_number, bin_number] = np.sum(fluxes)
+                if np.sum(fluxes) > 0:
+                    self.bin_frequencies[branch_number, bin_number] = np.average(self.frequencies[branch_number, indexes], weights=fluxes)
+
+        number_of_exited = self.number_of_phonons - self.number_of_lost
+        self.transmission = np.divide(self.number_of_transmitted, self.number_of_phonons,
+                                      out=np.zeros(shape), where=self.number_of_phonons > 0)
+        self.mean_path_length = np.divide(self.path_lengths, number_of_exited, out=np.zeros(shape), where=number_of_exited > 0)
+        self.mean_scatterings = np.divide(self.scatterings, number_of_exited, out=np.zeros(shape), where=number_of_exited > 0)
+
+        # Conductance per unit area of the hot side and the effective thermal conductivity between the hot and cold sides:
+        self.conductance = thermal_conductance(self.bin_fluxes, self.transmission)
+        self.thermal_conductivity = self.conductance * self.structure_length
+
+    @property
+    def lost_fraction(self):
+        """Fraction of phonons which did not exit the structure until the end of the simulation"""
+        return float(np.sum(self.number_of_lost) / max(np.sum(self.number_of_phonons), 1))
+
+    @property
+    def average_transmission(self):
+        """Transmission averaged over the emitted heat flux"""
+        return float(np.sum(self.bin_fluxes * self.transmission) / max(np.sum(self.bin_fluxes), 1e-100))
+
+    def write_into_files(self):
+        """Write the transmission function and the exit parameters of all phonons into files"""
+        data = np.column_stack((
+            np.repeat(np.arange(3), len(self.bins)), self.bin_frequencies.ravel(), self.bin_fluxes.ravel(),
+            self.transmission.ravel(), self.mean_path_length.ravel(), self.mean_scatterings.ravel(),
+        ))
+        header = "Branch, Frequency (Hz), Emitted heat flux (W/m^2K), Transmission, Mean path length (m), Mean number of scatterings"
+        np.savetxt("Data/Transmission function.csv", data, fmt='%1.4e', delimiter=",", header=header, encoding='utf-8')
+
+        rays = np.array(self.rays).reshape(-1, 6)
+        header = "Branch, Frequency (Hz), Transmitted, Exit angle (deg), Path length (m), Number of scatterings"
+        np.savetxt("Data/Transmission rays.csv", rays, fmt='%1.4e', delimiter=",", header=header, encoding='utf-8')
@@ -0,0 +1,344 @@
+"""
+Module that describes a long periodic structure by the transfer of phonons through one unit cell.
+The cell is the structure from the config, which is open on the bottom and top sides.
+Phonons enter the cell in each state, i.e. side, position bin, and direction bin, and are traced until they exit,
+which gives the probabilities of the exit states and the dwell times for each polarization branch and frequency bin.
+Statistical noise of the kernel breaks the detailed balance and makes phonons drift in one direction over many cells,
+so the kernel is first made reciprocal and conserving, as the exact transfer of a cell is.
+This transfer kernel is then chained over all the cells as a Markov process, by combining the transmission
+and reflection matrices of two halves of the structure, so the cost grows only with the logarithm of its length.
+"""
+
+import enum
+from math import pi, sqrt, sin, cos, asin, atan2
+from random import random
+import numpy as np
+
+from freepaths.config import cf
+from freepaths.data import Data
+from freepaths.phonon import Phonon
+from freepaths.flight import Flight
+from freepaths.progress import Progress
+from freepaths.step_kernel import StepKernel
+from freepaths.scattering_types import ScatteringTypes
+from freepaths.termination import TerminationCheck
+from freepaths.landauer import mode_fluxes, thermal_conductance, draw_mode
+
+MAX_ENTRY_ATTEMPTS = 1000      # Number of attempts to find an entry point outside of holes in a position bin
+BALANCE_ITERATIONS = 1000      # Maximal number of iterations to scale the kernel to conserve the flux
+BALANCE_TOLERANCE = 1e-12      # Relative error of the flux conservation at which the iterations stop
+
+
+class Side(enum.IntEnum):
+    """Sides of the cell through which phonons enter and exit"""
+    BOTTOM = 0
+    TOP = 1
+
+
+def open_cell_sides():
+    """Make the bottom and top sides of the structure the open sides of a cell, where phonons exit"""
+    cf.cold_side_position_top = True
+    cf.cold_side_position_bottom = True
+    cf.hot_side_position_top = False
+    cf.hot_side_position_bottom = False
+    cf.include_top_sidewall = False
+    cf.include_bottom_sidewall = False
+
+
+def number_of_states():
+    """Number of states in which phonons enter or exit the cell through one side"""
+    return cf.cell_position_bins * cf.cell_polar_angle_bins * cf.cell_azimuthal_angle_bins
+
+
+def state_of_phonon(phonon):
+    """Index of the state of the phonon at the side of the cell by its position and direction"""
+    d_x, d_y, d_z = phonon.direction
+    column = min(max(int((phonon.x + cf.width / 2) / cf.width * cf.cell_position_bins), 0), cf.cell_position_bins - 1)
+    polar = min(int(d_y**2 * cf.cell_polar_angle_bins), cf.cell_polar_angle_bins - 1)
+    azimuthal = min(int(atan2(d_z, d_x) % (2 * pi) / (2 * pi) * cf.cell_azimuthal_angle_bins), cf.cell_azimuthal_angle_bins - 1)
+    return (column * cf.cell_polar_angle_bins + polar) * cf.cell_azimuthal_angle_bins + azimuthal
+
+
+def reversed_states():
+    """Index of the state with the opposite direction along the side for each state, i.e. azimuth rotated by pi"""
+    states = np.arange(number_of_states())
+    position_and_polar, azimuthal = np.divmod(states, cf.cell_azimuthal_angle_bins)
+    return position_and_polar * cf.cell_azimuthal_angle_bins + (azimuthal + cf.cell_azimuthal_angle_bins // 2) % cf.cell_azimuthal_angle_bins
+
+
+def open_fractions(hole_index):
+    """Fraction of the area of each position bin on each side of the cell that is not covered by holes"""
+    fractions = np.zeros((2, cf.cell_position_bins))
+    for side in Side:
+        y = 0.0 if side == Side.BOTTOM else cf.length
+        for column in range(cf.cell_position_bins):
+            points = zip(cf.width * ((column + np.random.rand(MAX_ENTRY_ATTEMPTS)) / cf.cell_position_bins - 0.5),
+                         0.98 * cf.thickness * (np.random.rand(MAX_ENTRY_ATTEMPTS) - 0.5))
+            is_open = [not any(hole.is_inside(x, y, z, cf) for hole in hole_index.holes_near(x, y)) for x, z in points]
+            fractions[side, column] = np.mean(is_open)
+    return fractions
+
+
+def balance_kernel(probabilities, moments, weights):
+    """
+    Make the kernel reciprocal and conserving, given the equilibrium fluxes of the entry states.
+    In equilibrium, the flux from one state to another equals the flux between the reversed states in the opposite way,
+    so the matrix of fluxes with the entry states replaced by the reversed ones is symmetric. This matrix is averaged
+    with its transpose and scaled symmetrically until the flux exiting through each state equals its equilibrium flux.
+    """
+    number = probabilities.shape[-1]
+    reverse = np.concatenate((reversed_states(), number + reversed_states()))
+    weights = weights.ravel()
+
+    def symmetric_fluxes(kernel):
+        full = kernel.transpose(1, 2, 0, 3).reshape(2 * number, 2 * number)
+        fluxes = (full * weights)[:, reverse]
+        return (fluxes + fluxes.T) / 2
+
+    def kernel_of_fluxes(fluxes):
+        full = np.divide(fluxes[:, reverse], weights, out=np.zeros_like(fluxes), where=weights > 0)
+        return full.reshape(2, number, 2, number).transpose(2, 0, 1, 3)
+
+    fluxes, moment_fluxes = symmetric_fluxes(probabilities), symmetric_fluxes(moments)
+    scales = np.ones(2 * number)
+    for _ in range(BALANCE_ITERATIONS):
+        exiting = scales * (fluxes @ scales)
+        if np.allclose(exiting, weights, rtol=0, atol=BALANCE_TOLERANCE * np.max(weights)):
+            break
+        scales *= np.sqrt(np.divide(weights, exiting, out=np.zeros_like(weights), where=exiting > 0))
+    scales = np.outer(scales, scales)
+    return kernel_of_fluxes(fluxes * scales), kernel_of_fluxes(moment_fluxes * scales)
+
+
+def place_phonon(phonon, side, state, hole_index):
+    """
+    Put the phonon on the side of the cell at a random position and direction within the state.
+    Directions are drawn from the Lambert distribution, as the polar bins are uniform in the squared cosine.
+    Return False if the position bin is covered by holes.
+    """
+    column, polar, azimuthal = np.unravel_index(state, (cf.cell_position_bins, cf.cell_polar_angle_bins, cf.cell_azimuthal_angle_bins))
+    y = 0.0 if side == Side.BOTTOM else cf.length
+    for _ in range(MAX_ENTRY_ATTEMPTS):
+        x = cf.width * ((column + random()) / cf.cell_position_bins - 0.5)
+        z = 0.98 * cf.thickness * (random() - 0.5)
+        if not any(hole.is_inside(x, y, z, cf) for hole in hole_index.holes_near(x, y)):
+            break
+    else:
+        return False
+
+    cosine = sqrt((polar + random()) / cf.cell_polar_angle_bins)
+    azimuth = 2 * pi * (azimuthal + random()) / cf.cell_azimuthal_angle_bins
+    sine = sqrt(1 - cosine**2)
+    d_y = cosine if side == Side.BOTTOM else -cosine
+    phonon.x, phonon.y, phonon.z = x, y, z
+    phonon.theta = atan2(sine * cos(azimuth), d_y)
+    phonon.phi = asin(sine * sin(azimuth))
+    return True
+
+
+def trace_through_cell(phonon, material, kernel):
+    """Run the phonon through the cell and return the side and the time of its exit, or None if it stays in the cell"""
+    flight = Flight(phonon)
+    scattering_types = ScatteringTypes()
+    termination_check = TerminationCheck(phonon, kernel.hole_index)
+    for step_number in range(cf.number_of_timesteps):
+        kernel.scattering(phonon, flight, scattering_types)
+
+        # If diffuse scattering has occurred, reset phonon free path:
+        if scattering_types.is_diffuse or scattering_types.is_internal:
+            flight.restart()
+            if scattering_types.is_internal:
+                phonon.relax(material)
+            phonon.assign_internal_scattering_time(material)
+        else:
+            flight.add_step(cf.timestep)
+        scattering_types.reset()
+        phonon.x, phonon.y, phonon.z = kernel.move(phonon, cf.timestep)
+
+        # Phonon exits when it crosses the bottom or top side:
+        if not kernel.is_in_system(phonon):
+            side = Side.TOP if phonon.y >= cf.length else Side.BOTTOM
+            return side, (step_number + 1) * cf.timestep
+
+        # Periodically check if the phonon is trapped in the cell:
+        if kernel.terminate_stuck_phonons:
+            termination_check.update(phonon)
+            if (step_number + 1) % cf.termination_check_window == 0 and termination_check.check(phonon):
+                return None
+    return None
+
+
+def dual_product(a, b):
+    """Product of matrices with their time moments, where the moment of the product is A'B + AB'"""
+    return a[0] @ b[0], a[1] @ b[0] + a[0] @ b[1]
+
+
+def dual_sum(a, b):
+    """Sum of matrices with their time moments"""
+    return a[0] + b[0], a[1] + b[1]
+
+
+def dual_series(a):
+    """Sum of all powers of the matrix, (I - A)^-1, with its time moment (I - A)^-1 A' (I - A)^-1"""
+    inverse = np.linalg.inv(np.eye(len(a[0])) - a[0])
+    return inverse, inverse @ a[1] @ inverse
+
+
+class Transfer:
+    """
+    Probabilities of the exit states of phonons that enter a segment of the structure in each state,
+    and their moments, i.e. the probabilities multiplied by the times spent in the segment.
+    Each matrix and its moment are stored as a pair, and the matrices are indexed as [exit state, entry state].
+    """
+
+    def __init__(self, forward_transmission, forward_reflection, backward_transmission, backward_reflection):
+        self.forward_transmission = forward_transmission        # Enter through the bottom, exit through the top
+        self.forward_reflection = forward_reflection            # Enter through the bottom, exit through the bottom
+        self.backward_transmission = backward_transmission      # Enter through the top, exit through the bottom
+        self.backward_reflection = backward_reflection          # Enter through the top, exit through the top
+
+    @classmethod
+    def from_kernel(cls, probabilities, moments):
+        """Create the transfer of one cell from arrays indexed as [entry side, exit side, exit state, entry state]"""
+        def pair(entry_side, exit_side):
+            return probabilities[entry_side, exit_side], moments[entry_side, exit_side]
+        return cls(pair(Side.BOTTOM, Side.TOP), pair(Side.BOTTOM, Side.BOTTOM), pair(Side.TOP, Side.BOTTOM), pair(Side.TOP, Side.TOP))
+
+    def combine(self, upper):
+        """
+        Transfer through this segment followed by the upper segment, where phonons exiting one segment
+        enter the other in the same state and can bounce between the two segments any number of times
+        """
+        lower = self
+        bounces_up = dual_series(dual_product(lower.backward_reflection, upper.forward_reflection))
+        bounces_down = dual_series(dual_product(upper.forward_reflection, lower.backward_reflection))
+        entering_upper = dual_product(bounces_up, lower.forward_transmission)
+        entering_lower = dual_product(bounces_down, upper.backward_transmission)
+        return Transfer(
+            dual_product(upper.forward_transmission, entering_upper),
+            dual_sum(lower.forward_reflection, dual_product(lower.backward_transmission, dual_product(upper.forward_reflection, entering_upper))),
+            dual_product(lower.backward_transmission, entering_lower),
+            dual_sum(upper.backward_reflection, dual_product(upper.forward_transmission, dual_product(lower.backward_reflection, entering_lower))),
+        )
+
+    def repeat(self, number_of_cells):
+        """Transfer through a number of identical segments, which are combined by doubling"""
+        result = None
+        power = self
+        while number_of_cells:
+            if number_of_cells & 1:
+                result = power if result is None else result.combine(power)
+            number_of_cells >>= 1
+            if number_of_cells:
+                power = power.combine(power)
+        return result
+
+
+class CellTransfer(Data):
+    """Transfer kernels of the unit cell for each polarization branch and frequency bin, and the resulting conductance"""
+
+    def __init__(self, material):
+        """Split the dispersion into frequency bins and calculate the heat flux emitted in each bin"""
+        self.material = material
+        self.number_of_states = number_of_states()
+        self.frequencies, self.fluxes = mode_fluxes(material, cf.temp)
+        self.bins = np.array_split(np.arange(self.frequencies.shape[1]), cf.cell_frequency_bins)
+        shape = (3, len(self.bins), 2, 2, self.number_of_states, self.number_of_states)
+        self.probabilities = np.zeros(shape)
+        self.moments = np.zeros(shape)
+        self.is_blocked = np.zeros((2, self.number_of_states), dtype=bool)
+        self.open_fractions = np.ones((2, cf.cell_position_bins))
+
+    @property
+    def state_weights(self):
+        """Equilibrium fluxes through the states on each side, proportional to the open area of their position bins"""
+        directions_per_position = self.number_of_states // cf.cell_position_bins
+        weights = np.repeat(self.open_fractions, directions_per_position, axis=1)
+        weights[self.is_blocked] = 0.0
+        return weights
+
+    def trace_cell(self):
+        """Trace phonons from each entry state of each branch and frequency bin through the cell"""
+        self.kernel = StepKernel()
+        self.open_fractions = open_fractions(self.kernel.hole_index)
+        progress = Progress()
+        number_of_modes = 3 * len(self.bins)
+        for branch_number in range(3):
+            for bin_number, indexes in enumerate(self.bins):
+                progress.render(branch_number * len(self.bins) + bin_number, number_of_modes)
+                fluxes = self.fluxes[branch_number, indexes]
+                if np.sum(fluxes) == 0:
+                    continue
+                for side in Side:
+                    for state in range(self.number_of_states):
+                        for _ in range(cf.cell_phonons_per_state):
+                            self.trace_phonon(branch_number, bin_number, draw_mode(indexes, fluxes), side, state)
+        progress.render(number_of_modes, number_of_modes)
+        self.probabilities /= cf.cell_phonons_per_state
+        self.moments /= cf.cell_phonons_per_state
+
+    def trace_phonon(self, branch_number, bin_number, index, side, state):
+        """Trace one phonon from the given entry state and record its exit state and time"""
+        phonon = Phonon(self.material, branch_number, index)
+        if not place_phonon(phonon, side, state, self.kernel.hole_index):
+            self.is_blocked[side, state] = True
+            return
+        result = trace_through_cell(phonon, self.material, self.kernel)
+        if result is not None:
+            exit_side, time = result
+            exit_state = state_of_phonon(phonon)
+            self.probabilities[branch_number, bin_number, side, exit_side, exit_state, state] += 1
+            self.moments[branch_number, bin_number, side, exit_side, exit_state, state] += time
+
+    def chain_cells(self, number_of_cells):
+        """Calculate transmission through one cell and through the whole structure for each branch and frequency bin"""
+        shape = (3, len(self.bins))
+        self.bin_frequencies, self.bin_fluxes = np.zeros(shape), np.zeros(shape)
+        self.cell_transmission, self.cell_reflection = np.zeros(shape), np.zeros(shape)
+        self.transmission, self.transit_time = np.zeros(shape), np.zeros(shape)
+
+        # Phonons from the hot side enter the states with their equilibrium fluxes, as the states have equal Lambert weights:
+        weights = self.state_weights
+        incoming = weights[Side.BOTTOM] / max(np.sum(weights[Side.BOTTOM]), 1e-100)
+
+        for branch_number in range(3):
+            for bin_number, indexes in enumerate(self.bins):
+                fluxes = self.fluxes[branch_number, indexes]
+                self.bin_fluxes[branch_number, bin_number] = np.sum(fluxes)
+                if np.sum(fluxes) == 0:
+                    continue
+                self.bin_frequencies[branch_number, bin_number] = np.average(self.frequencies[branch_number, indexes], weights=fluxes)
+                kernel = balance_kernel(self.probabilities[branch_number, bin_number], self.moments[branch_number, bin_number], weights)
+                cell = Transfer.from_kernel(*kernel)
+                self.cell_transmission[branch_number, bin_number] = np.sum(cell.forward_transmission[0] @ incoming)
+                self.cell_reflection[branch_number, bin_number] = np.sum(cell.forward_reflection[0] @ incoming)
+
+                structure = cell.repeat(number_of_cells)
+                transmission = np.sum(structure.forward_transmission[0] @ incoming)
+                self.transmission[branch_number, bin_number] = transmission
+                if transmission > 0:
+                    self.transit_time[branch_number, bin_number] = np.sum(structure.forward_transmission[1] @ incoming) / transmission
+
+        # Conductance per unit area of the cross section, where only its open part emits phonons, and the effective thermal conductivity:
+        self.structure_length = number_of_cells * cf.length
+        self.conductance = thermal_conductance(self.bin_fluxes, self.transmission) * np.mean(self.open_fractions[Side.BOTTOM])
+        self.thermal_conductivity = self.conductance * self.structure_length
+
+    @property
+    def lost_fraction(self):
+        """Fraction of traced phonons which stayed in the cell until the end of the simulation or got trapped"""
+        exited = np.sum(self.probabilities, axis=(2, 3, 4, 5))
+        is_traced = self.bin_fluxes > 0
+        number_of_open_states = max(np.count_nonzero(~self.is_blocked), 1)
+        return 1 - np.mean(exited[is_traced]) / number_of_open_states if np.any(is_traced) else 0.0
+
+    def write_into_files(self):
+        """Write the transmission of each branch and frequency bin and the transfer kernels into files"""
+        data = np.column_stack((
+            np.repeat(np.arange(3), len(self.bins)), self.bin_frequencies.ravel(), self.bin_fluxes.ravel(),
+            self.cell_transmission.ravel(), self.cell_reflection.ravel(), self.transmission.ravel(), self.transit_time.ravel(),
+        ))
+        header = "Branch, Frequency (Hz), Emitted heat flux (W/m^2K), Cell transmission, Cell reflection, Structure transmission, Transit time (s)"
+        np.savetxt("Data/Cell transfer.csv", data, fmt='%1.4e', delimiter=",", header=header, encoding='utf-8')
+        np.savez("Data/Cell transfer kernels.npz", probabilities=self.probabilities, moments=self.moments,
+                 is_blocked=self.is_blocked, open_fractions=self.open_fractions, frequencies=self.bin_frequencies, fluxes=self.bin_fluxes)
@@ -8,7 +8,8 @@ import argparse
 import logging
 from colorama import Fore, Style
 
-from freepaths.sources import Distributions
+from freepaths.sources import Distributions, sources_are_lambertian
+from freepaths.layout import read_layout
 from freepaths.scatterers import *
 
 # Import a default input file:
@@ -24,6 +25,10 @@ parser = argparse.ArgumentParser(prog='FreePATHS', description='Monte Carlo simu
                                  epilog=f'For more information, visit: {WEBSITE}')
 parser.add_argument('input_file', nargs='?', default=None, help='The input file')
 parser.add_argument("-s", "--sampling", help="Run in MFP sampling mode", action="store_true")
+parser.add_argument("-d", "--deviational", help="Run in deviational mode", action="store_true")
+parser.add_argument("-t", "--temperatures", help="Run in temperature sweep mode", action="store_true")
+parser.add_argument("-c", "--cells", help="Run in cell transfer mode", action="store_true")
+parser.add_argument("-b", "--ballistic", help="Run in ballistic transmission mode", action="store_true")
 args = parser.parse_args()
 
 
@@ -49,6 +54,8 @@ class Config:
         self.number_of_phonons = NUMBER_OF_PHONONS
         self.number_of_nodes = NUMBER_OF_NODES
         self.temp = T
+        self.temperature_difference = TEMPERATURE_DIFFERENCE
+        self.temperatures = TEMPERATURES
         self.output_scattering_map = OUTPUT_SCATTERING_MAP
         self.output_trajectories_of_first = OUTPUT_TRAJECTORIES_OF_FIRST
         self.output_structure_color = OUTPUT_STRUCTURE_COLOR
@@ -59,6 +66,11 @@ class Config:
         self.number_of_timesteps = NUMBER_OF_TIMESTEPS
         self.number_of_timeframes = NUMBER_OF_TIMEFRAMES
         self.number_of_stabilization_timeframes = NUMBER_OF_STABILIZATION_TIMEFRAMES
+        self.auto_timestep = AUTO_TIMESTEP
+        self.auto_number_of_timesteps = AUTO_NUMBER_OF_TIMESTEPS
+        self.number_of_pilot_phonons = NUMBER_OF_PILOT_PHONONS
+        self.terminate_stuck_phonons = TERMINATE_STUCK_PHONONS
+        self.termination_check_window = TERMINATION_CHECK_WINDOW
 
         # Animation:
         self.output_path_animation = OUTPUT_PATH_ANIMATION
@@ -70,6 +82,26 @@ class Config:
         self.number_of_virtual_timesteps = NUMBER_OF_VIRTUAL_TIMESTEPS
         self.ignore_faulty_phonons = IGNORE_FAULTY_PHONONS
 
+        # Variance reduction:
+        self.control_variate_reference = CONTROL_VARIATE_REFERENCE
+
+        # MFP sampling mode:
+        self.use_mfp_cache = USE_MFP_CACHE
+        self.use_adaptive_quadrature = USE_ADAPTIVE_QUADRATURE
+        self.adaptive_quadrature_tolerance = ADAPTIVE_QUADRATURE_TOLERANCE
+
+        # Cell transfer mode:
+        self.number_of_cells = NUMBER_OF_CELLS
+        self.cell_position_bins = CELL_POSITION_BINS
+        self.cell_polar_angle_bins = CELL_POLAR_ANGLE_BINS
+        self.cell_azimuthal_angle_bins = CELL_AZIMUTHAL_ANGLE_BINS
+        self.cell_frequency_bins = CELL_FREQUENCY_BINS
+        self.cell_phonons_per_state = CELL_PHONONS_PER_STATE
+
+        # Ballistic transmission mode:
+        self.transmission_frequency_bins = TRANSMISSION_FREQUENCY_BINS
+        self.transmission_phonons_per_bin = TRANSMISSION_PHONONS_PER_BIN
+
         # Material parameters:
         self.media = MEDIA
 
@@ -87,6 +119,7 @@ class Config:
         self.include_left_sidewall = INCLUDE_LEFT_SIDEWALL
         self.include_top_sidewall = INCLUDE_TOP_SIDEWALL
         self.include_bottom_sidewall = INCLUDE_BOTTOM_SIDEWALL
+        self.periodic_sidewalls = PERIODIC_SIDEWALLS
 
         # Hot side positions:
         self.hot_side_position_top = HOT_SIDE_POSITION_TOP
@@ -116,10 +149,32 @@ class Config:
         self.holes = HOLES
         self.pillars = PILLARS
         self.interfaces = INTERFACES
+        self.layout_file = LAYOUT_FILE
+        self.layout_layer = LAYOUT_LAYER
 
         # Multiprocessing:
         self.num_workers = NUMBER_OF_PROCESSES
 
+    def add_layout_holes(self):
+        """Add holes from the layout file to the holes defined in the input file"""
+        if self.layout_file:
+            self.holes = self.holes + read_layout(self.layout_file, self.layout_layer)
+
+    def add_periodic_images(self):
+        """Add images of the holes which cross the periodic sidewalls, shifted to the opposite side of the structure"""
+        self.hole_images = []
+        if not self.periodic_sidewalls:
+            return
+        for hole in self.holes:
+            bounding_box = hole.get_bounding_box(self)
+            if bounding_box is None:
+                continue
+            x_min, x_max, _, _ = bounding_box
+            if x_max > self.width / 2:
+                self.hole_images.append(ShiftedHole(hole, -self.width))
+            if x_min < -self.width / 2:
+                self.hole_images.append(ShiftedHole(hole, self.width))
+
     def convert_to_enums(self):
         """Convert some user generated parameters into enums"""
 
@@ -173,6 +228,45 @@ class Config:
                 logging.error("Source size along Z coordinate is too large")
                 sys.exit()
 
+            if not source.assign_free_area(self.holes + self.hole_images, self):
+                logging.error("A source is fully covered by holes, so phonons cannot be generated in it")
+                sys.exit()
+
+        if self.control_variate_reference not in [None, "kinetic", "casimir"]:
+            logging.error("Parameter CONTROL_VARIATE_REFERENCE should be None, \"kinetic\", or \"casimir\"")
+            sys.exit()
+
+        if args.deviational and self.control_variate_reference:
+            logging.warning("Control variate is not available in the deviational mode and will be ignored")
+            self.control_variate_reference = None
+
+        if args.deviational and self.temperature_difference == 0:
+            logging.error("Parameter TEMPERATURE_DIFFERENCE should not be zero in the deviational mode")
+            sys.exit()
+
+        if args.deviational and not sources_are_lambertian(self.phonon_sources):
+            logging.warning("Phonon sources do not have the Lambert distribution of angles, so they do not emit like a hot side")
+
+        if self.auto_number_of_timesteps and self.number_of_pilot_phonons < 1:
+            logging.error("Parameter NUMBER_OF_PILOT_PHONONS should be positive")
+            sys.exit()
+
+        if self.terminate_stuck_phonons and (not isinstance(self.termination_check_window, int) or self.termination_check_window < 1):
+            logging.error("Parameter TERMINATION_CHECK_WINDOW should be a positive integer")
+            sys.exit()
+
+        if self.use_adaptive_quadrature and self.adaptive_quadrature_tolerance <= 0:
+            logging.error("Parameter ADAPTIVE_QUADRATURE_TOLERANCE should be positive")
+            sys.exit()
+
+        if self.use_adaptive_quadrature and self.number_of_phonons < 4:
+            logging.error("NUMBER_OF_PHONONS should be at least 4 for the adaptive quadrature")
+            sys.exit()
+
+        if self.temperatures is not None and any(temp <= 0 for temp in self.temperatures):
+            logging.error("All TEMPERATURES should be positive")
+            sys.exit()
+
         if self.output_path_animation and self.number_of_timesteps > 5000:
             logging.warning("NUMBER_OF_TIMESTEPS is rather large for animation")
 
@@ -200,6 +294,39 @@ class Config:
             logging.error("Left side is assigned multiple functions")
             sys.exit()
 
+        cell_parameters = [self.number_of_cells, self.cell_position_bins, self.cell_polar_angle_bins,
+                           self.cell_azimuthal_angle_bins, self.cell_frequency_bins, self.cell_phonons_per_state]
+        if args.cells and not all(isinstance(value, int) and value > 0 for value in cell_parameters):
+            logging.error("Parameters NUMBER_OF_CELLS and CELL_... should be positive integers")
+            sys.exit()
+
+        if args.cells and self.cell_azimuthal_angle_bins % 2:
+            logging.error("Parameter CELL_AZIMUTHAL_ANGLE_BINS should be even, so that each direction has the opposite one")
+            sys.exit()
+
+        if args.cells and self.is_two_dimensional_material:
+            logging.error("Cell transfer mode is not available for two dimensional materials")
+            sys.exit()
+
+        if args.cells and (self.cold_side_position_right or self.cold_side_position_left or
+                           self.hot_side_position_right or self.hot_side_position_left):
+            logging.error("In cell transfer mode, phonons should travel from the bottom to the top side of the cell")
+            sys.exit()
+
+        transmission_parameters = [self.transmission_frequency_bins, self.transmission_phonons_per_bin]
+        if args.ballistic and not all(isinstance(value, int) and value > 0 for value in transmission_parameters):
+            logging.error("Parameters TRANSMISSION_FREQUENCY_BINS and TRANSMISSION_PHONONS_PER_BIN should be positive integers")
+            sys.exit()
+
+        if args.ballistic and self.is_two_dimensional_material:
+            logging.error("Ballistic transmission mode is not available for two dimensional materials")
+            sys.exit()
+
+        if self.periodic_sidewalls and (self.cold_side_position_right or self.cold_side_position_left or
+                                        self.hot_side_position_right or self.hot_side_position_left):
+            logging.error("Right and left sides cannot be hot or cold sides when PERIODIC_SIDEWALLS is True")
+            sys.exit()
+
 
     def check_depricated_parameters(self):
         """Check for deprecated parameters and warn about them"""
@@ -232,6 +359,8 @@ class Config:
             sys.exit()
 
 cf = Config()
+cf.add_layout_holes()
+cf.add_periodic_images()
 cf.convert_to_enums()
 cf.check_parameter_validity()
 cf.check_depricated_parameters()
@@ -0,0 +1,133 @@
+"""
+Module that reduces the statistical error of the thermal conductivity with a control variate.
+For each traced phonon we compute a cheap analytic reference quantity, whose expected value is known exactly,
+and use its correlation with the contribution of this phonon to the thermal conductivity to correct it.
+The contribution includes both the heat flux and the temperature gradient, which the phonon adds to each timeframe.
+"""
+
+from math import pi, sqrt
+from scipy.constants import k, hbar
+import numpy as np
+
+from freepaths.config import cf
+from freepaths.data import Data
+
+
+def casimir_length():
+    """Boundary limited mean free path in the Casimir limit for the cross-section of the structure"""
+    if cf.is_two_dimensional_material:
+        return cf.width
+    return 1.12 * sqrt(cf.width * cf.thickness)
+
+
+def reference_values(frequencies, speeds, material):
+    """
+    Reference quantity of phonons, i.e. their energy times the analytic mean free path.
+    Depending on the settings, the mean free path is either the Casimir limit or the Casimir limit
+    combined with the bulk mean free path from the material relaxation time via Matthiessen's rule.
+    """
+    omega = 2 * pi * np.asarray(frequencies, dtype=float)
+    mean_free_path = casimir_length()
+    if cf.control_variate_reference == "kinetic" and cf.include_internal_scattering:
+        if cf.use_gray_approximation_mfp:
+            bulk_mean_free_path = cf.gray_approximation_mfp
+        else:
+            bulk_mean_free_path = speeds * material.relaxation_time(omega)
+        mean_free_path = 1 / (1 / mean_free_path + 1 / bulk_mean_free_path)
+    return hbar * omega * mean_free_path
+
+
+def expected_reference(material, number_of_points=2000):
+    """
+    Calculate the exact expected value of the reference quantity by integrating it over
+    the frequency distribution from which Phonon.assign_frequency draws the frequencies
+    """
+    f_peak = 2.82 * k * cf.temp / (2 * pi * hbar)
+    expected_value = 0.0
+    for branch_number in range(3):
+        f_max = min(5 * f_peak, material.maximum_frequencies[branch_number])
+        frequencies = (np.arange(number_of_points) + 0.5) * f_max / number_of_points
+        plank_distribution = frequencies**3 / np.expm1(hbar * 2 * pi * frequencies / (k * cf.temp))
+        speeds = material.group_velocities(branch_number, frequencies)
+        references = reference_values(frequencies, speeds, material)
+        expected_value += np.sum(plank_distribution * references) / np.sum(plank_distribution) / 3
+    return expected_value
+
+
+class ControlVariate(Data):
+    """Control variate estimator of the thermal conductivity"""
+
+    def __init__(self):
+        """Initialize arrays of per-phonon heat fluxes, temperature gradients, and reference quantities"""
+        self.heat_fluxes_effective = []
+        self.heat_fluxes_material = []
+        self.temperature_gradients = []
+        self.references = []
+
+    def save_phonon_data(self, ph, thermal_maps, material):
+        """Record the heat flux and temperature gradient of the phonon in the steady state timeframes and its reference quantity"""
+        heat_flux_effective, heat_flux_material, temperature_gradient = thermal_maps.pop_phonon_contributions()
+        steady = slice(cf.number_of_stabilization_timeframes, cf.number_of_timeframes)
+        self.heat_fluxes_effective.append(heat_flux_effective[steady])
+        self.heat_fluxes_material.append(heat_flux_material[steady])
+        self.temperature_gradients.append(temperature_gradient[steady])
+        self.references.append(float(reference_values(ph.f, ph.speed, material)))
+
+    @staticmethod
+    def correct(heat_fluxes, temperature_gradients, references, expected_value):
+        """
+        Apply the control variate correction to the thermal conductivity K = J / grad(T) of each timeframe.
+        Heat fluxes and temperature gradients are arrays of phonons by timeframes. To the first order, the phonon changes
+        the conductivity of a timeframe by (j - K * g) / grad(T), where j and g are its own contributions to J and grad(T).
+        The optimal multiple of the deviation of the references from the expected value is subtracted from each timeframe.
+        Returns the corrected conductivity averaged over timeframes, its spread between timeframes,
+        the spread without correction, and the correlation coefficient, as the standard mode reports the spread between timeframes.
+        """
+        number_of_phonons = len(references)
+        heat_flux, temperature_gradient = np.sum(heat_fluxes, axis=0), np.sum(temperature_gradients, axis=0)
+        is_valid = temperature_gradient != 0
+        if number_of_phonons < 2 or not np.any(is_valid) or np.var(references) == 0:
+            return 0.0, 0.0, 0.0, 0.0
+
+        thermal_conductivities = heat_flux[is_valid] / temperature_gradient[is_valid]
+        contributions = (heat_fluxes[:, is_valid] - thermal_conductivities * temperature_gradients[:, is_valid]) / temperature_gradient[is_valid]
+        deviations = contributions - np.mean(contributions, axis=0)
+        reference_deviations = references - np.mean(references)
+        coefficients = reference_deviations @ deviations / np.sum(reference_deviations**2)
+
+        corrected = thermal_conductivities - coefficients * np.sum(references - expected_value)
+        error = sqrt(number_of_phonons * np.mean(np.var(deviations, axis=0)))
+        corrected_error = sqrt(number_of_phonons * np.mean(np.var(deviations - np.outer(reference_deviations, coefficients), axis=0)))
+        correlation = np.mean(np.corrcoef(np.column_stack((references, deviations)), rowvar=False)[0, 1:])
+        return np.mean(corrected), corrected_error, error, correlation
+
+    def calculate_thermal_conductivity(self, material):
+        """Calculate the corrected effective and material thermal conductivities and their errors"""
+        references = np.array(self.references)
+        temperature_gradients = np.array(self.temperature_gradients)
+        self.expected_reference = expected_reference(material)
+        (self.av_effective_thermal_conductivity, self.std_effective_thermal_conductivity,
+         self.uncorrected_std_effective_thermal_conductivity, self.correlation_effective) = self.correct(
+            np.array(self.heat_fluxes_effective), temperature_gradients, references, self.expected_reference)
+        (self.av_material_thermal_conductivity, self.std_material_thermal_conductivity,
+         self.uncorrected_std_material_thermal_conductivity, self.correlation_material) = self.correct(
+            np.array(self.heat_fluxes_material), temperature_gradients, references, self.expected_reference)
+
+    def write_into_files(self):
+        """Write the corrected thermal conductivity into a file"""
+        data = np.vstack((self.av_effective_thermal_conductivity, self.av_material_thermal_conductivity,
+                          self.std_effective_thermal_conductivity, self.std_material_thermal_conductivity,
+                          self.uncorrected_std_effective_thermal_conductivity, self.uncorrected_std_material_thermal_conductivity,
+                          self.correlation_effective, self.correlation_material)).T
+        header = ("K_eff (W/mK), K_mat (W/mK), error_eff (W/mK), error_mat (W/mK), " +
+                  "uncorrected error_eff (W/mK), uncorrected error_mat (W/mK), correlation_eff, correlation_mat")
+        np.savetxt("Data/Control variate thermal conductivity.csv", data, fmt='%1.3e', delimiter=",", header=header, encoding='utf-8')
+
+    def dump_data(self):
+        """Return data of a process in the form of a dictionary to be attached to the global data"""
+        return {
+            'heat_fluxes_effective': self.heat_fluxes_effective,
+            'heat_fluxes_material': self.heat_fluxes_material,
+            'temperature_gradients': self.temperature_gradients,
+            'references': self.references,
+        }
@@ -3,7 +3,13 @@
 import numpy as np
 
 from freepaths.config import cf
-from freepaths.scattering_types import Scattering
+from freepaths.scattering_types import Scattering, Surface, event_code, NUMBER_OF_CODES, NUMBER_OF_PLACE_CODES
+from freepaths.termination import Termination
+
+CODES = np.arange(NUMBER_OF_CODES)
+PLACE_CODES = np.arange(NUMBER_OF_PLACE_CODES)
+BUFFER_SIZE = 100000        # Number of events recorded before they are added to the arrays
+
 
 class Data:
     """Parent data class with functions common to all classes below"""
@@ -14,6 +20,26 @@ class Data:
             setattr(self, key, getattr(self, key) + value)
 
 
+class BufferedData(Data):
+    """
+    Parent class for statistics recorded on each timestep.
+    Events are appended to a list and added to the arrays in batches,
+    which is much faster than updating the arrays item by item.
+    """
+
+    def buffer_event(self, event):
+        """Add the event to the buffer and flush the buffer if it is full"""
+        self.buffer.append(event)
+        if len(self.buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Add all the buffered events to the arrays"""
+        if self.buffer:
+            self.add_events(np.array(self.buffer))
+            self.buffer.clear()
+
+
 class PathData(Data):
     """Paths of phonons in space"""
 
@@ -62,6 +88,7 @@ class GeneralData(Data):
         self.travel_times = []
         self.mean_free_paths = []
         self.thermal_conductivity = []
+        self.terminated_phonons = np.zeros(len(Termination))
 
     def save_phonon_data(self, ph):
         """Add information about the phonon to the dataset"""
@@ -79,6 +106,8 @@ class GeneralData(Data):
         self.travel_times.append(flight.travel_time)
         self.mean_free_paths.append(flight.mean_free_path)
         self.thermal_conductivity.append(flight.thermal_conductivity)
+        if flight.termination:
+            self.terminated_phonons[flight.termination.value] += 1
 
     def write_into_files(self):
         """Write all the data into files"""
@@ -108,67 +137,53 @@ class GeneralData(Data):
             'travel_times': self.travel_times,
             'mean_free_paths': self.mean_free_paths,
             'thermal_conductivity': self.thermal_conductivity,
+            'terminated_phonons': self.terminated_phonons,
         }
 
 
-class ScatteringData(Data):
+class ScatteringData(BufferedData):
     """Statistics of phonon scattering events"""
 
     def __init__(self):
-        """Initialize arrays according to the number of segments"""
-        self.wall_diffuse = np.zeros(cf.number_of_length_segments+1)
-        self.wall_specular = np.zeros(cf.number_of_length_segments+1)
-        self.top_diffuse = np.zeros(cf.number_of_length_segments+1)
-        self.top_specular = np.zeros(cf.number_of_length_segments+1)
-        self.hole_diffuse = np.zeros(cf.number_of_length_segments+1)
-        self.hole_specular = np.zeros(cf.number_of_length_segments+1)
-        self.pillar_diffuse = np.zeros(cf.number_of_length_segments+1)
-        self.pillar_specular = np.zeros(cf.number_of_length_segments+1)
-        self.hot_side = np.zeros(cf.number_of_length_segments+1)
-        self.internal = np.zeros(cf.number_of_length_segments+1)
-        self.interfaces_diffuse = np.zeros(cf.number_of_length_segments+1)
-        self.interfaces_specular = np.zeros(cf.number_of_length_segments+1)
+        """Initialize the matrix of event counts, where rows are segments and columns are event codes"""
+        self.counts = np.zeros((cf.number_of_length_segments+1, NUMBER_OF_CODES))
         self.total = np.zeros(cf.number_of_length_segments+1)
+        self.segment_length = cf.length / cf.number_of_length_segments
+        self.buffer = []
 
     def save_scattering_events(self, y, scattering_types):
-        """Analyze types of scattering at the current timestep and add it to the statistics"""
-
-        try:
-            # Calculate in which length segment (starting from zero) we are:
-            segment = int(y // (cf.length / cf.number_of_length_segments))
-            self.total[segment] += 1
-
-            # Scattering on side walls:
-            self.wall_diffuse[segment]  += 1 if scattering_types.walls == Scattering.DIFFUSE else 0
-            self.wall_specular[segment] += 1 if scattering_types.walls == Scattering.SPECULAR else 0
-
-            # Scattering on top and bottom:
-            self.top_diffuse[segment]  += 1 if scattering_types.top_bottom == Scattering.DIFFUSE else 0
-            self.top_specular[segment] += 1 if scattering_types.top_bottom == Scattering.SPECULAR else 0
+        """Record the length segment (starting from zero) and the types of scattering at the current timestep"""
+        self.buffer_event((int(y // self.segment_length), scattering_types.events))
+
+    def add_events(self, events):
+        """Add the buffered scattering events to the statistics, where negative segments count from the end"""
+        segments, masks = events[:, 0], events[:, 1]
+        number_of_rows = len(self.total)
+        is_valid = (-number_of_rows <= segments) & (segments < number_of_rows)
+        segments, masks = segments[is_valid] % number_of_rows, masks[is_valid]
+        self.total += np.bincount(segments, minlength=number_of_rows)
+        np.add.at(self.counts, segments, (masks[:, np.newaxis] >> CODES) & 1)
 
-            # Scattering on holes:
-            self.hole_diffuse[segment]  += 1 if scattering_types.holes == Scattering.DIFFUSE else 0
-            self.hole_specular[segment] += 1 if scattering_types.holes == Scattering.SPECULAR else 0
-
-            # Scattering on pillars:
-            self.pillar_diffuse[segment]  += 1 if scattering_types.pillars == Scattering.DIFFUSE else 0
-            self.pillar_specular[segment] += 1 if scattering_types.pillars == Scattering.SPECULAR else 0
-
-            # Scattering on pillars:
-            self.interfaces_diffuse[segment]  += 1 if scattering_types.interfaces == Scattering.DIFFUSE else 0
-            self.interfaces_specular[segment] += 1 if scattering_types.interfaces == Scattering.SPECULAR else 0
+    @property
+    def diffuse_events(self):
+        """Total number of diffuse scattering events on each surface"""
+        return np.sum(self.counts[:, event_code(0, Scattering.DIFFUSE)::2], axis=0)
 
-            # Internal scattering and rethermalization on hot side:
-            self.hot_side[segment] += 1 if scattering_types.hot_side == Scattering.DIFFUSE else 0
-            self.internal[segment] += 1 if scattering_types.internal == Scattering.DIFFUSE else 0
-        except:
-            pass
+    @property
+    def specular_events(self):
+        """Total number of specular scattering events on each surface"""
+        return np.sum(self.counts[:, event_code(0, Scattering.SPECULAR)::2], axis=0)
 
     def write_into_files(self):
         """Write data into a file"""
+        self.flush()
         filename = "Data/Scattering events statistics.csv"
-        data = np.vstack((self.wall_diffuse, self.wall_specular, self.top_diffuse, self.top_specular, self.hole_diffuse,
-                        self.hole_specular, self.hot_side, self.internal, self.pillar_diffuse, self.pillar_specular)).T
+        columns = [(Surface.WALLS, Scattering.DIFFUSE), (Surface.WALLS, Scattering.SPECULAR),
+                   (Surface.TOP_BOTTOM, Scattering.DIFFUSE), (Surface.TOP_BOTTOM, Scattering.SPECULAR),
+                   (Surface.HOLES, Scattering.DIFFUSE), (Surface.HOLES, Scattering.SPECULAR),
+                   (Surface.HOT_SIDE, Scattering.DIFFUSE), (Surface.INTERNAL, Scattering.DIFFUSE),
+                   (Surface.PILLARS, Scattering.DIFFUSE), (Surface.PILLARS, Scattering.SPECULAR)]
+        data = self.counts[:, [event_code(surface, scattering) for surface, scattering in columns]]
         header1 = "Sidewalls diffuse, Sidewalls specular, Top & bottom diffuse, Top & bottom specular, "
         header2 = "Holes diffuse, Holes specular, Hot side, Internal, Pillars diffuse, Pillars specular"
         header = header1 + header2
@@ -176,19 +191,9 @@ class ScatteringData(Data):
 
     def dump_data(self):
         """Return data of a process in the form of a dictionary to be attached to the global data"""
+        self.flush()
         return {
-            'wall_diffuse': self.wall_diffuse,
-            'wall_specular': self.wall_specular,
-            'top_diffuse': self.top_diffuse,
-            'top_specular': self.top_specular,
-            'hole_diffuse': self.hole_diffuse,
-            'hole_specular': self.hole_specular,
-            'pillar_diffuse': self.pillar_diffuse,
-            'pillar_specular': self.pillar_specular,
-            'hot_side': self.hot_side,
-            'internal': self.internal,
-            'interfaces_diffuse': self.interfaces_diffuse,
-            'interfaces_specular': self.interfaces_specular,
+            'counts': self.counts,
             'total': self.total
         }
 
@@ -197,55 +202,33 @@ class TriangleScatteringData(Data):
     """Statistics of phonon scattering events on triangular holes"""
 
     def __init__(self):
-        """Initialize arrays according to the number of segments"""
-        self.right_wall_diffuse = 0
-        self.right_wall_specular = 0
-        self.left_wall_diffuse = 0
-        self.left_wall_specular = 0
-        self.floor_diffuse = 0
-        self.floor_specular = 0
+        """Initialize the counts of events, indexed by event codes of the places"""
+        self.counts = np.zeros(NUMBER_OF_PLACE_CODES)
 
     def save_scattering_events(self, y, triangle_scattering_places):
         """Analyze types of scattering at the current timestep and add it to the statistics"""
-
-        try:
-            self.right_wall_diffuse  += 1 if triangle_scattering_places.right_wall == Scattering.DIFFUSE else 0
-            self.right_wall_specular += 1 if triangle_scattering_places.right_wall == Scattering.SPECULAR else 0
-            self.left_wall_diffuse  += 1 if triangle_scattering_places.left_wall == Scattering.DIFFUSE else 0
-            self.left_wall_specular += 1 if triangle_scattering_places.left_wall == Scattering.SPECULAR else 0
-            self.floor_diffuse += 1 if triangle_scattering_places.floor == Scattering.DIFFUSE else 0
-            self.floor_specular += 1 if triangle_scattering_places.floor == Scattering.SPECULAR else 0
-        except:
-            pass
+        self.counts += (triangle_scattering_places.events >> PLACE_CODES) & 1
 
     def write_into_files(self):
         """Write data into a file"""
         filename = "Data/Triangle scattering statistics.csv"
-        data = np.vstack(np.array([self.right_wall_diffuse, self.right_wall_specular,
-                self.left_wall_diffuse, self.left_wall_specular,
-                self.floor_diffuse, self.floor_specular])).T
+        data = self.counts[np.newaxis, :]
         header = "Inclined right diffuse, Inclinded right specular, Inclined left diffuse, Inclinded left specular, Floor diffuse, Floor specular"
         np.savetxt(filename, data, fmt='%1.3e', delimiter=",", header=header, encoding='utf-8')
 
     def dump_data(self):
         """Return data of a process in the form of a dictionary to be attached to the global data"""
-        return {
-            'right_wall_diffuse': self.right_wall_diffuse,
-            'right_wall_specular': self.right_wall_specular,
-            'left_wall_diffuse': self.left_wall_diffuse,
-            'left_wall_specular': self.left_wall_specular,
-            'floor_diffuse': self.floor_diffuse,
-            'floor_specular': self.floor_specular,
-        }
+        return {'counts': self.counts}
 
 
-
-class SegmentData(Data):
+class SegmentData(BufferedData):
     """Statistics of events happening in different segments"""
 
     def __init__(self):
         """Initialize arrays according to the number of segments"""
         self.time_spent = np.zeros(cf.number_of_length_segments)
+        self.segment_length = cf.length / cf.number_of_length_segments
+        self.buffer = []
 
     @property
     def segment_coordinates(self):
@@ -255,20 +238,23 @@ class SegmentData(Data):
         return segments
 
     def record_time_in_segment(self, coordinate):
-        """Record how long phonon stays in different segments"""
-        for segment_number in range(cf.number_of_length_segments):
-            segment_beginning = segment_number * (cf.length / cf.number_of_length_segments)
-            segment_end = (segment_number + 1)*(cf.length / cf.number_of_length_segments)
-            if segment_beginning <= coordinate < segment_end:
-                self.time_spent[segment_number] += cf.timestep * 1e6
+        """Record in which segment the phonon stays at this timestep"""
+        self.buffer_event(int(coordinate // self.segment_length))
+
+    def add_events(self, segments):
+        """Add the time of the buffered timesteps to the segments where phonons stayed"""
+        segments = segments[(0 <= segments) & (segments < cf.number_of_length_segments)]
+        self.time_spent += np.bincount(segments, minlength=cf.number_of_length_segments) * cf.timestep * 1e6
 
     def write_into_files(self):
         """Write data into files"""
+        self.flush()
         filename = "Data/Time spent in segments.csv"
         data = np.vstack((self.segment_coordinates, self.time_spent)).T
         np.savetxt(filename, data, fmt='%1.3e', delimiter=",", header="Y [um], Time [ns]", encoding='utf-8')
 
     def dump_data(self):
         """Return data of a process in the form of a dictionary to be attached to the global data"""
+        self.flush()
         return {'time_spent': self.time_spent}
 
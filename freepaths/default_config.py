@@ -9,6 +9,8 @@ OUTPUT_FOLDER_NAME               = "Si nanowire at 300 K"
 NUMBER_OF_PHONONS                = 5000
 NUMBER_OF_NODES                  = 400
 T                                = 300
+TEMPERATURE_DIFFERENCE           = 1.0
+TEMPERATURES                     = None
 OUTPUT_SCATTERING_MAP            = False
 OUTPUT_TRAJECTORIES_OF_FIRST     = 50
 OUTPUT_STRUCTURE_COLOR           = "#F0F0F0"
@@ -20,6 +22,11 @@ NUMBER_OF_TIMESTEPS              = 300000
 NUMBER_OF_VIRTUAL_TIMESTEPS      = NUMBER_OF_TIMESTEPS * 3
 NUMBER_OF_TIMEFRAMES             = 8
 NUMBER_OF_STABILIZATION_TIMEFRAMES = 5
+AUTO_TIMESTEP                    = False
+AUTO_NUMBER_OF_TIMESTEPS         = False
+NUMBER_OF_PILOT_PHONONS          = 50
+TERMINATE_STUCK_PHONONS          = True
+TERMINATION_CHECK_WINDOW         = 1000
 
 
 # Animation:
@@ -31,6 +38,26 @@ NUMBER_OF_PIXELS_X               = 25
 NUMBER_OF_PIXELS_Y               = 100
 IGNORE_FAULTY_PHONONS            = False
 
+# Variance reduction:
+CONTROL_VARIATE_REFERENCE        = None
+
+# MFP sampling mode:
+USE_MFP_CACHE                    = False
+USE_ADAPTIVE_QUADRATURE          = False
+ADAPTIVE_QUADRATURE_TOLERANCE    = 0.01
+
+# Cell transfer mode:
+NUMBER_OF_CELLS                  = 1000
+CELL_POSITION_BINS               = 4
+CELL_POLAR_ANGLE_BINS            = 4
+CELL_AZIMUTHAL_ANGLE_BINS        = 4
+CELL_FREQUENCY_BINS              = 10
+CELL_PHONONS_PER_STATE           = 10
+
+# Ballistic transmission mode:
+TRANSMISSION_FREQUENCY_BINS      = 20
+TRANSMISSION_PHONONS_PER_BIN     = 100
+
 # Material parameters:
 MEDIA                            = "Si"
 
@@ -48,6 +75,7 @@ INCLUDE_RIGHT_SIDEWALL           = True
 INCLUDE_LEFT_SIDEWALL            = True
 INCLUDE_TOP_SIDEWALL             = False
 INCLUDE_BOTTOM_SIDEWALL          = False
+PERIODIC_SIDEWALLS               = False
 
 # Hot and cold sides [m]:
 COLD_SIDE_POSITION_TOP           = True
@@ -76,5 +104,9 @@ HOLES                            = []
 PILLARS                          = []
 INTERFACES                       = []
 
+# Layout file (.csv or .gds) with additional holes and the GDSII layer to read them from:
+LAYOUT_FILE                      = None
+LAYOUT_LAYER                     = None
+
 # Multiprocessing:
 NUMBER_OF_PROCESSES              = 10
@@ -0,0 +1,143 @@
+"""
+Module that provides deviational energy-based Monte Carlo, following
+Péraud and Hadjiconstantinou, Phys. Rev. B 84, 205331 (2011).
+Instead of the full phonon population, we simulate only the deviation from the equilibrium at cf.temp.
+The hot side at cf.temp + TEMPERATURE_DIFFERENCE emits deviational particles, each carrying the same amount of energy,
+while the cold side at equilibrium emits nothing. Thus, all particles contribute to the signal.
+Both sides are black bodies, so particles are absorbed by the hot side as well as by the cold side.
+"""
+
+from math import pi
+from random import random
+import numpy as np
+
+from freepaths.config import cf
+from freepaths.phonon import Phonon
+from freepaths.maps import ThermalMaps
+from freepaths.temperature_sweep import heat_capacity
+
+
+def absorbing_hot_sides():
+    """Parameters with which the hot sides absorb the particles like the cold sides, instead of re-thermalizing them"""
+    return {
+        'cold_side_position_top': cf.cold_side_position_top or cf.hot_side_position_top,
+        'cold_side_position_bottom': cf.cold_side_position_bottom or cf.hot_side_position_bottom,
+        'cold_side_position_right': cf.cold_side_position_right or cf.hot_side_position_right,
+        'cold_side_position_left': cf.cold_side_position_left or cf.hot_side_position_left,
+        'hot_side_position_top': False,
+        'hot_side_position_bottom': False,
+        'hot_side_position_right': False,
+        'hot_side_position_left': False,
+    }
+
+
+class DeviationalSampler:
+    """
+    Spectral distributions of emitted and relaxed deviational particles and their energy.
+    The sampler should be created before the hot sides are opened, because the energy depends on their area.
+    """
+
+    def __init__(self, material):
+        """Tabulate mode properties over the dispersion of the material and build cumulative distributions"""
+        branches, frequencies, emission_weights, relaxation_weights, volumetric_heat_capacities = [], [], [], [], []
+        wavevectors = material.dispersion[:, 0]
+        for branch_number in range(3):
+            branch = material.dispersion[:, branch_number + 1]
+            f = (branch[1:] + branch[:-1]) / 2
+            k_vector = (wavevectors[1:] + wavevectors[:-1]) / 2
+            d_k = wavevectors[1:] - wavevectors[:-1]
+            speeds = 2 * pi * np.abs(branch[1:] - branch[:-1]) / d_k
+
+            # Mode heat capacity and density of modes in the k-space:
+            mode_heat_capacity = heat_capacity(f, cf.temp)
+            density = k_vector**2 * d_k / (2 * pi**2)
+
+            # Relaxation rate of the modes:
+            with np.errstate(divide='ignore'):
+                if cf.use_gray_approximation_mfp:
+                    relaxation_rates = speeds / cf.gray_approximation_mfp
+                else:
+                    relaxation_rates = 1 / material.relaxation_time(2 * pi * f)
+
+            branches.append(np.full(len(f), branch_number))
+            frequencies.append(f)
+            emission_weights.append(mode_heat_capacity * speeds * density)
+            relaxation_weights.append(mode_heat_capacity * relaxation_rates * density)
+            volumetric_heat_capacities.append(mode_heat_capacity * density)
+
+        self.branches = np.concatenate(branches)
+        self.frequencies = np.concatenate(frequencies)
+        emission_weights = np.concatenate(emission_weights)
+        relaxation_weights = np.nan_to_num(np.concatenate(relaxation_weights))
+        self.emission_cdf = np.cumsum(emission_weights) / np.sum(emission_weights)
+        self.relaxation_cdf = np.cumsum(relaxation_weights) / np.sum(relaxation_weights)
+
+        # Deviational energy flux emitted by a black body surface [W/m^2/K] and the heat capacity of the same modes [J/m^3/K]:
+        self.emitted_flux = np.sum(emission_weights) / 4
+        self.volumetric_heat_capacity = np.sum(np.concatenate(volumetric_heat_capacities))
+        self.particle_energy = self.calculate_particle_energy()
+
+    def sample(self, cdf):
+        """Draw branch and frequency of a mode from the cumulative distribution"""
+        index = min(int(np.searchsorted(cdf, random())), len(cdf) - 1)
+        return int(self.branches[index]), float(self.frequencies[index])
+
+    def sample_emission(self):
+        """Draw a mode emitted by the hot side, i.e. with probability proportional to C(w)*v(w)"""
+        return self.sample(self.emission_cdf)
+
+    def sample_relaxation(self):
+        """Draw a mode after internal scattering, i.e. with probability proportional to C(w)/tau(w)"""
+        return self.sample(self.relaxation_cdf)
+
+    def calculate_particle_energy(self):
+        """Energy [J] carried by each deviational particle emitted during the virtual emission period"""
+        hot_side_area = 0.0
+        if cf.hot_side_position_bottom:
+            hot_side_area += cf.width * cf.thickness
+        if cf.hot_side_position_top:
+            hot_side_area += cf.width * cf.thickness
+        if cf.hot_side_position_right:
+            hot_side_area += cf.length * cf.thickness
+        if cf.hot_side_position_left:
+            hot_side_area += cf.length * cf.thickness
+        if hot_side_area == 0.0:
+            hot_side_area = cf.width * cf.thickness
+        emission_period = cf.number_of_virtual_timesteps * cf.timestep
+        return self.emitted_flux * abs(cf.temperature_difference) * hot_side_area * emission_period / cf.number_of_phonons
+
+
+class DeviationalPhonon(Phonon):
+    """A deviational particle which carries a fixed amount of energy with the sign of the temperature deviation"""
+
+    def __init__(self, material, sampler):
+        """Initialize a particle with a mode drawn from the emission distribution"""
+        self.sampler = sampler
+        self.energy = np.sign(cf.temperature_difference) * sampler.particle_energy
+        super().__init__(material)
+
+    def assign_frequency(self, material):
+        """Assign branch and frequency with probability according to the deviational emission distribution"""
+        self.branch_number, self.f = self.sampler.sample_emission()
+
+    def relax(self, material):
+        """After internal scattering, the particle is re-emitted in a mode drawn from the relaxation distribution"""
+        self.branch_number, self.f = self.sampler.sample_relaxation()
+        self.assign_speed(material)
+
+
+class DeviationalThermalMaps(ThermalMaps):
+    """
+    Thermal maps of deviational particles.
+    Each particle deposits its energy averaged over the timeframe,
+    so the temperature profiles show the deviation from cf.temp in K and heat fluxes are in W/m^2.
+    The energy is converted into temperature with the heat capacity of the modes from which the particles are drawn.
+    """
+
+    def phonon_energy(self, ph):
+        """Energy which the particle contributes to the maps at each timestep"""
+        return ph.energy / self.timepteps_per_timeframe
+
+    def volumetric_heat_capacity(self, ph, material):
+        """Heat capacity [J/m^3/K] of the modes of the deviational particles"""
+        return ph.sampler.volumetric_heat_capacity
@@ -1,6 +1,5 @@
 """Module that provides phonon flight characteristics"""
 
-from math import cos
 import numpy as np
 
 
@@ -34,6 +33,7 @@ class Flight:
         self.initial_frequency = self.phonon.f
         self.initial_theta = self.phonon.theta
         self.path = Path(self.phonon.x, self.phonon.y, self.phonon.z)
+        self.x_offset = 0.0
         self.exit_theta = 0.0
         self.free_path = 0.0
         self.free_path_along_y = 0.0
@@ -44,6 +44,7 @@ class Flight:
         self.hole_spec_scattering_angles = []
         self.free_paths_along_y = []
         self.thermal_conductivity = 0.0
+        self.termination = None
 
     @property
     def mean_free_path(self):
@@ -55,8 +56,8 @@ class Flight:
         return mfp
 
     def add_point_to_path(self):
-        """Add a scattering point to the path"""
-        self.path.add_point(self.phonon.x, self.phonon.y, self.phonon.z)
+        """Add a scattering point to the path, unfolding the crossings of periodic sidewalls"""
+        self.path.add_point(self.phonon.x + self.x_offset, self.phonon.y, self.phonon.z)
 
     def save_free_paths(self):
         """Save current free path to the list of free paths"""
@@ -86,5 +87,5 @@ class Flight:
         """Increase parameters of the flight by length of one step"""
         step_length = self.phonon.speed * timestep
         self.free_path += step_length
-        self.free_path_along_y += step_length * abs(cos(self.phonon.phi)) * abs(cos(self.phonon.theta))
+        self.free_path_along_y += step_length * abs(self.phonon.direction[1])
         self.time_since_previous_scattering += timestep
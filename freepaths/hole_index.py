@@ -0,0 +1,95 @@
+"""
+Module that provides a spatial index of holes.
+The structure is divided into a uniform grid with about one cell per hole, and each cell lists the holes
+whose bounding boxes overlap with it. Thus, on each step only the holes near the phonon are checked,
+and the time of a step does not depend on the number of holes.
+"""
+
+from math import sqrt, inf
+
+HOLES_PER_CELL = 1           # Average number of holes per cell of the grid
+MAX_NUMBER_OF_CELLS = 10**6  # Maximal number of cells in the grid
+
+
+class HoleIndex:
+    """Uniform grid over the structure with the holes that overlap with each cell"""
+
+    def __init__(self, holes, cf):
+        """Distribute the holes into the cells according to their bounding boxes"""
+        number_of_cells = max(1, min(len(holes) // HOLES_PER_CELL, MAX_NUMBER_OF_CELLS))
+        self.number_of_cells_x = max(1, round(sqrt(number_of_cells * cf.width / cf.length)))
+        self.number_of_cells_y = max(1, round(number_of_cells / self.number_of_cells_x))
+        self.x_min = - cf.width / 2
+        self.y_min = 0.0
+        self.inverse_cell_size_x = self.number_of_cells_x / cf.width
+        self.inverse_cell_size_y = self.number_of_cells_y / cf.length
+
+        # Holes are listed in each cell in the same order as in the config:
+        cells = [[] for _ in range(self.number_of_cells_x * self.number_of_cells_y)]
+        cell_boxes = [[] for _ in range(self.number_of_cells_x * self.number_of_cells_y)]
+        for hole in holes:
+            bounding_box = hole.get_bounding_box(cf)
+            if bounding_box is None:
+                column_start, column_end = 0, self.number_of_cells_x - 1
+                row_start, row_end = 0, self.number_of_cells_y - 1
+            else:
+                x_min, x_max, y_min, y_max = bounding_box
+                column_start, row_start = self.cell(x_min, y_min)
+                column_end, row_end = self.cell(x_max, y_max)
+            for row in range(row_start, row_end + 1):
+                for column in range(column_start, column_end + 1):
+                    cells[row * self.number_of_cells_x + column].append(hole)
+                    cell_boxes[row * self.number_of_cells_x + column].append(bounding_box)
+        self.cells = [tuple(cell) for cell in cells]
+        self.cell_boxes = [tuple(boxes) for boxes in cell_boxes]
+
+    def cell(self, x, y):
+        """Column and row of the cell with given coordinates, where points outside the grid belong to the border cells"""
+        column = min(max(int((x - self.x_min) * self.inverse_cell_size_x), 0), self.number_of_cells_x - 1)
+        row = min(max(int((y - self.y_min) * self.inverse_cell_size_y), 0), self.number_of_cells_y - 1)
+        return column, row
+
+    def holes_near(self, x, y):
+        """Holes which might contain the point with given coordinates"""
+        column, row = self.cell(x, y)
+        return self.cells[row * self.number_of_cells_x + column]
+
+    def free_length(self, x, y, d_x, d_y):
+        """
+        Length of the path from the point along the direction until it leaves the cell of the grid
+        or reaches the bounding box of a hole in this cell, i.e. the path along which no hole can be hit
+        """
+        column, row = self.cell(x, y)
+        x_min = self.x_min + column / self.inverse_cell_size_x
+        y_min = self.y_min + row / self.inverse_cell_size_y
+        length = min(self.exit_length(x, d_x, x_min, x_min + 1 / self.inverse_cell_size_x),
+                     self.exit_length(y, d_y, y_min, y_min + 1 / self.inverse_cell_size_y))
+        for box in self.cell_boxes[row * self.number_of_cells_x + column]:
+            if box is None:
+                return 0.0
+            length = min(length, self.entry_length(x, y, d_x, d_y, box))
+        return max(length, 0.0)
+
+    @staticmethod
+    def exit_length(coordinate, direction, minimum, maximum):
+        """Length of the path until the coordinate leaves the interval"""
+        if direction > 0:
+            return (maximum - coordinate) / direction
+        if direction < 0:
+            return (minimum - coordinate) / direction
+        return inf
+
+    @staticmethod
+    def entry_length(x, y, d_x, d_y, box):
+        """Length of the path until it enters the box (slab method), or infinity if it misses the box"""
+        length_in, length_out = 0.0, inf
+        for coordinate, direction, minimum, maximum in ((x, d_x, box[0], box[1]), (y, d_y, box[2], box[3])):
+            if direction == 0:
+                if not minimum <= coordinate <= maximum:
+                    return inf
+                continue
+            length_1 = (minimum - coordinate) / direction
+            length_2 = (maximum - coordinate) / direction
+            length_in = max(length_in, min(length_1, length_2))
+            length_out = min(length_out, max(length_1, length_2))
+        return length_in if length_in <= length_out else inf
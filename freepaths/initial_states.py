@@ -0,0 +1,82 @@
+"""
+Module that generates initial states of phonons in bulk.
+Frequencies are drawn from the same Planck distribution in Debye approximation as in Phonon.assign_frequency,
+but by inverting its cumulative distribution tabulated once per branch instead of by rejection sampling.
+All other initial properties are also drawn as arrays, and phonons are then created from these states one by one.
+"""
+
+from math import pi
+from scipy.constants import k, hbar
+import numpy as np
+
+from freepaths.config import cf
+
+STATES_PER_BATCH = 10000        # Maximal number of initial states generated at once
+NUMBER_OF_CDF_POINTS = 2000     # Number of points in the tabulated cumulative distributions of frequencies
+
+
+class InitialStateGenerator:
+    """Generator of initial states (branch, f, speed, time of internal scattering, x, y, z, theta, phi, first timestep)"""
+
+    def __init__(self, material, number_of_phonons=STATES_PER_BATCH):
+        """Tabulate inverse cumulative distributions of frequencies for each branch"""
+        self.material = material
+        self.batch_size = max(1, min(number_of_phonons, STATES_PER_BATCH))
+        self.rng = np.random.default_rng()
+        self.states = []
+
+        # Planck distribution in Debye approximation, limited by the maximal frequency of the branch:
+        f_peak = 2.82 * k * cf.temp / (2 * pi * hbar)
+        self.frequency_grids = []
+        self.cdfs = []
+        for branch_number in range(3):
+            f_upper = min(5 * f_peak, material.maximum_frequencies[branch_number])
+            frequencies = np.linspace(0, f_upper, NUMBER_OF_CDF_POINTS + 1)
+            centers = (frequencies[1:] + frequencies[:-1]) / 2
+            plank_distribution = centers**3 / np.expm1(hbar * 2 * pi * centers / (k * cf.temp))
+            cdf = np.concatenate(([0.0], np.cumsum(plank_distribution)))
+            self.frequency_grids.append(frequencies)
+            self.cdfs.append(cdf / cdf[-1])
+
+    def generate(self, number):
+        """Generate arrays of initial states of a given number of phonons"""
+        branches = self.rng.integers(0, 3, number)
+        frequencies = np.zeros(number)
+        speeds = np.zeros(number)
+        for branch_number in range(3):
+            is_in_branch = branches == branch_number
+            frequencies[is_in_branch] = np.interp(self.rng.random(np.count_nonzero(is_in_branch)),
+                                                  self.cdfs[branch_number], self.frequency_grids[branch_number])
+            speeds[is_in_branch] = self.material.group_velocities(branch_number, frequencies[is_in_branch])
+
+        # Relaxation time is assigned with some randomization [PRB 94, 174303 (2016)]:
+        if cf.use_gray_approximation_mfp:
+            internal_scattering_times = cf.gray_approximation_mfp / speeds
+        else:
+            with np.errstate(divide='ignore'):
+                internal_scattering_times = -np.log(1 - self.rng.random(number)) * self.material.relaxation_time(2 * pi * frequencies)
+
+        # Coordinates and angles from randomly chosen sources:
+        x, y, z, theta, phi = np.zeros((5, number))
+        sources = self.rng.integers(0, len(cf.phonon_sources), number)
+        for index, source in enumerate(cf.phonon_sources):
+            is_from_source = sources == index
+            number_from_source = np.count_nonzero(is_from_source)
+            x[is_from_source], y[is_from_source], z[is_from_source] = source.generate_coordinates_array(self.rng, number_from_source, cf)
+            theta[is_from_source], phi[is_from_source] = source.generate_angles_array(self.rng, number_from_source)
+
+        # Return angles into the [-pi:pi] range:
+        theta[np.abs(theta) > pi] -= np.sign(theta[np.abs(theta) > pi]) * 2 * pi
+        if cf.is_two_dimensional_material:
+            phi[:] = 0.0
+            z[:] = 0.0
+
+        first_timesteps = self.rng.integers(0, cf.number_of_virtual_timesteps + 1, number)
+        columns = [branches, frequencies, speeds, internal_scattering_times, x, y, z, theta, phi, first_timesteps]
+        return list(zip(*[column.tolist() for column in columns]))
+
+    def next_state(self):
+        """Return the initial state of the next phonon, generating a new batch if necessary"""
+        if not self.states:
+            self.states = self.generate(self.batch_size)[::-1]
+        return self.states.pop()
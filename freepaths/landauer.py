@@ -0,0 +1,36 @@
+"""
+Module that calculates the thermal conductance of a structure from the transmission probabilities of phonons.
+In the Landauer picture, the modes emitted by the hot side carry the heat flux C v / 4 per unit area
+and unit temperature difference, and the conductance is the sum of these fluxes weighted by
+the probability of each mode to reach the cold side.
+"""
+
+from math import pi
+from random import random
+import numpy as np
+
+from freepaths.temperature_sweep import heat_capacity
+
+
+def mode_fluxes(material, temp):
+    """
+    Frequencies [Hz] and heat fluxes [W/m^2/K] emitted by the modes of each branch in each interval of the dispersion,
+    i.e. heat capacity times group velocity times the density of states in the interval divided by four
+    """
+    wavevectors = (material.dispersion[1:, 0] + material.dispersion[:-1, 0]) / 2
+    d_k = np.diff(material.dispersion[:, 0])
+    frequencies = (np.abs(material.dispersion[1:, 1:]) + np.abs(material.dispersion[:-1, 1:])).T / 2
+    speeds = np.array([material.group_velocities(branch_number, frequencies[branch_number]) for branch_number in range(3)])
+    density_of_states = wavevectors**2 * d_k / (2 * pi**2)
+    return frequencies, heat_capacity(frequencies, temp) * speeds * density_of_states / 4
+
+
+def thermal_conductance(fluxes, transmissions):
+    """Thermal conductance per unit area [W/m^2/K] of the modes with given fluxes and transmission probabilities"""
+    return float(np.sum(np.asarray(fluxes) * np.asarray(transmissions)))
+
+
+def draw_mode(indexes, fluxes):
+    """Index of a mode in the bin, drawn with the probability proportional to the heat flux that it carries"""
+    cumulative_fluxes = np.cumsum(fluxes)
+    return int(indexes[min(np.searchsorted(cumulative_fluxes, random() * cumulative_fluxes[-1]), len(indexes) - 1)])
@@ -0,0 +1,149 @@
+"""
+Module that imports holes from lithography layouts.
+A layout can be a GDSII file, which requires gdstk package, or a CSV file with one shape per line:
+circle, x, y, diameter
+rectangle, x, y, size_x, size_y
+polygon, x1, y1, x2, y2, x3, y3, ...
+Coordinates in CSV files are in meters. Shapes are converted into compact arrays of circles, rectangles,
+and polygons, which are cached, so that each layout is parsed only once.
+"""
+
+import os
+import sys
+import hashlib
+import logging
+import numpy as np
+
+from freepaths.scatterers import CircularHole, RectangularHole, PolygonHole
+
+CACHE_FOLDER = "Cache"
+CIRCLE_TOLERANCE = 0.05         # Maximal relative deviation of polygon vertices from a circle to treat it as circle
+MIN_CIRCLE_VERTICES = 16        # Minimal number of vertices of a polygon to treat it as circle
+
+
+class Layout:
+    """Shapes of the layout stored as arrays of circles (x, y, diameter), rectangles (x, y, size_x, size_y), and polygons"""
+
+    def __init__(self, circles, rectangles, polygon_points, polygon_offsets):
+        self.circles = circles
+        self.rectangles = rectangles
+        self.polygon_points = polygon_points        # Vertices of all polygons one after another
+        self.polygon_offsets = polygon_offsets      # Index of the first vertex of each polygon and the total number
+
+    @classmethod
+    def from_shapes(cls, circles, rectangles, polygons):
+        """Pack lists of shapes into arrays"""
+        polygon_offsets = np.cumsum([0] + [len(polygon) for polygon in polygons])
+        polygon_points = np.concatenate(polygons) if polygons else np.zeros((0, 2))
+        return cls(np.array(circles, dtype=float).reshape(-1, 3), np.array(rectangles, dtype=float).reshape(-1, 4),
+                   polygon_points, polygon_offsets)
+
+    def dump(self, filename):
+        """Save the arrays into a file"""
+        np.savez(filename, circles=self.circles, rectangles=self.rectangles,
+                 polygon_points=self.polygon_points, polygon_offsets=self.polygon_offsets)
+
+    @classmethod
+    def load(cls, filename):
+        """Load the arrays from a file"""
+        data = np.load(filename)
+        return cls(data["circles"], data["rectangles"], data["polygon_points"], data["polygon_offsets"])
+
+    def holes(self):
+        """Create hole objects for all the shapes"""
+        holes = [CircularHole(x=x, y=y, diameter=diameter) for x, y, diameter in self.circles.tolist()]
+        holes += [RectangularHole(x=x, y=y, size_x=size_x, size_y=size_y) for x, y, size_x, size_y in self.rectangles.tolist()]
+        for start, end in zip(self.polygon_offsets[:-1], self.polygon_offsets[1:]):
+            holes.append(PolygonHole(points=self.polygon_points[start:end]))
+        return holes
+
+
+def classify_polygon(points, circles, rectangles, polygons):
+    """Add a polygon to circles or rectangles if it has such a shape, or to general polygons otherwise"""
+    if np.all(points[0] == points[-1]):
+        points = points[:-1]
+    x_min, y_min = np.min(points, axis=0)
+    x_max, y_max = np.max(points, axis=0)
+
+    # Rectangles aligned with the axes:
+    tolerance = 1e-6 * max(x_max - x_min, y_max - y_min)
+    is_on_x_sides = (points[:, 0] - x_min <= tolerance) | (x_max - points[:, 0] <= tolerance)
+    is_on_y_sides = (points[:, 1] - y_min <= tolerance) | (y_max - points[:, 1] <= tolerance)
+    if len(points) == 4 and np.all(is_on_x_sides & is_on_y_sides):
+        rectangles.append(((x_min + x_max) / 2, (y_min + y_max) / 2, x_max - x_min, y_max - y_min))
+        return
+
+    # Circles approximated by many vertices:
+    center = np.array([x_min + x_max, y_min + y_max]) / 2
+    radii = np.hypot(*(points - center).T)
+    if len(points) >= MIN_CIRCLE_VERTICES and np.ptp(radii) <= CIRCLE_TOLERANCE * np.mean(radii):
+        circles.append((center[0], center[1], 2 * np.mean(radii)))
+        return
+    polygons.append(points)
+
+
+def read_csv_layout(filename):
+    """Read shapes from a CSV file"""
+    circles, rectangles, polygons = [], [], []
+    with open(filename, encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            shape, *values = [value.strip() for value in line.split(',')]
+            try:
+                values = [float(value) for value in values if value]
+            except ValueError:
+                logging.error(f"Line {line_number} of the layout {filename} contains invalid numbers")
+                sys.exit()
+            if shape == "circle" and len(values) == 3:
+                circles.append(values)
+            elif shape == "rectangle" and len(values) == 4:
+                rectangles.append(values)
+            elif shape == "polygon" and len(values) >= 6 and len(values) % 2 == 0:
+                polygons.append(np.array(values).reshape(-1, 2))
+            else:
+                logging.error(f"Line {line_number} of the layout {filename} is not a valid circle, rectangle, or polygon")
+                sys.exit()
+    return Layout.from_shapes(circles, rectangles, polygons)
+
+
+def read_gds_layout(filename, layer=None):
+    """Read polygons of the top level cells from a GDSII file, optionally only from a given layer"""
+    try:
+        import gdstk
+    except ImportError:
+        logging.error("Reading GDSII layouts requires gdstk package, install it with pip install gdstk")
+        sys.exit()
+    library = gdstk.read_gds(filename)
+    circles, rectangles, polygons = [], [], []
+    for cell in library.top_level():
+        for polygon in cell.get_polygons():
+            if layer is None or polygon.layer == layer:
+                classify_polygon(np.array(polygon.points) * library.unit, circles, rectangles, polygons)
+    return Layout.from_shapes(circles, rectangles, polygons)
+
+
+def read_layout(filename, layer=None):
+    """Read holes from a layout file, using the cached arrays of shapes if this layout was read before"""
+    if not os.path.isfile(filename):
+        logging.error(f"Layout file {filename} does not exist")
+        sys.exit()
+
+    # Cached layout is identified by the content of the file and the layer:
+    with open(filename, 'rb') as file:
+        key = hashlib.sha1(file.read() + repr(layer).encode('utf-8')).hexdigest()[:16]
+    cache_filename = os.path.join(CACHE_FOLDER, f"Layout {key}.npz")
+    if os.path.isfile(cache_filename):
+        return Layout.load(cache_filename).holes()
+
+    if filename.lower().endswith(".csv"):
+        layout = read_csv_layout(filename)
+    else:
+        layout = read_gds_layout(filename, layer)
+    try:
+        os.makedirs(CACHE_FOLDER, exist_ok=True)
+        layout.dump(cache_filename)
+    except OSError:
+        logging.warning(f"Layout could not be cached in the {CACHE_FOLDER} folder")
+    return layout.holes()
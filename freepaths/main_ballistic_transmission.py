@@ -0,0 +1,57 @@
+"""Module to calculate the ballistic transmission function and the thermal conductance of the structure"""
+
+import os
+import sys
+import time
+import shutil
+from colorama import Fore, Style
+
+# Modules:
+from freepaths.config import cf
+from freepaths.materials import get_material
+from freepaths.auto_parameters import adjust_time_parameters
+from freepaths.ballistic_transmission import BallisticTransmission, build_transmission_check, open_hot_sides
+from freepaths.output_info import output_ballistic_transmission_information
+from freepaths.output_plots import plot_transmission_function
+
+
+def main(input_file):
+    """This is the main function, which traces phonons from the hot to the cold sides without internal scattering"""
+
+    print(f'Ballistic transmission of {Fore.GREEN}{cf.output_folder_name}{Style.RESET_ALL}')
+    start_time = time.time()
+
+    # Initialize the material:
+    material = get_material(cf.media, cf.temp)
+
+    # Select time parameters automatically if requested:
+    adjust_time_parameters(material)
+
+    # Phonons that return to the hot sides exit the structure as reflected:
+    transmission = BallisticTransmission(material)
+    is_transmitted = build_transmission_check()
+    open_hot_sides()
+
+    # Trace phonons and integrate the transmission:
+    transmission.trace(is_transmitted)
+    transmission.calculate_conductance()
+
+    # Create the folder if it does not exist and copy input file there:
+    if not os.path.exists("Results/" + cf.output_folder_name):
+        os.makedirs("Results/" + cf.output_folder_name)
+        os.makedirs("Results/" + cf.output_folder_name + '/Data')
+    if input_file:
+        shutil.copy(input_file, "Results/" + cf.output_folder_name)
+    os.chdir("Results/" + cf.output_folder_name)
+
+    # Save and plot the data:
+    transmission.write_into_files()
+    sys.stdout.write("\rAnalyzing the data...")
+    plot_transmission_function()
+
+    # Output general information:
+    output_ballistic_transmission_information(transmission, start_time)
+
+    sys.stdout.write(f'\rSee the results in {Fore.GREEN}Results/{cf.output_folder_name}{Style.RESET_ALL}\n')
+    sys.stdout.write(f"\rThermal conductivity = {Fore.GREEN}{transmission.thermal_conductivity:.5f}{Style.RESET_ALL} W/m·K\n")
+    sys.stdout.write(f"\r{Fore.BLUE}Thank you for using FreePATHS{Style.RESET_ALL}\n\n")
@@ -0,0 +1,56 @@
+"""Module to calculate the thermal conductance of long periodic structures from the transfer of phonons through one cell"""
+
+import os
+import sys
+import time
+import shutil
+from colorama import Fore, Style
+
+# Modules:
+from freepaths.config import cf
+from freepaths.materials import get_material
+from freepaths.auto_parameters import adjust_time_parameters
+from freepaths.cell_transfer import CellTransfer, open_cell_sides
+from freepaths.output_info import output_cell_transfer_information
+from freepaths.output_plots import plot_cell_transmission
+
+
+def main(input_file):
+    """This is the main function, which traces phonons through one cell and chains the cells into the whole structure"""
+
+    print(f'Cell transfer of {Fore.GREEN}{cf.output_folder_name}{Style.RESET_ALL}')
+    start_time = time.time()
+
+    # Initialize the material:
+    material = get_material(cf.media, cf.temp)
+
+    # Select time parameters automatically if requested:
+    adjust_time_parameters(material)
+
+    # Phonons enter and exit the cell through its bottom and top sides:
+    open_cell_sides()
+
+    # Trace phonons through the cell and chain the cells:
+    cell_transfer = CellTransfer(material)
+    cell_transfer.trace_cell()
+    cell_transfer.chain_cells(cf.number_of_cells)
+
+    # Create the folder if it does not exist and copy input file there:
+    if not os.path.exists("Results/" + cf.output_folder_name):
+        os.makedirs("Results/" + cf.output_folder_name)
+        os.makedirs("Results/" + cf.output_folder_name + '/Data')
+    if input_file:
+        shutil.copy(input_file, "Results/" + cf.output_folder_name)
+    os.chdir("Results/" + cf.output_folder_name)
+
+    # Save and plot the data:
+    cell_transfer.write_into_files()
+    sys.stdout.write("\rAnalyzing the data...")
+    plot_cell_transmission()
+
+    # Output general information:
+    output_cell_transfer_information(cell_transfer, start_time)
+
+    sys.stdout.write(f'\rSee the results in {Fore.GREEN}Results/{cf.output_folder_name}{Style.RESET_ALL}\n')
+    sys.stdout.write(f"\rThermal conductivity = {Fore.GREEN}{cell_transfer.thermal_conductivity:.5f}{Style.RESET_ALL} W/m·K\n")
+    sys.stdout.write(f"\r{Fore.BLUE}Thank you for using FreePATHS{Style.RESET_ALL}\n\n")
@@ -6,20 +6,23 @@ import time
 import shutil
 import scipy
 import math
-import logging
 from colorama import Fore, Style
 
 # Modules:
 from freepaths.animation import create_animation
 from freepaths.config import cf
 from freepaths.run_phonon import run_phonon
+from freepaths.step_kernel import StepKernel
 from freepaths.phonon import Phonon
 from freepaths.flight import Flight
 from freepaths.data import ScatteringData, GeneralData, SegmentData, PathData, TriangleScatteringData
 from freepaths.progress import Progress
-from freepaths.materials import Si, SiC, Graphite
-from freepaths.maps import ScatteringMap, ThermalMaps
-from freepaths.output_info import output_general_information, output_scattering_information, output_parameter_warnings
+from freepaths.materials import get_material
+from freepaths.auto_parameters import adjust_time_parameters
+from freepaths.maps import ScatteringMap, ThermalMaps, calculate_pixel_volumes
+from freepaths.mfp_cache import MFPCache, combined_mean_free_path
+from freepaths.adaptive_quadrature import AdaptiveQuadrature
+from freepaths.output_info import output_general_information, output_scattering_information, output_termination_information, output_parameter_warnings
 from freepaths.output_plots import plot_data
 
 
@@ -30,16 +33,17 @@ def main(input_file):
     start_time = time.time()
     progress = Progress()
 
-    # Initialize the material:
-    if cf.media == "Si":
-        material = Si(cf.temp, num_points=cf.number_of_phonons +1)
-    elif cf.media == "SiC":
-        material = SiC(cf.temp, num_points=cf.number_of_phonons+1)
-    elif cf.media == "Graphite":
-        material = Graphite(cf.temp, num_points=cf.number_of_phonons+1)
+    # Initialize the material, whose dispersion is also the integration grid unless the quadrature is adaptive:
+    if cf.use_adaptive_quadrature:
+        material = get_material(cf.media, cf.temp)
     else:
-        logging.error(f"Material {cf.media} is not supported")
-        sys.exit()
+        material = get_material(cf.media, cf.temp, num_points=cf.number_of_phonons+1)
+
+    # Calculate the pixel volumes once for all the maps:
+    vol_pixel_ratio = calculate_pixel_volumes(cf.number_of_pixels_x, cf.number_of_pixels_y)
+
+    # Select time parameters automatically if requested:
+    adjust_time_parameters(material, vol_pixel_ratio)
 
     # Initiate data structures:
     scatter_stats = ScatteringData()
@@ -48,14 +52,56 @@ def main(input_file):
     places_stats = TriangleScatteringData()
     path_stats = PathData()
     scatter_maps = ScatteringMap()
-    thermal_maps = ThermalMaps()
+    thermal_maps = ThermalMaps(vol_pixel_ratio)
 
     total_thermal_conductivity = 0.0
+    integration_error = 0.0
+
+    # With the cache, phonons are traced without internal scattering, which is added afterwards:
+    include_internal_scattering = cf.include_internal_scattering
+    if cf.use_mfp_cache:
+        mfp_cache = MFPCache()
+        cf.include_internal_scattering = False
+    kernel = StepKernel()
+
+    def trace(phonon, use_cache=True):
+        """Run the phonon through the structure or take its free paths from the cache and return its mean free path"""
+        flight = Flight(phonon)
+        use_cache = use_cache and cf.use_mfp_cache
+        cached_flight = mfp_cache.get(phonon.branch_number, phonon.f) if use_cache else None
+        if cached_flight:
+            flight.free_paths, flight.travel_time = cached_flight
+        else:
+            run_phonon(phonon, flight, scatter_stats, places_stats, segment_stats, thermal_maps, scatter_maps, material, kernel)
+            if use_cache:
+                mfp_cache.add(phonon.branch_number, phonon.f, flight)
+
+        mean_free_path = flight.mean_free_path
+        if cf.use_mfp_cache and include_internal_scattering:
+            if cf.use_gray_approximation_mfp:
+                internal_mean_free_path = cf.gray_approximation_mfp
+            else:
+                internal_mean_free_path = phonon.speed * material.relaxation_time(2 * math.pi * phonon.f)
+            mean_free_path = combined_mean_free_path(flight.free_paths, internal_mean_free_path)
+        return flight, mean_free_path
 
     # For each polarization branch:
     for branch_number in range(3):
         sys.stdout.write(f"\rIntegrating branch number {branch_number+1}.\n")
 
+        # Integrate adaptively and record all the traced phonons:
+        if cf.use_adaptive_quadrature:
+            quadrature = AdaptiveQuadrature(material, branch_number, trace)
+            quadrature.integrate()
+            total_thermal_conductivity += quadrature.thermal_conductivity
+            integration_error = math.sqrt(integration_error**2 + quadrature.error**2)
+            for index, (phonon, flight) in enumerate(quadrature.traced_phonons):
+                general_stats.save_phonon_data(phonon)
+                general_stats.save_flight_data(flight)
+                if index < cf.output_trajectories_of_first:
+                    path_stats.save_phonon_path(flight)
+            continue
+
         # For each phonon:
         for index in range(cf.number_of_phonons):
 
@@ -63,12 +109,9 @@ def main(input_file):
             k_vector = (material.dispersion[index+1, 0] + material.dispersion[index, 0]) / 2
             d_k_vector = (material.dispersion[index+1, 0] - material.dispersion[index, 0])
 
-            # Initiate a phonon and its flight:
+            # Initiate a phonon and run it:
             phonon = Phonon(material, branch_number, index)
-            flight = Flight(phonon)
-
-            # Run this phonon through the structure:
-            run_phonon(phonon, flight, scatter_stats, places_stats, segment_stats, thermal_maps, scatter_maps, material)
+            flight, mean_free_path = trace(phonon)
 
             # Heat capacity, Ref. PRB 88 155318 (2013):
             omega = 2 * math.pi * phonon.f
@@ -76,7 +119,7 @@ def main(input_file):
             c_p = scipy.constants.k * part**2 * math.exp(part) / (math.exp(part) - 1)**2
 
             # Thermal conductivity, Ref. Phys. Rev. 132 2461 (1963):
-            mean_relax_time = flight.mean_free_path/phonon.speed
+            mean_relax_time = mean_free_path/phonon.speed
             flight.thermal_conductivity = (1/(6*(math.pi**2)))*c_p*(phonon.speed**2)*mean_relax_time*(k_vector**2)*d_k_vector
             total_thermal_conductivity += flight.thermal_conductivity
 
@@ -88,6 +131,12 @@ def main(input_file):
             if index < cf.output_trajectories_of_first:
                 path_stats.save_phonon_path(flight)
 
+    # Save newly traced phonons for future runs:
+    if cf.use_mfp_cache:
+        mfp_cache.write_into_file()
+        cf.include_internal_scattering = include_internal_scattering
+        sys.stdout.write(f"\r{mfp_cache.number_of_reused_entries} phonons were taken from the cache.\n")
+
     # Run additional calculations:
     thermal_maps.calculate_thermal_conductivity()
     thermal_maps.calculate_weighted_flux()
@@ -120,8 +169,11 @@ def main(input_file):
     # Output general information:
     output_general_information(start_time)
     output_scattering_information(scatter_stats)
+    output_termination_information(general_stats)
     output_parameter_warnings()
 
     sys.stdout.write(f'\rSee the results in {Fore.GREEN}Results/{cf.output_folder_name}{Style.RESET_ALL}\n')
     sys.stdout.write(f"\rThermal conductivity = {Fore.GREEN}{total_thermal_conductivity:.5f}{Style.RESET_ALL} W/m·K\n")
+    if cf.use_adaptive_quadrature:
+        sys.stdout.write(f"\rEstimated integration error = {integration_error:.5f} W/m·K ({len(general_stats.frequencies)} phonons traced)\n")
     sys.stdout.write(f"\r{Fore.BLUE}Thank you for using FreePATHS{Style.RESET_ALL}\n\n")
@@ -0,0 +1,139 @@
+"""Module to calculate thermal conductivity at many temperatures from a single tracing of phonons"""
+
+import os
+import sys
+import time
+import shutil
+from colorama import Fore, Style
+
+# Modules:
+from freepaths.animation import create_animation
+from freepaths.config import cf
+from freepaths.run_phonon import run_phonon
+from freepaths.step_kernel import StepKernel
+from freepaths.phonon import Phonon
+from freepaths.flight import Flight
+from freepaths.data import ScatteringData, GeneralData, SegmentData, PathData, TriangleScatteringData
+from freepaths.materials import get_material
+from freepaths.auto_parameters import adjust_time_parameters
+from freepaths.maps import ScatteringMap, ThermalMaps, calculate_pixel_volumes
+from freepaths.temperature_sweep import TemperatureSweep
+from freepaths.mfp_cache import MFPCache
+from freepaths.output_info import output_general_information, output_scattering_information, output_termination_information, output_parameter_warnings, output_temperature_sweep_information
+from freepaths.output_plots import plot_data, plot_thermal_conductivity_vs_temperature
+
+
+def main(input_file):
+    """This is the main function, which traces phonons once and reweights them to calculate thermal conductivity at various temperatures"""
+
+    print(f'Temperature sweep of {Fore.GREEN}{cf.output_folder_name}{Style.RESET_ALL}')
+    start_time = time.time()
+    temperatures = cf.temperatures if cf.temperatures is not None else [cf.temp]
+
+    # Initialize the material:
+    material = get_material(cf.media, cf.temp, num_points=cf.number_of_phonons+1)
+
+    # Calculate the pixel volumes once for all the maps:
+    vol_pixel_ratio = calculate_pixel_volumes(cf.number_of_pixels_x, cf.number_of_pixels_y)
+
+    # Select time parameters automatically if requested:
+    adjust_time_parameters(material, vol_pixel_ratio)
+
+    # Boundary scattering does not depend on temperature, so internal scattering is added later:
+    cf.include_internal_scattering = False
+    kernel = StepKernel()
+
+    # Initiate data structures:
+    scatter_stats = ScatteringData()
+    general_stats = GeneralData()
+    segment_stats = SegmentData()
+    places_stats = TriangleScatteringData()
+    path_stats = PathData()
+    scatter_maps = ScatteringMap()
+    thermal_maps = ThermalMaps(vol_pixel_ratio)
+    temperature_sweep = TemperatureSweep()
+    if cf.use_mfp_cache:
+        mfp_cache = MFPCache()
+
+    # For each polarization branch:
+    for branch_number in range(3):
+        sys.stdout.write(f"\rTracing branch number {branch_number+1}.\n")
+
+        # For each phonon:
+        for index in range(cf.number_of_phonons):
+
+            # Wave vector:
+            k_vector = (material.dispersion[index+1, 0] + material.dispersion[index, 0]) / 2
+            d_k_vector = (material.dispersion[index+1, 0] - material.dispersion[index, 0])
+
+            # Initiate a phonon and its flight:
+            phonon = Phonon(material, branch_number, index)
+            flight = Flight(phonon)
+
+            # Run this phonon through the structure or take its free paths from the cache:
+            cached_flight = mfp_cache.get(branch_number, phonon.f) if cf.use_mfp_cache else None
+            if cached_flight:
+                flight.free_paths, flight.travel_time = cached_flight
+            else:
+                run_phonon(phonon, flight, scatter_stats, places_stats, segment_stats, thermal_maps, scatter_maps, material, kernel)
+                if cf.use_mfp_cache:
+                    mfp_cache.add(branch_number, phonon.f, flight)
+
+            # Record the properties returned for this phonon:
+            temperature_sweep.save_phonon_data(phonon, flight, k_vector, d_k_vector)
+            general_stats.save_phonon_data(phonon)
+            general_stats.save_flight_data(flight)
+
+            # Record trajectories of the first N phonons:
+            if index < cf.output_trajectories_of_first:
+                path_stats.save_phonon_path(flight)
+
+    # Save newly traced phonons for future runs:
+    if cf.use_mfp_cache:
+        mfp_cache.write_into_file()
+
+    # Reweight the phonons for each temperature:
+    temperature_sweep.calculate_thermal_conductivity(temperatures)
+
+    # Run additional calculations:
+    thermal_maps.calculate_thermal_conductivity()
+    thermal_maps.calculate_weighted_flux()
+    thermal_maps.calculate_heat_flux_modulus()
+
+    # Create the folder if it does not exist and copy input file there:
+    if not os.path.exists("Results/" + cf.output_folder_name):
+        os.makedirs("Results/" + cf.output_folder_name)
+        os.makedirs("Results/" + cf.output_folder_name + '/Data')
+    if input_file:
+        shutil.copy(input_file, "Results/" + cf.output_folder_name)
+    os.chdir("Results/" + cf.output_folder_name)
+
+    # Save data into files:
+    general_stats.write_into_files()
+    scatter_stats.write_into_files()
+    segment_stats.write_into_files()
+    thermal_maps.write_into_files()
+    scatter_maps.write_into_files()
+    path_stats.write_into_files()
+    temperature_sweep.write_into_files()
+
+    # Generate animation of phonon paths:
+    if cf.output_path_animation:
+        create_animation()
+
+    # Analyze and plot the data:
+    sys.stdout.write("\rAnalyzing the data...")
+    plot_data()
+    plot_thermal_conductivity_vs_temperature()
+
+    # Output general information:
+    output_general_information(start_time)
+    output_scattering_information(scatter_stats)
+    output_termination_information(general_stats)
+    output_temperature_sweep_information(temperature_sweep)
+    output_parameter_warnings()
+
+    sys.stdout.write(f'\rSee the results in {Fore.GREEN}Results/{cf.output_folder_name}{Style.RESET_ALL}\n')
+    for temp, thermal_conductivity in zip(temperature_sweep.temperatures, temperature_sweep.thermal_conductivity):
+        sys.stdout.write(f"\rThermal conductivity at {temp:g} K = {Fore.GREEN}{thermal_conductivity:.5f}{Style.RESET_ALL} W/m·K\n")
+    sys.stdout.write(f"\r{Fore.BLUE}Thank you for using FreePATHS{Style.RESET_ALL}\n\n")
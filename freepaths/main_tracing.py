@@ -6,19 +6,23 @@ import time
 import shutil
 import colorama
 import multiprocessing
-import logging
 from colorama import Fore, Style
 
 # Modules:
 from freepaths.config import cf
 from freepaths.run_phonon import run_phonon
+from freepaths.step_kernel import StepKernel
 from freepaths.phonon import Phonon
 from freepaths.flight import Flight
 from freepaths.data import ScatteringData, GeneralData, SegmentData, PathData, TriangleScatteringData
 from freepaths.progress import Progress
-from freepaths.materials import Si, SiC, Graphite
-from freepaths.maps import ScatteringMap, ThermalMaps
-from freepaths.output_info import output_general_information, output_scattering_information, output_parameter_warnings
+from freepaths.materials import get_material
+from freepaths.maps import ScatteringMap, ThermalMaps, calculate_pixel_volumes
+from freepaths.initial_states import InitialStateGenerator
+from freepaths.control_variate import ControlVariate
+from freepaths.auto_parameters import adjust_time_parameters, apply_overrides
+from freepaths.deviational import DeviationalSampler, DeviationalPhonon, DeviationalThermalMaps, absorbing_hot_sides
+from freepaths.output_info import output_general_information, output_scattering_information, output_termination_information, output_parameter_warnings, output_control_variate_information
 from freepaths.animation import create_animation
 from freepaths.output_plots import plot_data
 
@@ -29,18 +33,11 @@ class PhononSimulator:
     It is meant to be used as a worker for multiprocessing
     """
 
-    def __init__(self, worker_id, total_phonons, shared_list, output_trajectories_of):
+    def __init__(self, worker_id, total_phonons, shared_list, output_trajectories_of, sampler=None, vol_pixel_ratio=None):
 
-        # Initialize the material:
-        if cf.media == "Si":
-            self.material = Si(cf.temp)
-        elif cf.media == "SiC":
-            self.material = SiC(cf.temp)
-        elif cf.media == "Graphite":
-            self.material = Graphite(cf.temp)
-        else:
-            logging.error(f"Material {cf.media} is not supported")
-            sys.exit()
+        # Initialize the material and the step functions:
+        self.material = get_material(cf.media, cf.temp)
+        self.kernel = StepKernel()
 
         # Save some general information about the process:
         self.worker_id = worker_id
@@ -48,6 +45,9 @@ class PhononSimulator:
         self.result_queue = shared_list
         self.creation_time = time.time()
         self.output_trajectories_of = output_trajectories_of
+        self.sampler = sampler
+        if self.sampler is None:
+            self.initial_states = InitialStateGenerator(self.material, total_phonons)
 
         # Initiate data structures:
         self.scatter_stats = ScatteringData()
@@ -56,21 +56,27 @@ class PhononSimulator:
         self.path_stats = PathData()
         self.places_stats = TriangleScatteringData()
         self.scatter_maps = ScatteringMap()
-        self.thermal_maps = ThermalMaps()
+        self.thermal_maps = ThermalMaps(vol_pixel_ratio) if sampler is None else DeviationalThermalMaps(vol_pixel_ratio)
+        self.control_variate = ControlVariate()
 
         self.total_thermal_conductivity = 0.0
 
     def simulate_phonon(self, index):
         # Initiate a phonon and its flight:
-        phonon = Phonon(self.material)
+        if self.sampler is None:
+            phonon = Phonon(self.material, initial_state=self.initial_states.next_state())
+        else:
+            phonon = DeviationalPhonon(self.material, self.sampler)
         flight = Flight(phonon)
 
         # Run this phonon through the structure:
-        run_phonon(phonon, flight, self.scatter_stats, self.places_stats, self.segment_stats, self.thermal_maps, self.scatter_maps, self.material)
+        run_phonon(phonon, flight, self.scatter_stats, self.places_stats, self.segment_stats, self.thermal_maps, self.scatter_maps, self.material, self.kernel)
 
         # Record the properties returned for this phonon:
         self.general_stats.save_phonon_data(phonon)
         self.general_stats.save_flight_data(flight)
+        if cf.control_variate_reference:
+            self.control_variate.save_phonon_data(phonon, self.thermal_maps, self.material)
 
         # Record trajectories of the first N phonons:
         if index < self.output_trajectories_of:
@@ -103,6 +109,7 @@ class PhononSimulator:
             'path_stats': self.path_stats.dump_data(),
             'scatter_maps': self.scatter_maps.dump_data(),
             'thermal_maps': self.thermal_maps.dump_data(),
+            'control_variate': self.control_variate.dump_data(),
             'execution_time': time.time() - self.creation_time,
         }
 
@@ -110,10 +117,13 @@ class PhononSimulator:
         self.result_queue.append(collected_data)
 
 
-def worker_process(worker_id, total_phonons, shared_list, output_trajectories_of, finished_workers):
+def worker_process(worker_id, total_phonons, shared_list, output_trajectories_of, finished_workers, sampler, overrides, vol_pixel_ratio):
     try:
+        # Use the parameters selected in the main process:
+        apply_overrides(overrides)
+
         # Create a phononsimulator and run the simulation:
-        simulator = PhononSimulator(worker_id, total_phonons, shared_list, output_trajectories_of)
+        simulator = PhononSimulator(worker_id, total_phonons, shared_list, output_trajectories_of, sampler, vol_pixel_ratio)
         simulator.simulate_phonons(render_progress=1 if worker_id == 0 else 0)
 
         # Declare that the calculation is finished:
@@ -133,13 +143,28 @@ def display_workers_finished(finished_workers):
         time.sleep(0.3)
 
 
-def main(input_file):
+def main(input_file, deviational=False):
     """This is the main function, which works under Debye approximation.
-    It should be used to simulate phonon paths at low temperatures"""
+    It should be used to simulate phonon paths at low temperatures.
+    In the deviational mode, only deviations from the equilibrium at cf.temp are simulated"""
 
-    sys.stdout.write(f'Simulation of {Fore.GREEN}{cf.output_folder_name}{Style.RESET_ALL}\n')
+    mode = "Deviational simulation" if deviational else "Simulation"
+    sys.stdout.write(f'{mode} of {Fore.GREEN}{cf.output_folder_name}{Style.RESET_ALL}\n')
     start_time = time.time()
 
+    # Calculate the pixel volumes once for all the workers:
+    vol_pixel_ratio = calculate_pixel_volumes(cf.number_of_pixels_x, cf.number_of_pixels_y)
+
+    # Select time parameters automatically if requested:
+    overrides = adjust_time_parameters(get_material(cf.media, cf.temp), vol_pixel_ratio)
+
+    # In the deviational mode, the spectrum and energy of particles are calculated once, before the hot sides are opened:
+    sampler = None
+    if deviational:
+        sampler = DeviationalSampler(get_material(cf.media, cf.temp))
+        overrides.update(absorbing_hot_sides())
+        apply_overrides(overrides)
+
     # Create manager for managing variable acces for multiple workers:
     manager = multiprocessing.Manager()
 
@@ -162,7 +187,7 @@ def main(input_file):
     for i in range(cf.num_workers):
         worker_phonons = workload_per_worker + (1 if i < remaining_phonons else 0)
         output_trajectory_of = output_trajectories_per_worker + (1 if i < remaining_output_trajectories else 0)
-        process = multiprocessing.Process(target=worker_process, args=(i, worker_phonons, shared_list, output_trajectory_of, finished_workers))
+        process = multiprocessing.Process(target=worker_process, args=(i, worker_phonons, shared_list, output_trajectory_of, finished_workers, sampler, overrides, vol_pixel_ratio))
         processes.append(process)
         process.start()
 
@@ -187,7 +212,8 @@ def main(input_file):
     segment_stats = SegmentData()
     path_stats = PathData()
     scatter_maps = ScatteringMap()
-    thermal_maps = ThermalMaps()
+    thermal_maps = DeviationalThermalMaps(vol_pixel_ratio) if deviational else ThermalMaps(vol_pixel_ratio)
+    control_variate = ControlVariate()
 
     # Collect the results:
     sys.stdout.write('\nCollecting data from workers...\r')
@@ -209,6 +235,7 @@ def main(input_file):
         path_stats.read_data(collected_data['path_stats'])
         scatter_maps.read_data(collected_data['scatter_maps'])
         thermal_maps.read_data(collected_data['thermal_maps'])
+        control_variate.read_data(collected_data['control_variate'])
         execution_time_list.append(collected_data['execution_time'])
 
     # Give some info about the variability in the worker calculation time:
@@ -224,6 +251,8 @@ def main(input_file):
     thermal_maps.calculate_thermal_conductivity()
     thermal_maps.calculate_weighted_flux()
     thermal_maps.calculate_heat_flux_modulus()
+    if cf.control_variate_reference:
+        control_variate.calculate_thermal_conductivity(get_material(cf.media, cf.temp))
 
     # Create the folder if it does not exist and copy input file there:
     if not os.path.exists(f"Results/{cf.output_folder_name}"):
@@ -244,6 +273,8 @@ def main(input_file):
     thermal_maps.write_into_files()
     scatter_maps.write_into_files()
     path_stats.write_into_files()
+    if cf.control_variate_reference:
+        control_variate.write_into_files()
 
     # Generate animation of phonon paths:
     if cf.output_path_animation:
@@ -256,7 +287,12 @@ def main(input_file):
     # Output general information:
     output_general_information(start_time)
     output_scattering_information(scatter_stats)
+    output_termination_information(general_stats)
+    if cf.control_variate_reference:
+        output_control_variate_information(control_variate, thermal_maps)
     output_parameter_warnings()
 
     sys.stdout.write(f'\rSee the results in {Fore.GREEN}Results/{cf.output_folder_name}{Style.RESET_ALL}\n')
+    if deviational:
+        sys.stdout.write(f"\rThermal conductivity = {Fore.GREEN}{thermal_maps.av_effective_thermal_conductivity:.5f}{Style.RESET_ALL} W/m·K\n")
     sys.stdout.write(f"\r{Fore.BLUE}Thank you for using FreePATHS{Style.RESET_ALL}\n\n")
@@ -1,11 +1,38 @@
 """Module that controls recording, calculation, and saving thermal and scattering maps"""
 
-from math import cos
 from scipy.constants import hbar, pi
 import numpy as np
-from math import cos , sin
 from freepaths.config import cf
-from freepaths.move import move
+
+PIXEL_SUPERSAMPLING = 4     # Number of points along each side of a pixel to calculate its material volume
+
+
+def calculate_pixel_volumes(number_of_pixels_x, number_of_pixels_y):
+    """
+    Calculate a map of the fraction of each pixel filled with material, from 1 for material to 0 for holes.
+    Each pixel is supersampled by a grid of points, and each hole is checked only at the points within its bounding box.
+    """
+    number_of_points_x = number_of_pixels_x * PIXEL_SUPERSAMPLING
+    number_of_points_y = number_of_pixels_y * PIXEL_SUPERSAMPLING
+    x = -cf.width / 2 + cf.width / number_of_points_x * (np.arange(number_of_points_x) + 0.5)
+    y = cf.length / number_of_points_y * (np.arange(number_of_points_y) + 0.5)
+
+    is_material = np.ones((number_of_points_y, number_of_points_x), dtype=bool)
+    for hole in cf.holes + cf.hole_images:
+        bounding_box = hole.get_bounding_box(cf)
+        if bounding_box is None:
+            x_start, x_end, y_start, y_end = 0, number_of_points_x, 0, number_of_points_y
+        else:
+            x_min, x_max, y_min, y_max = bounding_box
+            x_start, x_end = np.searchsorted(x, x_min), np.searchsorted(x, x_max, side='right')
+            y_start, y_end = np.searchsorted(y, y_min), np.searchsorted(y, y_max, side='right')
+        if x_start < x_end and y_start < y_end:
+            x_grid, y_grid = np.meshgrid(x[x_start:x_end], y[y_start:y_end])
+            is_material[y_start:y_end, x_start:x_end] &= ~hole.is_inside_array(x_grid, y_grid, cf)
+
+    is_material = is_material.reshape(number_of_pixels_y, PIXEL_SUPERSAMPLING, number_of_pixels_x, PIXEL_SUPERSAMPLING)
+    return np.mean(is_material, axis=(1, 3))
+
 
 class Maps:
     """Parent maps class with functions common to all classes below"""
@@ -84,8 +111,8 @@ class ScatteringMap(Maps):
 class ThermalMaps(Maps):
     """Maps and profiles of thermal energy in the structure"""
 
-    def __init__(self):
-        """Initialize arrays of thermal maps and other parameters"""
+    def __init__(self, vol_pixel_ratio=None):
+        """Initialize arrays of thermal maps and other parameters, using pixel volumes if they are already calculated"""
         self.thermal_map = np.zeros((cf.number_of_pixels_y, cf.number_of_pixels_x))
         self.effective_heat_flux_profile_x = np.zeros((cf.number_of_pixels_x, cf.number_of_timeframes))
         self.effective_heat_flux_profile_y = np.zeros((cf.number_of_pixels_y, cf.number_of_timeframes))
@@ -109,76 +136,121 @@ class ThermalMaps(Maps):
         self.effective_thermal_conductivity[:, 0] *= self.timepteps_per_timeframe * cf.timestep * 1e9
         self.material_thermal_conductivity[:, 0] = self.effective_thermal_conductivity[:, 0]
 
+        # Heat flux and temperature gradient contributed by the current phonon in each timeframe (for the control variate):
+        self.phonon_heat_flux_effective = np.zeros(cf.number_of_timeframes)
+        self.phonon_heat_flux_material = np.zeros(cf.number_of_timeframes)
+        self.phonon_temperature_gradient = np.zeros(cf.number_of_timeframes)
+
+        # Weights of the temperature profile in the slope of its linear fit, so that grad(T) = - sum(weights * T(y)):
+        coordinates_y = np.arange(cf.number_of_pixels_y) * cf.length / cf.number_of_pixels_y
+        centered_coordinates_y = coordinates_y - np.mean(coordinates_y)
+        self.gradient_weights_y = centered_coordinates_y / np.sum(centered_coordinates_y**2)
+
         # Calculate the volumes [m^3] and other parameters (need to be corrected with volume of the holes):
         self.vol_cell_x = cf.length * cf.thickness * cf.width / cf.number_of_pixels_x
         self.vol_cell_y = cf.length * cf.thickness * cf.width / cf.number_of_pixels_y
         self.vol_pixel =  cf.length * cf.thickness * cf.width / (cf.number_of_pixels_x * cf.number_of_pixels_y)
 
         # Calculate the pixel volumes with respect to holes:
-        self.vol_pixel_ratio = self.calculate_pixel_volumes(cf.number_of_pixels_x, cf.number_of_pixels_y)
+        if vol_pixel_ratio is None:
+            vol_pixel_ratio = calculate_pixel_volumes(cf.number_of_pixels_x, cf.number_of_pixels_y)
+        self.vol_pixel_ratio = vol_pixel_ratio
+        self.vol_column_ratio = np.mean(self.vol_pixel_ratio, axis=0)
+        self.vol_row_ratio = np.mean(self.vol_pixel_ratio, axis=1)
 
-    def calculate_pixel_volumes(self, number_of_pixels_x, number_of_pixels_y):
-        """Calculate a map showing if the pixel contains material (1) or a hole (0)"""
-        pixel_volume_ratios = np.zeros((number_of_pixels_y, number_of_pixels_x))
-        for x_index in range(number_of_pixels_x):
-            for y_index in range(number_of_pixels_y):
+        # Free flight segment of the current phonon which is not yet added to the maps:
+        self.segment = None
 
-                # calculate pixel coordinates of pixel center
-                y_coord = cf.length / cf.number_of_pixels_y * (y_index + 0.5)
-                x_coord = -cf.width/2 + cf.width / cf.number_of_pixels_x * (x_index + 0.5)
+    def phonon_energy(self, ph):
+        """Energy h*w [J] which the phonon contributes to the maps at each timestep"""
+        return hbar * 2 * pi * ph.f
 
-                pixel_volume_ratios[y_index, x_index] = not any(hole.is_inside(x_coord, y_coord, None, cf) for hole in cf.holes)
+    def volumetric_heat_capacity(self, ph, material):
+        """Heat capacity [J/m^3/K] with which the energy of the phonon is converted into temperature"""
+        return material.heat_capacity * material.density
 
-        return pixel_volume_ratios
+    def start_segment(self, ph, timestep_number, material):
+        """
+        Finish the previous free flight segment of the phonon and start a new one from its current state.
+        Between scattering events the phonon moves along a straight line, so all its timesteps
+        in the segment are added to the maps at once when the segment is finished.
+        """
+        self.finish_segment(timestep_number)
+        v_x, v_y, _ = ph.velocity
+        energy = self.phonon_energy(ph)
+        volumetric_heat_capacity = self.volumetric_heat_capacity(ph, material)
+        self.segment = (ph.x, ph.y, v_x, v_y, energy, volumetric_heat_capacity, timestep_number, ph.first_timestep)
 
-    def add_energy_to_maps(self, ph, timestep_number, material):
+    def finish_segment(self, timestep_number):
         """
-        Register the phonon in the pixel corresponding to its current position at certain timestep
-        and adds it to thermal maps and profiles.
+        Register the phonon in the pixels corresponding to its positions at each timestep of the current segment
+        until the given timestep, and add it to thermal maps and profiles.
         Note that in case of temperature and heat flux profiles, phonon is registered not at
         its current timestep number but at a virtual timestep which is current time + first timestep.
         This first time step is unique for each phonon. This is done to simulate more relistic continious heat flow.
         """
-
-        # Move the recording point forwards half a timestep as to remove asymetric boundary fluxes (doesn't work)
-        ph_x, ph_y, _ = move(ph, cf.timestep/2)
-
-        # Calculate the index of the pixel in which we record this phonon:
-        index_x = int(((ph_x + cf.width / 2) * cf.number_of_pixels_x) // cf.width)
-        index_y = int(ph_y // (cf.length / cf.number_of_pixels_y))
-
-        # Prevent error if the phonon is outside the structure:
-        if (0 <= index_x < cf.number_of_pixels_x) and (0 <= index_y < cf.number_of_pixels_y):
-
-            # Calculate pixel volume correction factors:
-            vol_pixel_correction = self.vol_pixel_ratio[index_y, index_x]
-            vol_pixel_correction_x = np.mean(self.vol_pixel_ratio[:, index_x])
-            vol_pixel_correction_y = np.mean(self.vol_pixel_ratio[index_y, :])
-
-            # Do not record data if the pixel is an empty one:
-            if vol_pixel_correction == 0 and cf.ignore_faulty_phonons:
-                return
-
-            # Record energy h*w [J] and heat flux [W/s/m^2] of this phonon into the pixel of thermal map:
-            energy = hbar * 2 * pi * ph.f
-            self.number_phonons_in_pixel[index_y, index_x] += 1
-            self.thermal_map[index_y, index_x] += energy
-            self.heat_flux_map_x[index_y, index_x] += energy * sin(ph.theta) * abs(cos(ph.phi)) * ph.speed / self.vol_pixel
-            self.heat_flux_map_y[index_y, index_x] += energy * cos(ph.theta) * abs(cos(ph.phi)) * ph.speed / self.vol_pixel
-
-            # Calculate to which timeframe this timestep belongs:
-            timeframe_number = (ph.first_timestep + timestep_number) // self.timepteps_per_timeframe
-
-            # Record temperature and energy into the corresponding time segment:
-            if timeframe_number < cf.number_of_timeframes and vol_pixel_correction_x != 0 and vol_pixel_correction_y != 0:
-                self.effective_heat_flux_profile_x[index_x, timeframe_number] += energy * sin(ph.theta) * abs(cos(ph.phi)) * ph.speed / self.vol_cell_x
-                self.effective_heat_flux_profile_y[index_y, timeframe_number] += energy * cos(ph.theta) * abs(cos(ph.phi)) * ph.speed / self.vol_cell_y
-                # the material heat_flux_profile could also be calculated afterwards by dividing the effective profile with the volume ratio
-                self.material_heat_flux_profile_x[index_x, timeframe_number] += energy * sin(ph.theta) * abs(cos(ph.phi)) * ph.speed / self.vol_cell_x / vol_pixel_correction_x
-                self.material_heat_flux_profile_y[index_y, timeframe_number] += energy * cos(ph.theta) * abs(cos(ph.phi)) * ph.speed / self.vol_cell_y / vol_pixel_correction_y
-
-                self.temperature_profile_x[index_x, timeframe_number] += energy / (material.heat_capacity * material.density) / self.vol_cell_x / vol_pixel_correction_x
-                self.temperature_profile_y[index_y, timeframe_number] += energy / (material.heat_capacity * material.density) / self.vol_cell_y / vol_pixel_correction_y
+        if self.segment is None:
+            return
+        x, y, v_x, v_y, energy, volumetric_heat_capacity, start, first_timestep = self.segment
+        self.segment = None
+        steps = np.arange(timestep_number - start)
+
+        # Positions at each timestep, moved forwards half a timestep as to remove asymetric boundary fluxes (doesn't work)
+        ph_x = x + v_x * cf.timestep * (steps + 0.5)
+        ph_y = y + v_y * cf.timestep * (steps + 0.5)
+
+        # With periodic sidewalls, the segment can continue behind them, so it is folded back into the structure:
+        if cf.periodic_sidewalls:
+            ph_x = (ph_x + cf.width / 2) % cf.width - cf.width / 2
+
+        # Calculate the indexes of the pixels in which we record this phonon:
+        index_x = (((ph_x + cf.width / 2) * cf.number_of_pixels_x) // cf.width).astype(int)
+        index_y = (ph_y // (cf.length / cf.number_of_pixels_y)).astype(int)
+
+        # Skip positions outside the structure and, if requested, in empty pixels:
+        is_recorded = (0 <= index_x) & (index_x < cf.number_of_pixels_x) & (0 <= index_y) & (index_y < cf.number_of_pixels_y)
+        if cf.ignore_faulty_phonons:
+            is_recorded[is_recorded] = self.vol_pixel_ratio[index_y[is_recorded], index_x[is_recorded]] != 0
+        index_x, index_y, steps = index_x[is_recorded], index_y[is_recorded], steps[is_recorded]
+
+        # Record energy h*w [J] and heat flux [W/s/m^2] of this phonon into the pixels of thermal map:
+        pixels = (index_y, index_x)
+        np.add.at(self.number_phonons_in_pixel, pixels, 1)
+        np.add.at(self.thermal_map, pixels, energy)
+        np.add.at(self.heat_flux_map_x, pixels, energy * v_x / self.vol_pixel)
+        np.add.at(self.heat_flux_map_y, pixels, energy * v_y / self.vol_pixel)
+
+        # Calculate to which timeframes these timesteps belong and pixel volume correction factors:
+        timeframe_numbers = (first_timestep + start + steps) // self.timepteps_per_timeframe
+        vol_pixel_correction_x = self.vol_column_ratio[index_x]
+        vol_pixel_correction_y = self.vol_row_ratio[index_y]
+        is_recorded = (timeframe_numbers < cf.number_of_timeframes) & (vol_pixel_correction_x != 0) & (vol_pixel_correction_y != 0)
+        index_x, index_y, timeframe_numbers = index_x[is_recorded], index_y[is_recorded], timeframe_numbers[is_recorded]
+        vol_pixel_correction_x, vol_pixel_correction_y = vol_pixel_correction_x[is_recorded], vol_pixel_correction_y[is_recorded]
+
+        # Record temperature and energy into the corresponding time segments:
+        np.add.at(self.effective_heat_flux_profile_x, (index_x, timeframe_numbers), energy * v_x / self.vol_cell_x)
+        np.add.at(self.effective_heat_flux_profile_y, (index_y, timeframe_numbers), energy * v_y / self.vol_cell_y)
+        # the material heat_flux_profile could also be calculated afterwards by dividing the effective profile with the volume ratio
+        np.add.at(self.material_heat_flux_profile_x, (index_x, timeframe_numbers), energy * v_x / self.vol_cell_x / vol_pixel_correction_x)
+        np.add.at(self.material_heat_flux_profile_y, (index_y, timeframe_numbers), energy * v_y / self.vol_cell_y / vol_pixel_correction_y)
+
+        temperatures_y = energy / volumetric_heat_capacity / self.vol_cell_y / vol_pixel_correction_y
+        np.add.at(self.temperature_profile_x, (index_x, timeframe_numbers), energy / volumetric_heat_capacity / self.vol_cell_x / vol_pixel_correction_x)
+        np.add.at(self.temperature_profile_y, (index_y, timeframe_numbers), temperatures_y)
+
+        # Record the contributions of this phonon to the average heat flux and temperature gradient in each timeframe:
+        np.add.at(self.phonon_heat_flux_effective, timeframe_numbers, energy * v_y / self.vol_cell_y / cf.number_of_pixels_y)
+        np.add.at(self.phonon_heat_flux_material, timeframe_numbers, energy * v_y / self.vol_cell_y / vol_pixel_correction_y / cf.number_of_pixels_y)
+        np.add.at(self.phonon_temperature_gradient, timeframe_numbers, - self.gradient_weights_y[index_y] * temperatures_y)
+
+    def pop_phonon_contributions(self):
+        """Return the heat fluxes and temperature gradient recorded from the current phonon in each timeframe and reset them"""
+        contributions = self.phonon_heat_flux_effective, self.phonon_heat_flux_material, self.phonon_temperature_gradient
+        self.phonon_heat_flux_effective = np.zeros(cf.number_of_timeframes)
+        self.phonon_heat_flux_material = np.zeros(cf.number_of_timeframes)
+        self.phonon_temperature_gradient = np.zeros(cf.number_of_timeframes)
+        return contributions
 
 
     def calculate_weighted_flux(self):
@@ -261,7 +333,7 @@ class ThermalMaps(Maps):
                    header="K_eff (W/mK), K_mat (W/mK), error_eff (W/mK), error_mat (W/mK), Av. start (ns), Av. end (ns)", encoding='utf-8')
 
         # Saving thermal maps:
-        np.savetxt("Data/Pixel volumes.csv", self.vol_pixel_ratio, fmt='%1i', delimiter=",", encoding='utf-8')
+        np.savetxt("Data/Pixel volumes.csv", self.vol_pixel_ratio, fmt='%.3f', delimiter=",", encoding='utf-8')
         np.savetxt("Data/Thermal map.csv", self.thermal_map, fmt='%1.2e', delimiter=",", encoding='utf-8')
         np.savetxt("Data/Heat flux map xy.csv", self.heat_flux_map_xy, fmt='%1.2e', delimiter=",", encoding='utf-8')
         np.savetxt("Data/Heat flux map x.csv", self.heat_flux_map_x, fmt='%1.2e', delimiter=",", encoding='utf-8')
@@ -1,9 +1,63 @@
 """Module that assigns physical properties according to chosen material"""
 
+import os
+import sys
+import logging
+from bisect import bisect_left
+from functools import lru_cache
+from math import pi, exp
 import numpy as np
 
+TABULATED_MATERIAL_EXTENSIONS = (".npz", ".h5", ".hdf5")
 
-class Si:
+
+class Material:
+    """
+    Parent material class with lookup tables of phonon properties built once from the dispersion.
+    The group velocity of a phonon is the finite difference of the dispersion near the closest dispersion point.
+    For monotone branches, this point is found by a binary search instead of a search over the whole dispersion.
+    """
+
+    def assign_lookup_tables(self):
+        """Tabulate maximal frequencies, monotonicity, and group velocities at each point of each branch"""
+        wavevectors = self.dispersion[:, 0]
+        point_nums = np.abs(np.arange(len(wavevectors)) - 1)
+        self.maximum_frequencies = np.max(self.dispersion[:, 1:], axis=0)
+        self.frequency_tables = []
+        self.velocity_tables = []
+        self.is_monotone = []
+        for branch in self.dispersion[:, 1:].T:
+            d_w = 2 * pi * np.abs(branch[point_nums + 1] - branch[point_nums])
+            d_k = np.abs(wavevectors[point_nums + 1] - wavevectors[point_nums])
+            self.frequency_tables.append(branch.tolist())
+            self.velocity_tables.append(d_w / d_k)
+            self.is_monotone.append(bool(np.all(np.diff(branch) > 0)))
+
+    def closest_points(self, branch_number, frequencies):
+        """Indexes of the dispersion points closest to given frequencies"""
+        branch = self.dispersion[:, branch_number + 1]
+        frequencies = np.asarray(frequencies, dtype=float)
+        if not self.is_monotone[branch_number]:
+            return np.abs(branch[np.newaxis, :] - frequencies.reshape(-1, 1)).argmin(axis=1).reshape(frequencies.shape)
+        index = np.clip(np.searchsorted(branch, frequencies), 1, len(branch) - 1)
+        return index - (frequencies - branch[index - 1] <= branch[index] - frequencies)
+
+    def group_velocity(self, branch_number, f):
+        """Group velocity dw/dk [m/s] of a phonon with given frequency"""
+        if not self.is_monotone[branch_number]:
+            return float(self.group_velocities(branch_number, f))
+        branch = self.frequency_tables[branch_number]
+        index = min(max(bisect_left(branch, f), 1), len(branch) - 1)
+        if f - branch[index - 1] <= branch[index] - f:
+            index -= 1
+        return float(self.velocity_tables[branch_number][index])
+
+    def group_velocities(self, branch_number, frequencies):
+        """Group velocities dw/dk [m/s] of phonons with given frequencies"""
+        return self.velocity_tables[branch_number][self.closest_points(branch_number, frequencies)]
+
+
+class Si(Material):
     """
     Physical properties of silicon.
     Dispersion - Ref. APL 95 161901 (2009)
@@ -17,6 +71,8 @@ class Si:
         self.density = 2330         # [kg/m^3]
         self.temp = temp
         self.assign_dispersion(num_points)
+        self.assign_lookup_tables()
+        self.assign_relaxation_coefficients()
         self.assign_heat_capacity()
 
     def assign_dispersion(self, num_points):
@@ -31,12 +87,15 @@ class Si:
         self.dispersion[:, 2] = np.abs(np.polyval(coefficients_TA, self.dispersion[:, 0]))  # TA branch
         self.dispersion[:, 3] = self.dispersion[:, 2]
 
+    def assign_relaxation_coefficients(self):
+        """Calculate coefficients of scattering rates, which depend only on temperature"""
+        deb_temp = 152.0
+        self.impurity_coefficient = 2.95e-45
+        self.umklapp_coefficient = 0.95e-19 * self.temp * exp(-deb_temp / self.temp)
+
     def relaxation_time(self, omega):
         """Calculate relaxation time at a given frequency and temperature"""
-        deb_temp = 152.0
-        tau_impurity = 1 / (2.95e-45 * (omega ** 4))
-        tau_umklapp = 1 / (0.95e-19 * (omega ** 2) * self.temp * np.exp(-deb_temp / self.temp))
-        return 1 / ((1 / tau_impurity) + (1 / tau_umklapp))
+        return 1 / (self.impurity_coefficient * omega**4 + self.umklapp_coefficient * omega**2)
 
     def assign_heat_capacity(self):
         """Calculate heat capacity [J/kg/K] in 3 - 300K range using the polynomial fits"""
@@ -52,7 +111,7 @@ class Si:
         self.heat_capacity = np.polyval(coeffs, self.temp)
 
 
-class SiC:
+class SiC(Material):
     """
     Physical properties of silicon carbide
     Dispersion - PRB 50 17054 (1994)
@@ -66,6 +125,8 @@ class SiC:
         self.default_speed = 6500   # [m/s] Need to change this probably...
         self.temp = temp
         self.assign_dispersion(num_points)
+        self.assign_lookup_tables()
+        self.assign_relaxation_coefficients()
         self.assign_heat_capacity()
 
     def assign_dispersion(self, num_points):
@@ -80,13 +141,16 @@ class SiC:
         self.dispersion[:, 2] = np.abs(np.polyval(coefficients_TA, self.dispersion[:, 0]))  # TA branch
         self.dispersion[:, 3] = self.dispersion[:, 2]
 
+    def assign_relaxation_coefficients(self):
+        """Calculate coefficients of scattering rates, which depend only on temperature"""
+        deb_temp = 1200
+        self.impurity_coefficient = 8.46e-45
+        self.umklapp_coefficient = 6.16e-20 * self.temp * exp(-deb_temp / self.temp)
+        self.four_phonon_coefficient = 6.9e-23 * self.temp**2
+
     def relaxation_time(self, omega):
         """Calculate relaxation time at a given frequency and temperature including 4 phonon scattering"""
-        deb_temp = 1200
-        tau_impurity = 1 / (8.46e-45 * (omega ** 4))
-        tau_umklapp = 1 / (6.16e-20 * (omega ** 2) * self.temp * np.exp(-deb_temp / self.temp))
-        tau_4p = 1 / (6.9e-23 * (self.temp ** 2) * (omega ** 2))
-        return 1 / ((1 / tau_impurity) + (1 / tau_umklapp) + (1 / tau_4p))
+        return 1 / (self.impurity_coefficient * omega**4 + (self.umklapp_coefficient + self.four_phonon_coefficient) * omega**2)
 
 
     def assign_heat_capacity(self):
@@ -104,7 +168,7 @@ class SiC:
         self.heat_capacity = np.polyval(coeffs, self.temp)
 
 
-class Graphite:
+class Graphite(Material):
     """
     Physical properties of graphite.
     Dispersion - Carbon 91 266-274 (2015)
@@ -118,6 +182,8 @@ class Graphite:
         self.default_speed = 12900     # [m/s]
         self.temp = temp
         self.assign_dispersion(num_points)
+        self.assign_lookup_tables()
+        self.assign_relaxation_coefficients()
         self.assign_heat_capacity()
 
     def assign_dispersion(self, num_points):
@@ -133,14 +199,17 @@ class Graphite:
         self.dispersion[:, 2] = np.abs(np.polyval(coefficients_TA, self.dispersion[:, 0]))  # TA branch
         self.dispersion[:, 3] = np.abs(np.polyval(coefficients_ZA, self.dispersion[:, 0]))  # ZA branch
 
+    def assign_relaxation_coefficients(self):
+        """Calculate coefficients of scattering rates, which depend only on temperature"""
+        deb_temp = 1000.0
+        self.umklapp_coefficient = 3.18e-25 * self.temp**3 * exp(-deb_temp / (3*self.temp))
+
     def relaxation_time(self, omega):
         """
         Calculate relaxation time at a given frequency and temperature.
         In graphite, we assume that material is perfect, i.e. without impurity scattering.
         """
-        deb_temp = 1000.0
-        tau_umklapp = 1 / (3.18e-25 * (omega ** 2) * (self.temp ** 3) * np.exp(-deb_temp / (3*self.temp)))
-        return 1 / ( 1 / tau_umklapp)
+        return 1 / (self.umklapp_coefficient * omega**2)
 
 
     def assign_heat_capacity(self):
@@ -149,6 +218,102 @@ class Graphite:
         self.heat_capacity = 1000 * np.polyval(coeffs, self.temp)
 
 
+class TabulatedMaterial(Material):
+    """
+    Material with the dispersion and phonon lifetimes tabulated in files, for example, from ab initio calculations.
+    Data can be stored in a .npz file, an HDF5 file (requires h5py), or a folder of .npy files.
+    Required arrays are "wavevectors" [1/m], "frequencies" [Hz] with a column per each of 3 branches,
+    "lifetime_frequencies" [Hz], "lifetimes" [s] with a column per each of "lifetime_temperatures" [K], and "density" [kg/m^3].
+    Optional "heat_capacity_temperatures" [K] and "heat_capacities" [J/kg/K], otherwise heat capacity is calculated from the dispersion.
+    """
+
+    def __init__(self, filename, temp, num_points=1000):
+        self.name = os.path.splitext(os.path.basename(os.path.normpath(filename)))[0]
+        self.temp = temp
+        data = self.read_data(filename)
+        self.density = float(np.asarray(data["density"]))
+        self.assign_dispersion(data, num_points)
+        self.assign_lookup_tables()
+        self.default_speed = self.velocity_tables[0][0]
+        self.assign_relaxation_table(data)
+        self.assign_heat_capacity(data)
+
+    @staticmethod
+    def read_data(filename):
+        """Read the arrays from the file, they are only used to build the interpolated tables of the material"""
+        if not os.path.exists(filename):
+            logging.error(f"Material file {filename} does not exist")
+            sys.exit()
+        if os.path.isdir(filename):
+            data = {os.path.splitext(name)[0]: np.load(os.path.join(filename, name))
+                    for name in os.listdir(filename) if name.endswith(".npy")}
+        elif filename.endswith(".npz"):
+            data = np.load(filename)
+        else:
+            try:
+                import h5py
+            except ImportError:
+                logging.error("Reading HDF5 material files requires h5py package, install it with pip install h5py")
+                sys.exit()
+            with h5py.File(filename, "r") as file:
+                data = {name: file[name][()] for name in file.keys()}
+
+        required_names = ["wavevectors", "frequencies", "lifetime_frequencies", "lifetime_temperatures", "lifetimes", "density"]
+        missing_names = [name for name in required_names if name not in data]
+        if missing_names:
+            logging.error(f"Material file {filename} does not contain {', '.join(missing_names)}")
+            sys.exit()
+        return data
+
+    def assign_dispersion(self, data, num_points):
+        """Interpolate the tabulated dispersion on a uniform grid of wavevectors"""
+        wavevectors = np.asarray(data["wavevectors"], dtype=float)
+        frequencies = np.asarray(data["frequencies"], dtype=float)
+        if frequencies.ndim != 2 or frequencies.shape[1] != 3 or frequencies.shape[0] != len(wavevectors):
+            logging.error("Tabulated frequencies should have 3 columns (LA, TA, and TA or ZA) and a row per each wavevector")
+            sys.exit()
+        self.dispersion = np.zeros((num_points, 4))
+        self.dispersion[:, 0] = np.linspace(0, wavevectors[-1], num_points)
+        for branch_number in range(3):
+            self.dispersion[:, branch_number + 1] = np.abs(np.interp(self.dispersion[:, 0], wavevectors, frequencies[:, branch_number]))
+
+    def assign_relaxation_table(self, data):
+        """Interpolate logarithm of the lifetimes to the temperature of the material"""
+        temperatures = np.atleast_1d(np.asarray(data["lifetime_temperatures"], dtype=float))
+        lifetimes = np.asarray(data["lifetimes"], dtype=float).reshape(-1, len(temperatures))
+        self.lifetime_omegas = 2 * pi * np.asarray(data["lifetime_frequencies"], dtype=float)
+        self.log_lifetimes = np.array([np.interp(self.temp, temperatures, np.log(row)) for row in lifetimes])
+
+    def relaxation_time(self, omega):
+        """Calculate relaxation time at a given frequency by interpolating the tabulated lifetimes"""
+        relaxation_time = np.exp(np.interp(omega, self.lifetime_omegas, self.log_lifetimes))
+        return float(relaxation_time) if np.ndim(relaxation_time) == 0 else relaxation_time
+
+    def assign_heat_capacity(self, data):
+        """Interpolate heat capacity [J/kg/K] or calculate it from the dispersion if it is not tabulated"""
+        if "heat_capacities" in data and "heat_capacity_temperatures" in data:
+            self.heat_capacity = float(np.interp(self.temp, data["heat_capacity_temperatures"], data["heat_capacities"]))
+            return
+        from freepaths.temperature_sweep import heat_capacity
+        wavevectors = (self.dispersion[1:, 0] + self.dispersion[:-1, 0]) / 2
+        d_k = np.diff(self.dispersion[:, 0])
+        mode_heat_capacity = heat_capacity((self.dispersion[1:, 1:] + self.dispersion[:-1, 1:]) / 2, self.temp)
+        volumetric_heat_capacity = np.sum(mode_heat_capacity * (wavevectors**2 * d_k / (2 * pi**2))[:, np.newaxis])
+        self.heat_capacity = volumetric_heat_capacity / self.density
+
+
+@lru_cache(maxsize=None)
+def get_material(media, temp, num_points=1000):
+    """Create the material object according to its name or file, which is built only once for each temperature"""
+    if media.endswith(TABULATED_MATERIAL_EXTENSIONS) or os.path.isdir(media):
+        return TabulatedMaterial(media, temp, num_points=num_points)
+    materials = {"Si": Si, "SiC": SiC, "Graphite": Graphite}
+    if media not in materials:
+        logging.error(f"Material {media} is not supported")
+        sys.exit()
+    return materials[media](temp, num_points=num_points)
+
+
 # Materials below are not fully supported and don't have the relaxation times:
 
 class Diamond:
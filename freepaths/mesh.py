@@ -0,0 +1,148 @@
+"""
+Module that provides triangulated meshes for obstacles of arbitrary 3D shape.
+Meshes are read from STL files, and triangles are grouped into a tree of bounding boxes,
+so that a path of a phonon is tested for intersection only with a few triangles near it.
+"""
+
+import sys
+import logging
+from math import sqrt, inf
+import numpy as np
+
+TRIANGLES_PER_LEAF = 4      # Maximal number of triangles in the leaves of the tree
+
+# Direction of rays for inside checks, which is slightly tilted to avoid hitting edges of axis aligned meshes:
+RAY_DIRECTION = (1.0, 1.234e-4, 2.345e-4)
+
+
+def read_stl(filename):
+    """Read an array of triangles with shape (N, 3, 3) from a binary or ASCII STL file"""
+    try:
+        with open(filename, 'rb') as file:
+            content = file.read()
+    except FileNotFoundError:
+        logging.error(f"Mesh file {filename} does not exist")
+        sys.exit()
+
+    # Binary files have a header of 80 bytes, the number of triangles, and 50 bytes per triangle:
+    if len(content) >= 84:
+        number_of_triangles = int(np.frombuffer(content, dtype='<u4', count=1, offset=80)[0])
+        if len(content) == 84 + 50 * number_of_triangles:
+            record = np.dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+            return np.frombuffer(content, dtype=record, offset=84)['vertices'].astype(float)
+
+    # ASCII files list the vertices of each facet:
+    vertices = [line.split()[1:4] for line in content.decode('utf-8', errors='ignore').splitlines()
+                if line.strip().startswith('vertex')]
+    if not vertices or len(vertices) % 3:
+        logging.error(f"Mesh file {filename} is not a valid STL file")
+        sys.exit()
+    return np.array(vertices, dtype=float).reshape(-1, 3, 3)
+
+
+def cross(a, b):
+    """Cross product of two vectors"""
+    return a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]
+
+
+def dot(a, b):
+    """Dot product of two vectors"""
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+class TriangleTree:
+    """Tree of bounding boxes of triangles, which finds intersections of segments with the mesh"""
+
+    def __init__(self, triangles):
+        """Build the tree from the array of triangles with shape (N, 3, 3)"""
+        self.triangles = triangles
+        edges_1 = (triangles[:, 1] - triangles[:, 0]).tolist()
+        edges_2 = (triangles[:, 2] - triangles[:, 0]).tolist()
+        self.triangle_list = [(tuple(v0), tuple(e1), tuple(e2)) for v0, e1, e2 in zip(triangles[:, 0].tolist(), edges_1, edges_2)]
+        normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        self.normals = [tuple(normal) for normal in np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0).tolist()]
+        self.root = self.build_node(np.arange(len(triangles)))
+
+    def build_node(self, indexes):
+        """Build a node with the bounding box of the triangles and split them in two halves along the longest axis"""
+        vertices = self.triangles[indexes].reshape(-1, 3)
+        minimum, maximum = vertices.min(axis=0), vertices.max(axis=0)
+        box = tuple(minimum.tolist()), tuple(maximum.tolist())
+        if len(indexes) <= TRIANGLES_PER_LEAF:
+            return box, indexes.tolist(), None
+        centers = self.triangles[indexes].mean(axis=1)
+        axis = int(np.argmax(np.ptp(centers, axis=0)))
+        indexes = indexes[np.argsort(centers[:, axis])]
+        half = len(indexes) // 2
+        return box, None, (self.build_node(indexes[:half]), self.build_node(indexes[half:]))
+
+    @staticmethod
+    def is_box_crossed(box, origin, inverse_direction):
+        """Check if the segment from the origin with t from 0 to 1 crosses the box (slab method)"""
+        t_min, t_max = 0.0, 1.0
+        for axis in range(3):
+            if inverse_direction[axis] == inf:
+                if not box[0][axis] <= origin[axis] <= box[1][axis]:
+                    return False
+                continue
+            t_1 = (box[0][axis] - origin[axis]) * inverse_direction[axis]
+            t_2 = (box[1][axis] - origin[axis]) * inverse_direction[axis]
+            t_min = max(t_min, min(t_1, t_2))
+            t_max = min(t_max, max(t_1, t_2))
+            if t_min > t_max:
+                return False
+        return True
+
+    def intersection(self, origin, direction, index):
+        """Parameter t at which the segment origin + t * direction crosses the triangle, or None (Moller-Trumbore)"""
+        v0, e1, e2 = self.triangle_list[index]
+        p = cross(direction, e2)
+        determinant = dot(e1, p)
+        if determinant == 0:
+            return None
+        inverse_determinant = 1 / determinant
+        s = (origin[0] - v0[0], origin[1] - v0[1], origin[2] - v0[2])
+        u = dot(s, p) * inverse_determinant
+        if u < 0 or u > 1:
+            return None
+        q = cross(s, e1)
+        v = dot(direction, q) * inverse_determinant
+        if v < 0 or u + v > 1:
+            return None
+        t = dot(e2, q) * inverse_determinant
+        return t if 0 <= t <= 1 else None
+
+    def intersections(self, origin, end):
+        """Yield the parameters t and indexes of all triangles crossed by the segment from origin to end"""
+        direction = (end[0] - origin[0], end[1] - origin[1], end[2] - origin[2])
+        inverse_direction = tuple(1 / component if component != 0 else inf for component in direction)
+        nodes = [self.root]
+        while nodes:
+            box, indexes, children = nodes.pop()
+            if not self.is_box_crossed(box, origin, inverse_direction):
+                continue
+            if children:
+                nodes.extend(children)
+                continue
+            for index in indexes:
+                t = self.intersection(origin, direction, index)
+                if t is not None:
+                    yield t, index
+
+    def first_intersection(self, origin, end):
+        """Index of the first triangle crossed by the segment from origin to end, or None"""
+        first_t, first_index = inf, None
+        for t, index in self.intersections(origin, end):
+            if t < first_t:
+                first_t, first_index = t, index
+        return first_index
+
+    def is_inside(self, point):
+        """Check if the point is inside the closed mesh by counting crossings of a ray from it"""
+        (x_min, y_min, z_min), (x_max, y_max, z_max) = self.root[0]
+        if not (x_min <= point[0] <= x_max and y_min <= point[1] <= y_max and z_min <= point[2] <= z_max):
+            return False
+        length = x_max - point[0] + sqrt((y_max - y_min)**2 + (z_max - z_min)**2) + 1e-12
+        end = tuple(point[axis] + length * RAY_DIRECTION[axis] for axis in range(3))
+        return sum(1 for _ in self.intersections(point, end)) % 2 == 1
@@ -0,0 +1,139 @@
+"""
+Module that stores boundary limited free paths of phonons on disk.
+Free paths are measured with internal scattering disabled, so they depend only on the geometry and phonon mode.
+They are stored per geometry, polarization branch, and frequency bin, and can be combined
+with internal scattering at any temperature, which makes repeated studies of one structure nearly instantaneous.
+A bin keeps all the phonons traced in it, and each stored phonon is used at most once per run, so that
+phonons of the same bin are still sampled independently. Phonons traced during a run are used only in the next runs.
+"""
+
+import os
+import enum
+import hashlib
+import logging
+from math import log, floor
+import numpy as np
+
+from freepaths.config import cf
+
+CACHE_FOLDER = "Cache"
+FREQUENCY_BIN_WIDTH = 1e-3     # Relative width of frequency bins
+
+
+def describe(value):
+    """Convert a parameter into a representation that does not depend on memory addresses"""
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return [describe(item) for item in value]
+    if isinstance(value, dict):
+        return [[describe(key), describe(item)] for key, item in sorted(value.items())]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if callable(value) and hasattr(value, '__code__'):
+        return [value.__qualname__, value.__code__.co_code.hex(), repr(value.__code__.co_consts)]
+    if hasattr(value, '__dict__'):
+        # Private attributes store the state of the object during the simulation, like caches of the last query:
+        attributes = [(key, item) for key, item in sorted(vars(value).items()) if not key.startswith('_')]
+        return [type(value).__name__] + [[key, describe(item)] for key, item in attributes]
+    return repr(value)
+
+
+def geometry_hash():
+    """Hash of all the parameters which affect the boundary scattering of phonons"""
+    parameters = [
+        cf.media, cf.timestep, cf.number_of_timesteps,
+        cf.thickness, cf.width, cf.length, cf.is_two_dimensional_material,
+        cf.include_right_sidewall, cf.include_left_sidewall, cf.include_top_sidewall, cf.include_bottom_sidewall,
+        cf.periodic_sidewalls,
+        cf.hot_side_position_top, cf.hot_side_position_bottom, cf.hot_side_position_right, cf.hot_side_position_left,
+        cf.cold_side_position_top, cf.cold_side_position_bottom, cf.cold_side_position_right, cf.cold_side_position_left,
+        cf.phonon_sources,
+        cf.side_wall_roughness, cf.hole_roughness, cf.pillar_roughness, cf.top_roughness, cf.bottom_roughness,
+        cf.pillar_top_roughness, cf.interface_roughness,
+        cf.holes, cf.pillars, cf.interfaces,
+    ]
+    return hashlib.sha1(repr(describe(parameters)).encode('utf-8')).hexdigest()[:16]
+
+
+def frequency_bin(f):
+    """Index of the frequency bin on a logarithmic scale"""
+    return int(round(log(f) / log(1 + FREQUENCY_BIN_WIDTH))) if f > 0 else -1
+
+
+def number_of_internal_scatterings(free_paths, internal_mean_free_path):
+    """
+    Expected number of internal scattering events along the boundary free paths.
+    Internal scattering times are exponentially distributed, except in the gray approximation where they are fixed.
+    """
+    if cf.use_gray_approximation_mfp:
+        return sum(floor(free_path / cf.gray_approximation_mfp) for free_path in free_paths)
+    return sum(free_paths) / internal_mean_free_path
+
+
+def combined_mean_free_path(free_paths, internal_mean_free_path):
+    """Mean free path when internal scattering events split the boundary free paths"""
+    number_of_free_paths = len(free_paths) + number_of_internal_scatterings(free_paths, internal_mean_free_path)
+    return sum(free_paths) / number_of_free_paths if number_of_free_paths > 0 else 0.0
+
+
+class MFPCache:
+    """Boundary limited free paths of phonons for one geometry"""
+
+    def __init__(self):
+        """Load the cache of the current geometry if it exists"""
+        self.filename = os.path.join(CACHE_FOLDER, f"MFP {geometry_hash()}.npz")
+        self.entries = {}
+        self.new_entries = []
+        self.number_of_used_entries = {}
+        if os.path.exists(self.filename):
+            self.read_from_file()
+
+    def read_from_file(self):
+        """Read the entries from the file"""
+        try:
+            data = np.load(self.filename)
+            free_paths = np.split(data['free_paths'], np.cumsum(data['numbers_of_free_paths'])[:-1])
+            for branch, f_bin, travel_time, paths in zip(data['branches'], data['bins'], data['travel_times'], free_paths):
+                self.entries.setdefault((int(branch), int(f_bin)), []).append((list(paths), float(travel_time)))
+        except (OSError, KeyError, ValueError):
+            logging.warning(f"Cache file {self.filename} is damaged and will be rewritten")
+            self.entries = {}
+
+    @property
+    def number_of_new_entries(self):
+        """Number of phonons traced during this run"""
+        return len(self.new_entries)
+
+    @property
+    def number_of_reused_entries(self):
+        """Number of stored phonons used during this run"""
+        return sum(self.number_of_used_entries.values())
+
+    def get(self, branch_number, f):
+        """Return free paths and travel time of a stored phonon of this mode not used yet in this run, or None"""
+        key = (branch_number, frequency_bin(f))
+        stored_entries = self.entries.get(key, [])
+        number_of_used_entries = self.number_of_used_entries.get(key, 0)
+        if number_of_used_entries >= len(stored_entries):
+            return None
+        self.number_of_used_entries[key] = number_of_used_entries + 1
+        return stored_entries[number_of_used_entries]
+
+    def add(self, branch_number, f, flight):
+        """Add free paths and travel time of a traced phonon to the cache for the next runs"""
+        self.new_entries.append(((branch_number, frequency_bin(f)), (list(flight.free_paths), flight.travel_time)))
+
+    def write_into_file(self):
+        """Write all the entries into the file if there are new ones"""
+        if not self.new_entries:
+            return
+        os.makedirs(CACHE_FOLDER, exist_ok=True)
+        entries = [(key, entry) for key, stored_entries in self.entries.items() for entry in stored_entries]
+        entries = sorted(entries + self.new_entries, key=lambda item: item[0])
+        np.savez(self.filename,
+                 branches=np.array([key[0] for key, _ in entries], dtype=int),
+                 bins=np.array([key[1] for key, _ in entries], dtype=int),
+                 travel_times=np.array([entry[1] for _, entry in entries]),
+                 numbers_of_free_paths=np.array([len(entry[0]) for _, entry in entries], dtype=int),
+                 free_paths=np.concatenate([entry[0] for _, entry in entries] + [[]]))
@@ -1,23 +1,13 @@
-"""Module that move a phonon in one timestep using cache of previous moves"""
-
-from numpy import cos, sin
-from functools import lru_cache
-
-
-@lru_cache(maxsize=32)
-def step(theta, phi, speed, timestep):
-    """Calculate and cache one step of phonon motion"""
-    cos_phi = abs(cos(phi))
-    d_x = sin(theta) * cos_phi * speed * timestep
-    d_y = cos(theta) * cos_phi * speed * timestep
-    d_z = sin(phi) * speed * timestep
-    return d_x, d_y, d_z
+"""Module that move a phonon in one timestep using its cached displacement"""
 
 
 def move(phonon, timestep):
     """Move a phonon in one timestep and return new coordinates"""
-    d_x, d_y, d_z = step(phonon.theta, phonon.phi, phonon.speed, timestep)
-    new_x = phonon.x + d_x
-    new_y = phonon.y + d_y
-    new_z = phonon.z + d_z
-    return new_x, new_y, new_z
+    d_x, d_y, d_z = phonon.step(timestep)
+    return phonon.x + d_x, phonon.y + d_y, phonon.z + d_z
+
+
+def move_in_plane(phonon, timestep):
+    """Move a phonon of a two dimensional material in one timestep, where its z coordinate does not change"""
+    d_x, d_y, _ = phonon.step(timestep)
+    return phonon.x + d_x, phonon.y + d_y, phonon.z
@@ -7,6 +7,9 @@ import numpy as np
 from colorama import Fore, Style
 
 from freepaths.config import cf
+from freepaths.scattering_types import Surface
+from freepaths.termination import Termination
+from freepaths.sources import sources_are_lambertian
 
 
 def output_general_information(start_time):
@@ -42,29 +45,36 @@ def output_scattering_information(scatter_stats):
 
     # Calculate the percentage of different scattering events:
     total = np.sum(scatter_stats.total)
-    total_wall = np.sum(scatter_stats.wall_diffuse) + np.sum(scatter_stats.wall_specular)
-    total_topbot = np.sum(scatter_stats.top_diffuse) + np.sum(scatter_stats.top_specular)
-    total_hole = np.sum(scatter_stats.hole_diffuse) + np.sum(scatter_stats.hole_specular)
-    total_pill = np.sum(scatter_stats.pillar_diffuse) + np.sum(scatter_stats.pillar_specular)
-    total_interf = np.sum(scatter_stats.interfaces_diffuse) + np.sum(scatter_stats.interfaces_specular)
+    diffuse = scatter_stats.diffuse_events
+    specular = scatter_stats.specular_events
+    total_wall = diffuse[Surface.WALLS] + specular[Surface.WALLS]
+    total_topbot = diffuse[Surface.TOP_BOTTOM] + specular[Surface.TOP_BOTTOM]
+    total_hole = diffuse[Surface.HOLES] + specular[Surface.HOLES]
+    total_pill = diffuse[Surface.PILLARS] + specular[Surface.PILLARS]
+    total_interf = diffuse[Surface.INTERFACES] + specular[Surface.INTERFACES]
 
-    sc_on_walls = 100*(np.sum(scatter_stats.wall_diffuse) +
-                         np.sum(scatter_stats.wall_specular)) / total
-    sc_on_walls_diff = 100*np.sum(scatter_stats.wall_diffuse) / total_wall
-    sc_on_walls_spec = 100*np.sum(scatter_stats.wall_specular) / total_wall
+    sc_on_walls = 100*(diffuse[Surface.WALLS] +
+                         specular[Surface.WALLS]) / total
 
-    sc_on_topbot = 100*(np.sum(scatter_stats.top_diffuse) +
-                          np.sum(scatter_stats.top_specular)) / total
+    if total_wall != 0:
+        sc_on_walls_diff = 100*diffuse[Surface.WALLS] / total_wall
+        sc_on_walls_spec = 100*specular[Surface.WALLS] / total_wall
+    else:
+        sc_on_walls_diff = 0
+        sc_on_walls_spec = 0
+
+    sc_on_topbot = 100*(diffuse[Surface.TOP_BOTTOM] +
+                          specular[Surface.TOP_BOTTOM]) / total
 
     if total_topbot != 0:
-        sc_on_topbot_diff = 100*np.sum(scatter_stats.top_diffuse) / total_topbot
-        sc_on_topbot_spec = 100*np.sum(scatter_stats.top_specular) / total_topbot
+        sc_on_topbot_diff = 100*diffuse[Surface.TOP_BOTTOM] / total_topbot
+        sc_on_topbot_spec = 100*specular[Surface.TOP_BOTTOM] / total_topbot
     else:
         sc_on_topbot_diff = 0
         sc_on_topbot_spec = 0
 
-    retherm = 100*np.sum(scatter_stats.hot_side) / total
-    internal = 100*np.sum(scatter_stats.internal) / total
+    retherm = 100*diffuse[Surface.HOT_SIDE] / total
+    internal = 100*diffuse[Surface.INTERNAL] / total
 
     info = [
             f'\n{sc_on_walls:.2f}% - scattering on side walls ',
@@ -79,21 +89,21 @@ def output_scattering_information(scatter_stats):
 
     # If scatterers are present, add their information:
     if cf.holes:
-        sc_on_holes = 100*(np.sum(scatter_stats.hole_diffuse) +
-                             np.sum(scatter_stats.hole_specular)) / total
-        sc_on_holes_diff = 100*np.sum(scatter_stats.hole_diffuse) / total_hole
-        sc_on_holes_spec = 100*np.sum(scatter_stats.hole_specular) / total_hole
-        info1.extend([
+        sc_on_holes = 100*(diffuse[Surface.HOLES] +
+                             specular[Surface.HOLES]) / total
+        sc_on_holes_diff = 100*diffuse[Surface.HOLES] / total_hole
+        sc_on_holes_spec = 100*specular[Surface.HOLES] / total_hole
+        info.extend([
                     f'\n{sc_on_holes:.2f}% - scattering on hole walls ',
                     f'({sc_on_holes_diff:.2f}% - diffuse, ',
                     f'{sc_on_holes_spec:.2f}% - specular)']
                     )
 
     if cf.pillars:
-        sc_on_pill = 100*(np.sum(scatter_stats.pillar_diffuse) +
-                            np.sum(scatter_stats.pillar_specular)) / total
-        sc_on_pill_diff = 100*np.sum(scatter_stats.pillar_diffuse) / total_pill
-        sc_on_pill_spec = 100*np.sum(scatter_stats.pillar_specular) / total_pill
+        sc_on_pill = 100*(diffuse[Surface.PILLARS] +
+                            specular[Surface.PILLARS]) / total
+        sc_on_pill_diff = 100*diffuse[Surface.PILLARS] / total_pill
+        sc_on_pill_spec = 100*specular[Surface.PILLARS] / total_pill
         info.extend([
                     f'\n{sc_on_pill:.2f}% - scattering on pillar walls ',
                     f'({sc_on_pill_diff:.2f}% - diffuse, ',
@@ -101,10 +111,10 @@ def output_scattering_information(scatter_stats):
                     )
 
     if cf. interfaces:
-        sc_on_interf = 100*(np.sum(scatter_stats.interfaces_diffuse) +
-                             np.sum(scatter_stats.interfaces_specular)) / total
-        sc_on_interf_diff = 100*np.sum(scatter_stats.interfaces_diffuse) / total_interf
-        sc_on_interf_spec = 100*np.sum(scatter_stats.interfaces_specular) / total_interf
+        sc_on_interf = 100*(diffuse[Surface.INTERFACES] +
+                             specular[Surface.INTERFACES]) / total
+        sc_on_interf_diff = 100*diffuse[Surface.INTERFACES] / total_interf
+        sc_on_interf_spec = 100*specular[Surface.INTERFACES] / total_interf
         info.extend([
                     f'\n{sc_on_interf:.2f}% - scattering on interfaces ',
                     f'({sc_on_interf_diff:.2f}% - diffuse, ',
@@ -116,6 +126,125 @@ def output_scattering_information(scatter_stats):
         file.writelines(info)
 
 
+def output_termination_information(general_stats):
+    """Output the number of phonons that were terminated early and the reasons"""
+    if not cf.terminate_stuck_phonons:
+        return
+    descriptions = {
+        Termination.OUT_OF_DOMAIN: 'escaped the structure',
+        Termination.INSIDE_OBSTACLE: 'got inside an obstacle',
+        Termination.NOT_PROGRESSING: 'did not progress along the structure',
+    }
+    info = ['\n\nPhonons terminated early:']
+    for reason in Termination:
+        info.append(f'\n{int(general_stats.terminated_phonons[reason.value])} phonons {descriptions[reason]}')
+    info.append('\n')
+    with open("Information.txt", "a", encoding="utf-8") as file:
+        file.writelines(info)
+
+    number_of_terminated_phonons = int(sum(general_stats.terminated_phonons))
+    if number_of_terminated_phonons:
+        logging.warning(f"{number_of_terminated_phonons} phonons were terminated early. See Information.txt for the reasons.")
+
+
+def output_control_variate_information(control_variate, thermal_maps):
+    """Output the thermal conductivity corrected with the control variate and its spread between timeframes"""
+    info = [
+            f'\n\nControl variate with {cf.control_variate_reference} reference:',
+            f'\nK_eff = {control_variate.av_effective_thermal_conductivity:.3f} ± ',
+            f'{control_variate.std_effective_thermal_conductivity:.3f} W/m·K ',
+            f'(without correction {control_variate.uncorrected_std_effective_thermal_conductivity:.3f} W/m·K estimated, ',
+            f'{thermal_maps.std_effective_thermal_conductivity:.3f} W/m·K between timeframes, ',
+            f'correlation {control_variate.correlation_effective:.2f})',
+            f'\nK_mat = {control_variate.av_material_thermal_conductivity:.3f} ± ',
+            f'{control_variate.std_material_thermal_conductivity:.3f} W/m·K ',
+            f'(without correction {control_variate.uncorrected_std_material_thermal_conductivity:.3f} W/m·K estimated, ',
+            f'{thermal_maps.std_material_thermal_conductivity:.3f} W/m·K between timeframes, ',
+            f'correlation {control_variate.correlation_material:.2f})\n',
+            ]
+    with open("Information.txt", "a", encoding="utf-8") as file:
+        file.writelines(info)
+
+
+def output_temperature_sweep_information(temperature_sweep):
+    """Output the thermal conductivity at various temperatures and the bias of the reweighting"""
+    info = ['\n\nThermal conductivity reweighted from the boundary scattering tracing:']
+    for temp, kappa, share in zip(temperature_sweep.temperatures, temperature_sweep.thermal_conductivity,
+                                  temperature_sweep.internal_share):
+        info.append(f'\nT = {temp:g} K: K = {kappa:.3f} W/m·K, {share*100:.1f}% of free paths end with internal scattering')
+    info.extend([
+            '\nInternal scattering events were placed along the boundary free paths, ',
+            'but they do not randomize the direction as in the full simulation. ',
+            'The result is biased when internal scattering contributes significantly, ',
+            'so compare with a full simulation at the temperatures with a large share of internal scattering.\n',
+            ])
+    with open("Information.txt", "a", encoding="utf-8") as file:
+        file.writelines(info)
+
+
+def output_cell_transfer_information(cell_transfer, start_time):
+    """Output the parameters of the cell transfer simulation and the conductance of the whole structure"""
+    print(f'\rThe simulation took about {int((time.time() - start_time)//60)} min. to run.')
+    info = [
+            f'The simulation finished on {time.strftime("%d %B %Y")}, at {time.strftime("%H:%M")}.',
+            f'\nIt took about {int((time.time()-start_time)//60)} min to run.\n',
+            f'\nNumber of phonons per entry state = {cf.cell_phonons_per_state}',
+            f'\nNumber of entry states = 2 sides x {cf.cell_position_bins} positions x ',
+            f'{cf.cell_polar_angle_bins} polar x {cf.cell_azimuthal_angle_bins} azimuthal angles',
+            f'\nNumber of frequency bins = {cf.cell_frequency_bins} per branch',
+            f'\nNumber of timesteps = {cf.number_of_timesteps}',
+            f'\nLength of a timestep = {cf.timestep} s',
+            f'\nTemperature = {cf.temp} K\n',
+            f'\nMaterial: {cf.media}\n',
+            f'\nCell length = {cf.length * 1e9:.1f} nm',
+            f'\nWidth = {cf.width * 1e9:.1f} nm',
+            f'\nThickness = {cf.thickness * 1e9:.1f} nm',
+            f'\nNumber of cells = {cf.number_of_cells}',
+            f'\nStructure length = {cell_transfer.structure_length * 1e6:.3f} μm\n',
+            f'\n{cell_transfer.lost_fraction * 100:.2f}% of phonons did not exit the cell\n',
+            f'\nTransmission of the structure averaged over the emitted heat flux = ',
+            f'{cell_transfer.conductance / max(np.sum(cell_transfer.bin_fluxes), 1e-300):.4e}',
+            f'\nThermal conductance per unit area = {cell_transfer.conductance:.4e} W/m²·K',
+            f'\nThermal conductance = {cell_transfer.conductance * cf.width * cf.thickness:.4e} W/K',
+            f'\nEffective thermal conductivity = {cell_transfer.thermal_conductivity:.3f} W/m·K\n',
+            ]
+    with open("Information.txt", "w+", encoding="utf-8") as file:
+        file.writelines(info)
+
+    if cell_transfer.lost_fraction > 0.05:
+        logging.warning(f"{cell_transfer.lost_fraction * 100:.0f}% of phonons did not exit the cell. Increase number of timesteps.")
+
+
+def output_ballistic_transmission_information(transmission, start_time):
+    """Output the parameters of the ballistic transmission simulation and the conductance of the structure"""
+    print(f'\rThe simulation took about {int((time.time() - start_time)//60)} min. to run.')
+    info = [
+            f'The simulation finished on {time.strftime("%d %B %Y")}, at {time.strftime("%H:%M")}.',
+            f'\nIt took about {int((time.time()-start_time)//60)} min to run.\n',
+            f'\nNumber of phonons per frequency bin = {cf.transmission_phonons_per_bin}',
+            f'\nNumber of frequency bins = {cf.transmission_frequency_bins} per branch',
+            f'\nNumber of timesteps = {cf.number_of_timesteps}',
+            f'\nLength of a timestep = {cf.timestep} s',
+            f'\nTemperature = {cf.temp} K\n',
+            f'\nMaterial: {cf.media}\n',
+            f'\nLength = {cf.length * 1e9:.1f} nm',
+            f'\nWidth = {cf.width * 1e9:.1f} nm',
+            f'\nThickness = {cf.thickness * 1e9:.1f} nm\n',
+            f'\n{transmission.lost_fraction * 100:.2f}% of phonons did not exit the structure\n',
+            f'\nTransmission averaged over the emitted heat flux = {transmission.average_transmission:.4e}',
+            f'\nThermal conductance per unit area = {transmission.conductance:.4e} W/m²·K',
+            f'\nThermal conductance = {transmission.conductance * transmission.cross_section_area:.4e} W/K',
+            f'\nEffective thermal conductivity = {transmission.thermal_conductivity:.3f} W/m·K\n',
+            ]
+    with open("Information.txt", "w+", encoding="utf-8") as file:
+        file.writelines(info)
+
+    if transmission.lost_fraction > 0.05:
+        logging.warning(f"{transmission.lost_fraction * 100:.0f}% of phonons did not exit the structure. Increase number of timesteps.")
+    if not sources_are_lambertian(cf.phonon_sources):
+        logging.warning("Phonon sources do not have the Lambert distribution of angles, so the conductance is not that of a hot reservoir.")
+
+
 def output_parameter_warnings():
     """Check if parameters used for this simulation made sense considering the simulation results"""
 
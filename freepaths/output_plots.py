@@ -1,16 +1,16 @@
 """Module that calculates and outputs vaious plots and distributions from the saved files"""
 
 import logging
-import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from matplotlib.colors import LogNorm
+from matplotlib.collections import PatchCollection
 from matplotlib import font_manager
 
 from freepaths.config import cf
 from freepaths.output_structure import draw_structure_top_view, draw_structure_side_view
-from freepaths.materials import Si, SiC, Graphite
+from freepaths.materials import get_material
 import matplotlib.pyplot as plt
 
 # Style of the plots:
@@ -115,6 +115,65 @@ def plot_cumulative_thermal_conductivity(mfp_sampling):
     np.savetxt('Data/Distribution of thermal conductivity.csv', np.vstack((mfp, kappa)).T, fmt='%1.3e', delimiter=",")
 
 
+def plot_thermal_conductivity_vs_temperature():
+    """Plot thermal conductivity calculated at various temperatures"""
+    temperatures, kappa, kappa_boundary = np.genfromtxt("Data/Thermal conductivity vs temperature.csv",
+                                                        unpack=True, delimiter=',', usecols=(0, 1, 2), skip_header=1, ndmin=1)
+    fig, ax = plt.subplots()
+    ax.plot(temperatures, kappa, '-o', markersize=2, c='royalblue', label='Boundary and internal scattering')
+    ax.plot(temperatures, kappa_boundary, '--', c='gray', label='Boundary scattering only')
+    ax.set_xlabel('Temperature (K)')
+    ax.set_ylabel('Thermal conductivity (W/m·K)')
+    ax.legend()
+    fig.savefig("Thermal conductivity vs temperature.pdf", format='pdf', bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_cell_transmission():
+    """Plot transmission of one cell and of the whole structure in the cell transfer mode"""
+    branches, frequencies, _, cell_transmission, _, transmission = np.genfromtxt("Data/Cell transfer.csv", unpack=True,
+                                                                              delimiter=',', usecols=range(6), skip_header=1, ndmin=2)
+    fig, ax = plt.subplots()
+    for branch_number, color in zip(range(3), ['royalblue', 'deeppink', 'forestgreen']):
+        is_branch = (branches == branch_number) & (frequencies > 0)
+        ax.plot(frequencies[is_branch] * 1e-12, cell_transmission[is_branch], '--o', markersize=2, c=color)
+        ax.plot(frequencies[is_branch] * 1e-12, transmission[is_branch], '-o', markersize=2, c=color, label=f'Branch {branch_number + 1}')
+    ax.set_xlabel('Frequency (THz)')
+    ax.set_ylabel('Transmission')
+    ax.set_yscale('log')
+    ax.set_title('One cell (dashed) and whole structure (solid)')
+    ax.legend()
+    fig.savefig("Transmission.pdf", format='pdf', bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_transmission_function():
+    """Plot transmission function and distribution of exit angles in the ballistic transmission mode"""
+    branches, frequencies, _, transmission = np.genfromtxt("Data/Transmission function.csv", unpack=True,
+                                                           delimiter=',', usecols=range(4), skip_header=1, ndmin=2)
+    fig, ax = plt.subplots()
+    for branch_number, color in zip(range(3), ['royalblue', 'deeppink', 'forestgreen']):
+        is_branch = (branches == branch_number) & (frequencies > 0)
+        ax.plot(frequencies[is_branch] * 1e-12, transmission[is_branch], '-o', markersize=2, c=color, label=f'Branch {branch_number + 1}')
+    ax.set_xlabel('Frequency (THz)')
+    ax.set_ylabel('Transmission')
+    ax.legend()
+    fig.savefig("Transmission function.pdf", format='pdf', bbox_inches="tight")
+    plt.close(fig)
+
+    _, _, transmitted, angles = np.genfromtxt("Data/Transmission rays.csv", unpack=True,
+                                              delimiter=',', usecols=range(4), skip_header=1, ndmin=2)
+    fig, ax = plt.subplots()
+    bins = np.linspace(0, 90, 46)
+    ax.hist(angles[transmitted > 0], bins=bins, histtype='step', color='royalblue', label='Transmitted')
+    ax.hist(angles[transmitted == 0], bins=bins, histtype='step', color='deeppink', label='Reflected')
+    ax.set_xlabel('Exit angle (degrees)')
+    ax.set_ylabel('Number of phonons')
+    ax.legend()
+    fig.savefig("Exit angles.pdf", format='pdf', bbox_inches="tight")
+    plt.close(fig)
+
+
 def plot_angle_distribution():
     """Plot distribution of initial and exit angles"""
     angle_distributions = angle_distribution_calculation()
@@ -386,8 +445,7 @@ def plot_trajectories():
 
     # Draw structure:
     patches = draw_structure_top_view(cf, color_holes='white', color_back=cf.output_structure_color)
-    for patch in patches:
-        ax.add_patch(patch)
+    ax.add_collection(PatchCollection(patches, match_original=True))
 
     # Draw paths:
     for index in range(cf.output_trajectories_of_first):
@@ -472,8 +530,7 @@ def plot_structure():
 
     # Draw structures:
     patches = draw_structure_top_view(cf, color_holes='black', color_back='royalblue')
-    for patch in patches:
-        ax.add_patch(patch)
+    ax.add_collection(PatchCollection(patches, match_original=True))
 
     # Set labels:
     ax.set_xlabel('X (μm)')
@@ -489,15 +546,7 @@ def plot_material_properties():
     """Plot phonon dispersion and display some other material properties"""
 
     # Initialize the material:
-    if cf.media == "Si":
-        material = Si(cf.temp)
-    elif cf.media == "SiC":
-        material = SiC(cf.temp)
-    elif cf.media == "Graphite":
-        material = Graphite(cf.temp)
-    else:
-        logging.error(f"Material {cf.media} is not supported")
-        sys.exit()
+    material = get_material(cf.media, cf.temp)
 
     # Plot phonon dispersion:
     fig, ax = plt.subplots()
@@ -548,6 +597,10 @@ def plot_data(mfp_sampling=False):
 
     # Run additional functions:
     plot_cumulative_thermal_conductivity(mfp_sampling)
-    plot_heat_flux_map(file="Data/Heat flux map xy.csv", label="Heat flux map", units="W/m²")
-    plot_heat_flux_map(file="Data/Heat flux map x.csv", label="Heat flux map x", units="W/m²")
-    plot_heat_flux_map(file="Data/Heat flux map y.csv", label="Heat flux map y", units="W/m²")
+    for file, label in [("Data/Heat flux map xy.csv", "Heat flux map"),
+                        ("Data/Heat flux map x.csv", "Heat flux map x"),
+                        ("Data/Heat flux map y.csv", "Heat flux map y")]:
+        try:
+            plot_heat_flux_map(file=file, label=label, units="W/m²")
+        except Exception as e:
+            logging.warning(f"Function plot_heat_flux_map failed: {e}")
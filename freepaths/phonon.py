@@ -1,21 +1,26 @@
 """This module provides phonon class which generates and moves a phonon"""
 
-from math import pi, asin, exp, log
+from math import pi, asin, exp, log, sin, cos
 from random import random, choice, randint
 from numpy import sign
 from scipy.constants import k, hbar
-import numpy as np
 import enum
 
 from freepaths.config import cf
-import freepaths.move
 
 
 class Phonon:
     """A phonon particle with various physical properties"""
 
-    def __init__(self, material, branch_number=None, phonon_number=None):
-        """Initialize a phonon by assigning initial properties"""
+    def __init__(self, material, branch_number=None, phonon_number=None, initial_state=None):
+        """Initialize a phonon by assigning initial properties, which might be already generated in bulk"""
+        self._direction = None
+        self._step = None
+        if initial_state is not None:
+            self.phonon_number = None
+            self.assign_initial_state(material, initial_state)
+            return
+
         self.branch_number = branch_number
         self.phonon_number = phonon_number
         self.x = None
@@ -30,15 +35,11 @@ class Phonon:
         # Assign initial properties of the phonon:
         if self.branch_number is None:
             self.branch_number = choice(range(3))
-        self.f_max = max(material.dispersion[:, self.branch_number + 1])
+        self.f_max = material.maximum_frequencies[self.branch_number]
 
-        # Assign initial coordinates but ensure that it's not inside a hole:
+        # Assign initial coordinates in the free area of the source:
         source = choice(cf.phonon_sources)
-        while True:
-            self.x, self.y, self.z = source.generate_coordinates()
-            is_in_hole = any(hole.is_inside(self.x, self.y, None, cf) for hole in cf.holes)
-            if not is_in_hole:
-                break
+        self.x, self.y, self.z = source.generate_coordinates(cf)
 
         # Assign initial angles:
         self.theta, self.phi = source.generate_angles()
@@ -60,23 +61,69 @@ class Phonon:
         self.assign_speed(material)
         self.assign_internal_scattering_time(material)
 
+    @property
+    def theta(self):
+        """In-plane angle of the phonon direction"""
+        return self._theta
+
+    @theta.setter
+    def theta(self, value):
+        self._theta = value
+        self._direction = None
+        self._step = None
+
+    @property
+    def phi(self):
+        """Out-of-plane angle of the phonon direction"""
+        return self._phi
+
+    @phi.setter
+    def phi(self, value):
+        self._phi = value
+        self._direction = None
+        self._step = None
+
+    @property
+    def speed(self):
+        """Group velocity of the phonon"""
+        return self._speed
+
+    @speed.setter
+    def speed(self, value):
+        self._speed = value
+        self._step = None
+
+    @property
+    def direction(self):
+        """Unit vector of the phonon direction, which is recalculated only when the angles change"""
+        if self._direction is None:
+            cos_phi = abs(cos(self._phi))
+            self._direction = (sin(self._theta) * cos_phi, cos(self._theta) * cos_phi, sin(self._phi))
+        return self._direction
+
+    @property
+    def velocity(self):
+        """Velocity vector of the phonon"""
+        d_x, d_y, d_z = self.direction
+        return d_x * self._speed, d_y * self._speed, d_z * self._speed
+
+    def step(self, timestep):
+        """Displacement of the phonon in one timestep, which is recalculated only when the angles or speed change"""
+        if self._step is None or self._step[0] != timestep:
+            v_x, v_y, v_z = self.velocity
+            self._step = (timestep, v_x * timestep, v_y * timestep, v_z * timestep)
+        return self._step[1:]
+
     @property
     def wavelength(self):
         """Calculate wavelength of the phonon"""
         return self.speed / self.f
 
-    @property
-    def is_in_system(self):
-        """Checks if the phonon at this timestep did not reach the cold side.
-        Depending on where user set cold sides, we check if phonon crossed that line"""
-        is_inside_top = self.y < cf.length
-        is_inside_bottom = self.y > 0
-        is_inside_right = self.x < cf.width / 2.0
-        is_inside_left = self.x > - cf.width / 2.0
-        return ((not cf.cold_side_position_top or is_inside_top) and
-                (not cf.cold_side_position_bottom or is_inside_bottom) and
-                (not cf.cold_side_position_right or is_inside_right) and
-                (not cf.cold_side_position_left or is_inside_left))
+    def assign_initial_state(self, material, state):
+        """Assign initial properties from a state produced by the InitialStateGenerator"""
+        (self.branch_number, self.f, self.speed, self.time_of_internal_scattering,
+         self.x, self.y, self.z, self.theta, self.phi, self.first_timestep) = state
+        self.f_max = material.maximum_frequencies[self.branch_number]
 
     def assign_frequency(self, material):
         """Assigning frequency with probability according to Planckian distribution"""
@@ -106,11 +153,7 @@ class Phonon:
 
     def assign_speed(self, material):
         """Calculate group velocity dw/dk according to the frequency and polarization"""
-        point_num = abs((np.abs(material.dispersion[:, self.branch_number + 1] - self.f)).argmin() - 1)
-        d_w = 2*pi*abs(material.dispersion[point_num + 1, self.branch_number + 1]
-                       - material.dispersion[point_num, self.branch_number + 1])
-        d_k = abs(material.dispersion[point_num + 1, 0] - material.dispersion[point_num, 0])
-        self.speed = d_w / d_k
+        self.speed = material.group_velocity(self.branch_number, self.f)
 
     def assign_internal_scattering_time(self, material):
         """Determine relaxation time after which this phonon will undergo internal scattering"""
@@ -121,9 +164,9 @@ class Phonon:
             omega = 2 * pi * self.f
             self.time_of_internal_scattering = -log(random()) * material.relaxation_time(omega)
 
-    def move(self):
-        """Move a phonon in one timestep and return new coordinates"""
-        self.x, self.y, self.z = freepaths.move.move(self, cf.timestep)
+    def relax(self, material):
+        """Update the phonon after internal scattering, which changes only its direction in this model"""
+        pass
 
     def correct_angle(self):
         """Check if angles are out of the [-pi:pi] range and return them back to this range"""
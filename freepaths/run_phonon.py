@@ -4,45 +4,46 @@ After the run, we record various parameters of this run into flight object.
 """
 
 from freepaths.config import cf
-from freepaths.scattering import internal_scattering, surface_scattering, reinitialization
 from freepaths.scattering_types import ScatteringTypes, ScatteringPlaces
+from freepaths.termination import TerminationCheck
 
 
-def run_phonon(phonon, flight, scatter_stats, places_stats, segment_stats, thermal_maps, scatter_maps, material):
-    """Run one phonon through the system and record parameters of this run"""
+def run_phonon(phonon, flight, scatter_stats, places_stats, segment_stats, thermal_maps, scatter_maps, material, kernel):
+    """Run one phonon through the system with the step functions of the kernel and record parameters of this run"""
 
     # Initialize object that will store scattering types:
     scattering_types = ScatteringTypes()
     triangle_scattering_places = ScatteringPlaces()
 
+    termination_check = TerminationCheck(phonon, kernel.hole_index)
+
     # Run the phonon step-by-step:
     for step_number in range(cf.number_of_timesteps):
-        if phonon.is_in_system:
+        if kernel.is_in_system(phonon):
 
             # Check if different scattering events happened during current time step:
-            if cf.include_internal_scattering:
-                internal_scattering(phonon, flight, scattering_types)
-            surface_scattering(phonon, scattering_types, triangle_scattering_places)
-            reinitialization(phonon, scattering_types)
+            kernel.scattering(phonon, flight, scattering_types)
 
             # If any scattering has occurred, record it:
             if scattering_types.is_scattered:
                 flight.add_point_to_path()
                 scatter_stats.save_scattering_events(phonon.y, scattering_types)
-                if cf.output_scattering_map:
+                if kernel.output_scattering_map:
                     scatter_maps.add_scattering_to_map(phonon, scattering_types)
 
             # Otherwise, record only if animation is requested:
             else:
-                if cf.output_path_animation:
+                if kernel.output_path_animation:
                     flight.add_point_to_path()
 
             # If diffuse scattering has occurred, reset phonon free path:
             if scattering_types.is_diffuse or scattering_types.is_internal:
                 flight.save_free_paths()
                 flight.restart()
+                if scattering_types.is_internal:
+                    phonon.relax(material)
                 phonon.assign_internal_scattering_time(material)
-                if cf.is_two_dimensional_material:
+                if kernel.is_two_dimensional_material:
                     phonon.phi = 0.0
 
             # If hole scattering has occured, record it:
@@ -56,16 +57,34 @@ def run_phonon(phonon, flight, scatter_stats, places_stats, segment_stats, therm
             else:
                 flight.add_step(cf.timestep)
 
+            # Start a new free flight segment in the maps if the phonon has changed direction:
+            if scattering_types.is_scattered or step_number == 0:
+                thermal_maps.start_segment(phonon, step_number, material)
+
             # Record presence of the phonon at this timestep and move on:
-            thermal_maps.add_energy_to_maps(phonon, step_number, material)
             segment_stats.record_time_in_segment(phonon.y)
             scattering_types.reset()
             triangle_scattering_places.reset()
-            phonon.move()
+            phonon.x, phonon.y, phonon.z = kernel.move(phonon, cf.timestep)
+
+            # Periodically check if the phonon is trapped or escaped and terminate it:
+            if kernel.terminate_stuck_phonons:
+                termination_check.update(phonon)
+                if (step_number + 1) % cf.termination_check_window == 0:
+                    flight.termination = termination_check.check(phonon)
+                    if flight.termination:
+                        flight.add_point_to_path()
+                        flight.save_free_paths()
+                        thermal_maps.finish_segment(step_number + 1)
+                        break
 
         # If the phonon reached cold side, record it and break the loop:
         else:
+            thermal_maps.finish_segment(step_number)
             flight.add_point_to_path()
             flight.save_free_paths()
             flight.finish(step_number, cf.timestep)
             break
+
+    # Add the last free flight segment if the phonon did not leave the system:
+    thermal_maps.finish_segment(cf.number_of_timesteps)
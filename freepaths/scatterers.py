@@ -4,13 +4,15 @@ These classes contain all methods associated with scattering on holes.
 """
 
 
-from math import atan
+from math import atan, atan2, inf
+import numpy as np
 from numpy import pi, array, linspace, column_stack, vstack
 from random import random
 from matplotlib.patches import Rectangle, Circle, Polygon
-from scipy.spatial import cKDTree
 
 from freepaths.scattering_primitives import *
+from freepaths.segment_tree import SegmentTree, polyline_segments
+from freepaths.mesh import TriangleTree, read_stl
 from freepaths.scattering_types import ScatteringTypes
 
 
@@ -22,6 +24,19 @@ class Hole:
         """
         pass
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        is_inside = np.vectorize(lambda x, y: bool(self.is_inside(x, y, None, cf)), otypes=[bool])
+        return is_inside(x, y)
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the hole in the plane or None if it is not limited"""
+        return None
+
+    def is_crossed(self, ph, x, y, z, cf):
+        """Check if phonon crosses the boundary of the hole on its way to given coordinates"""
+        return self.is_inside(x, y, z, cf)
+
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """
         Calculate the new direction after scattering on the hole.
@@ -36,6 +51,23 @@ class Hole:
         """
         pass
 
+    def rotate_points(self, points, angle):
+        rotated_points = []
+        cos_theta = cos(-angle/180*pi)
+        sin_theta = sin(-angle/180*pi)
+
+        for point in points:
+            x = point[0]
+            y = point[1]
+
+            # Perform rotation using rotation matrix
+            new_x = x * cos_theta - y * sin_theta
+            new_y = x * sin_theta + y * cos_theta
+
+            rotated_points.append((new_x, new_y))
+
+        return rotated_points
+
 
 class CircularHole(Hole):
     """Shape of a circular hole"""
@@ -50,6 +82,15 @@ class CircularHole(Hole):
         radius = self.diameter / 2
         return (x - self.x0) ** 2 + (y - self.y0) ** 2 <= radius**2
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        return self.is_inside(x, y, None, cf)
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the hole in the plane"""
+        radius = self.diameter / 2
+        return self.x0 - radius, self.x0 + radius, self.y0 - radius, self.y0 + radius
+
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """Calculate the new direction after scattering on the hole"""
         if y == self.y0:
@@ -90,6 +131,13 @@ class RectangularHole(Hole):
         else:
             return (abs(x - self.x0) <= self.size_x / 2) and (abs(y - self.y0) <= self.size_y / 2)
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        return (np.abs(x - self.x0) <= self.size_x / 2) & (np.abs(y - self.y0) <= self.size_y / 2)
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the hole in the plane"""
+        return self.x0 - self.size_x / 2, self.x0 + self.size_x / 2, self.y0 - self.size_y / 2, self.y0 + self.size_y / 2
 
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """Calculate the new direction after scattering on the hole"""
@@ -143,6 +191,16 @@ class TriangularUpHole(Hole):
         return ((self.size_y / 2 + (y - self.y0) <= (self.size_x / 2 - abs(x - self.x0)) / tan(beta))
                 and (abs(y - self.y0) < self.size_y / 2))
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        beta = atan(0.5 * self.size_x / self.size_y)
+        return ((self.size_y / 2 + (y - self.y0) <= (self.size_x / 2 - np.abs(x - self.x0)) / tan(beta))
+                & (np.abs(y - self.y0) < self.size_y / 2))
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the hole in the plane"""
+        return self.x0 - self.size_x / 2, self.x0 + self.size_x / 2, self.y0 - self.size_y / 2, self.y0 + self.size_y / 2
+
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """Calculate the new direction after scattering on the hole"""
 
@@ -188,6 +246,16 @@ class TriangularDownHole(Hole):
         return ((self.size_y / 2 - (y - self.y0) <= (self.size_x / 2 - abs(x - self.x0)) / tan(beta))
                 and (abs(y - self.y0) < self.size_y / 2))
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        beta = atan(0.5 * self.size_x / self.size_y)
+        return ((self.size_y / 2 - (y - self.y0) <= (self.size_x / 2 - np.abs(x - self.x0)) / tan(beta))
+                & (np.abs(y - self.y0) < self.size_y / 2))
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the hole in the plane"""
+        return self.x0 - self.size_x / 2, self.x0 + self.size_x / 2, self.y0 - self.size_y / 2, self.y0 + self.size_y / 2
+
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """Calculate the new direction after scattering on the hole"""
 
@@ -235,6 +303,17 @@ class TriangularDownHalfHole(Hole):
            return ((self.size_y / 2 - (y - self.y0) <= (self.size_x / 2 - abs(x - self.x0)) / tan(beta))
             and (abs(y - self.y0) < self.size_y / 2) and (x < self.x0))
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        beta = atan(0.5 * self.size_x / self.size_y)
+        is_on_this_half = (x > self.x0) if self.is_right_half else (x < self.x0)
+        return ((self.size_y / 2 - (y - self.y0) <= (self.size_x / 2 - np.abs(x - self.x0)) / tan(beta))
+                & (np.abs(y - self.y0) < self.size_y / 2) & is_on_this_half)
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the hole in the plane"""
+        return self.x0 - self.size_x / 2, self.x0 + self.size_x / 2, self.y0 - self.size_y / 2, self.y0 + self.size_y / 2
+
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """Calculate the new direction after scattering on the hole"""
 
@@ -325,6 +404,17 @@ class TriangularUpHalfHole(Hole):
             return ((self.size_y / 2 + (y - self.y0) <= (self.size_x / 2 - abs(x - self.x0)) / tan(beta))
                     and (abs(y - self.y0) < self.size_y / 2) and (x < self.x0))
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        beta = atan(0.5 * self.size_x / self.size_y)
+        is_on_this_half = (x > self.x0) if self.is_right_half else (x < self.x0)
+        return ((self.size_y / 2 + (y - self.y0) <= (self.size_x / 2 - np.abs(x - self.x0)) / tan(beta))
+                & (np.abs(y - self.y0) < self.size_y / 2) & is_on_this_half)
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the hole in the plane"""
+        return self.x0 - self.size_x / 2, self.x0 + self.size_x / 2, self.y0 - self.size_y / 2, self.y0 + self.size_y / 2
+
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """Calculate the new direction after scattering on the hole"""
 
@@ -392,7 +482,10 @@ class TriangularUpHalfHole(Hole):
 
 
 class PointLineHole(Hole):
-    """General shape that can be defined by a list of points"""
+    """
+    General shape that can be defined by a list of points, i.e. a line of given thickness through these points.
+    The line is represented by capsules around its segments, which connect only closely spaced neighbouring points.
+    """
 
     def __init__(self, x=0, y=0, points=None, thickness=100e-9, rotation=0):
         # add option for rounded/angled corners?
@@ -405,52 +498,66 @@ class PointLineHole(Hole):
 
         # Move points to x0, y0 position:
         self.points = array(points) + (x, y)
-
-        # Build cKDTree for fast search:
-        self.tree = cKDTree(self.points)
         self.thickness = thickness
 
+        # Build the tree of segments for fast search:
+        self.segments = polyline_segments(self.points, thickness)
+        self.tree = SegmentTree(self.segments, thickness / 2)
+        self._last_query = (None, None, inf, None)
+
+    def nearest_segment(self, x, y):
+        """Find the distance to the nearest segment and its index, reusing the result for the same coordinates"""
+        last_x, last_y, distance, index = self._last_query
+        if x != last_x or y != last_y:
+            distance, index = self.tree.nearest(x, y)
+            self._last_query = (x, y, distance, index)
+        return distance, index
+
     def is_inside(self, x, y, z, cf):
         """Check if phonon with given coordinates traverses the boundary"""
-        distance, _ = self.tree.query((x, y))
+        distance, _ = self.nearest_segment(x, y)
         return distance < self.thickness / 2
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        return self.tree.distances_array(x, y) < self.thickness / 2
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the hole in the plane"""
+        x_min, y_min = np.min(self.points, axis=0) - self.thickness / 2
+        x_max, y_max = np.max(self.points, axis=0) + self.thickness / 2
+        return x_min, x_max, y_min, y_max
+
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """Calculate the new direction after scattering on the hole"""
 
-        # First, find nearest circle and get its coordinates:
-        distance, index = self.tree.query((x, y))
-        x0, y0 = self.points[index]
-        if y == y0:
-            y += 1e-9  # Prevent division by zero
-        tangent_theta = atan((x - x0) / (y - y0))
+        # First, find the nearest segment and the normal to it:
+        _, index = self.nearest_segment(x, y)
+        if index is None:
+            return
+        distance, normal_theta = self.tree.distance(x, y, index)
 
         # Check if the phonon is traveling towards the hole:
-        current_distance, _ = self.tree.query((ph.x, ph.y))
+        current_distance, current_normal_theta = self.tree.distance(ph.x, ph.y, index)
         if distance <= current_distance:
-            scattering_types.holes = circle_outer_scattering(ph, tangent_theta, y, y0, cf.hole_roughness, cf)
+            if distance == 0:
+                normal_theta = current_normal_theta  # Phonon is on the line itself, so it came from its side
+            scattering_types.holes = normal_scattering(ph, normal_theta, cf.hole_roughness, cf)
 
     def get_patch(self, color_holes, cf):
         """Create a patch in the shape of the hole to use in the plots"""
-        return [Circle((x*1e6, y*1e6), self.thickness*1e6/2, facecolor=color_holes,) for x, y in self.points]
-
-
-    def rotate_points(self, points, angle):
-        rotated_points = []
-        cos_theta = cos(-angle/180*pi)
-        sin_theta = sin(-angle/180*pi)
-
-        for point in points:
-            x = point[0]
-            y = point[1]
-
-            # Perform rotation using rotation matrix
-            new_x = x * cos_theta - y * sin_theta
-            new_y = x * sin_theta + y * cos_theta
-
-            rotated_points.append((new_x, new_y))
-
-        return rotated_points
+        radius = self.thickness / 2
+        patches = []
+        for x1, y1, x2, y2 in self.segments:
+            patches.append(Circle((x1*1e6, y1*1e6), radius*1e6, facecolor=color_holes))
+            patches.append(Circle((x2*1e6, y2*1e6), radius*1e6, facecolor=color_holes))
+            length = np.hypot(x2 - x1, y2 - y1)
+            if length > 0:
+                normal_x, normal_y = radius * (y1 - y2) / length, radius * (x2 - x1) / length
+                corners = [(x1 + normal_x, y1 + normal_y), (x2 + normal_x, y2 + normal_y),
+                           (x2 - normal_x, y2 - normal_y), (x1 - normal_x, y1 - normal_y)]
+                patches.append(Polygon(1e6 * array(corners), closed=True, facecolor=color_holes))
+        return patches
 
 
 class FunctionLineHole(PointLineHole):
@@ -482,6 +589,154 @@ class FunctionLineHole(PointLineHole):
         return vstack((xs, ys)).T
 
 
+class PolygonHole(Hole):
+    """Shape of a hole with an arbitrary polygon defined by a list of vertices"""
+
+    def __init__(self, x=0, y=0, points=None, depth=None, rotation=0):
+        assert points is not None and len(points) > 2, "Please provide at least three vertices to the PolygonHole"
+
+        # Rotate vertices and move them to x0, y0 position:
+        if rotation != 0 and rotation is not None:
+            points = self.rotate_points(points, rotation)
+        self.x0 = x
+        self.y0 = y
+        self.points = array(points, dtype=float) + (x, y)
+        if np.all(self.points[0] == self.points[-1]):
+            self.points = self.points[:-1]
+        self.depth = depth
+        self.size_x, self.size_y = np.ptp(self.points, axis=0)
+
+        # Build the tree of edges for fast search:
+        self.edges = np.column_stack((self.points, np.roll(self.points, -1, axis=0)))
+        self.tree = SegmentTree(self.edges, 0.0)
+
+    def is_inside(self, x, y, z, cf):
+        """Check if phonon with given coordinates traverses the boundary, taking into account the depth of partial holes"""
+        if self.depth and z and z <= cf.thickness/2 - self.depth:
+            return False
+        return self.tree.count_ray_crossings(x, y) % 2 == 1
+
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        return self.tree.count_ray_crossings_array(x, y) % 2 == 1
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the hole in the plane"""
+        x_min, y_min = np.min(self.points, axis=0)
+        x_max, y_max = np.max(self.points, axis=0)
+        return x_min, x_max, y_min, y_max
+
+    def scatter(self, ph, scattering_types, x, y, z, cf):
+        """Calculate the new direction after scattering on the edge that the phonon crosses"""
+
+        # If phonon arrives from below, then it's bottom scattering:
+        if self.depth and ph.z < (cf.thickness/2 - self.depth):
+            scattering_types.holes = in_plane_surface_scattering(ph, cf.top_roughness)
+            return
+
+        # Find the crossed edge or the nearest one if the phonon is already inside:
+        index = self.tree.first_crossing(ph.x, ph.y, x, y)
+        if index is None:
+            index = min(range(len(self.edges)), key=lambda i: self.tree.distance(ph.x, ph.y, i)[0])
+
+        # Normal to the edge pointing to the side of the phonon:
+        x1, y1, x2, y2 = self.edges[index]
+        normal_x, normal_y = y2 - y1, x1 - x2
+        if normal_x * (ph.x - x1) + normal_y * (ph.y - y1) < 0:
+            normal_x, normal_y = -normal_x, -normal_y
+        scattering_types.holes = normal_scattering(ph, atan2(normal_x, normal_y), cf.hole_roughness, cf)
+
+    def get_patch(self, color_holes, cf):
+        """Create a patch in the shape of the hole to use in the plots"""
+        return Polygon(1e6 * self.points, closed=True, facecolor=color_holes)
+
+
+class MeshObstacle(Hole):
+    """
+    Obstacle of arbitrary 3D shape defined by a closed triangulated mesh from an STL file,
+    for example, a hole with inclined walls, an undercut, or a trench of partial depth.
+    Coordinates of the mesh are multiplied by the scale [m] and moved to x, y, z position.
+    """
+
+    def __init__(self, filename, x=0, y=0, z=0, scale=1e-9):
+        self.x0 = x
+        self.y0 = y
+        self.triangles = read_stl(filename) * scale + (x, y, z)
+        self.tree = TriangleTree(self.triangles)
+        self.size_x, self.size_y, self.height = np.ptp(self.triangles.reshape(-1, 3), axis=0)
+        self._crossed_triangle = None
+
+    def is_inside(self, x, y, z, cf):
+        """Check if phonon with given coordinates is inside the mesh, in the middle plane of the structure if z is not given"""
+        return self.tree.is_inside((x, y, 0.0 if z is None else z))
+
+    def is_crossed(self, ph, x, y, z, cf):
+        """Check if phonon crosses any triangle of the mesh on its way to given coordinates"""
+        self._crossed_triangle = self.tree.first_intersection((ph.x, ph.y, ph.z), (x, y, z))
+        return self._crossed_triangle is not None
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the mesh projection on the plane"""
+        (x_min, y_min, _), (x_max, y_max, _) = self.tree.root[0]
+        return x_min, x_max, y_min, y_max
+
+    def scatter(self, ph, scattering_types, x, y, z, cf):
+        """Calculate the new direction after scattering on the triangle that the phonon crosses"""
+        index = self._crossed_triangle
+        if index is None:
+            return
+
+        # Normal to the triangle pointing to the side of the phonon:
+        normal = self.tree.normals[index]
+        v0, _, _ = self.tree.triangle_list[index]
+        if normal[0] * (ph.x - v0[0]) + normal[1] * (ph.y - v0[1]) + normal[2] * (ph.z - v0[2]) < 0:
+            normal = (-normal[0], -normal[1], -normal[2])
+        scattering_types.holes = normal_3d_scattering(ph, normal, cf.hole_roughness)
+
+    def get_patch(self, color_holes, cf):
+        """Create patches of the triangles projected on the plane to use in the plots"""
+        return [Polygon(1e6 * triangle[:, :2], closed=True, facecolor=color_holes) for triangle in self.triangles]
+
+
+class ShiftedHole(Hole):
+    """Copy of a hole shifted along the x axis, for example, its image behind a periodic sidewall"""
+
+    def __init__(self, hole, shift_x):
+        self.hole = hole
+        self.shift_x = shift_x
+
+    def is_inside(self, x, y, z, cf):
+        """Check if phonon with given coordinates is inside the shifted hole"""
+        return self.hole.is_inside(x - self.shift_x, y, z, cf)
+
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the shifted hole"""
+        return self.hole.is_inside_array(x - self.shift_x, y, cf)
+
+    def get_bounding_box(self, cf):
+        """Return (x_min, x_max, y_min, y_max) of the shifted hole in the plane or None if it is not limited"""
+        bounding_box = self.hole.get_bounding_box(cf)
+        if bounding_box is None:
+            return None
+        x_min, x_max, y_min, y_max = bounding_box
+        return x_min + self.shift_x, x_max + self.shift_x, y_min, y_max
+
+    def is_crossed(self, ph, x, y, z, cf):
+        """Check if phonon crosses the boundary of the shifted hole, moving the phonon into the frame of the hole"""
+        phonon_x = ph.x
+        ph.x = phonon_x - self.shift_x
+        is_crossed = self.hole.is_crossed(ph, x - self.shift_x, y, z, cf)
+        ph.x = phonon_x
+        return is_crossed
+
+    def scatter(self, ph, scattering_types, x, y, z, cf):
+        """Calculate the new direction after scattering on the shifted hole"""
+        phonon_x = ph.x
+        ph.x = phonon_x - self.shift_x
+        self.hole.scatter(ph, scattering_types, x - self.shift_x, y, z, cf)
+        ph.x = phonon_x
+
+
 class ParabolaTop(Hole):
     """Shape of a parabolic wall"""
 
@@ -494,6 +749,11 @@ class ParabolaTop(Hole):
         y_cept = -((cf.width / 2) ** 2) / (4 * self.focus) + self.tip
         return (y > y_cept) and (x**2 + 4 * self.focus * (y - self.tip)) >= 0
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        y_cept = -((cf.width / 2) ** 2) / (4 * self.focus) + self.tip
+        return (y > y_cept) & ((x**2 + 4 * self.focus * (y - self.tip)) >= 0)
+
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """Calculate the new direction after scattering on the hole"""
 
@@ -513,15 +773,7 @@ class ParabolaTop(Hole):
 
         # Diffuse scattering:
         else:
-            scattering_types.walls = Scattering.DIFFUSE
-            for _ in range(10):
-                # Lambert distribution
-                ph.theta = normal_theta + asin(2 * random() - 1) - pi / 2
-                ph.phi = asin((asin(2 * random() - 1)) / (pi / 2))
-
-                # Accept the angles only if they do not immediately cause new scattering:
-                if no_new_scattering(ph, cf):
-                    break
+            scattering_types.walls = lambert_scattering(ph, normal_theta - pi / 2, cf)
 
     def get_patch(self, color_holes, cf):
         """Create a patch in the shape of the hole to use in the plots"""
@@ -546,6 +798,11 @@ class ParabolaBottom(Hole):
         y_cept = (cf.width / 2) ** 2 / (4 * self.focus) + self.tip
         return (y < y_cept) and (x**2 - 4 * self.focus * (y - self.tip)) >= 0
 
+    def is_inside_array(self, x, y, cf):
+        """Check which of the points with given arrays of in-plane coordinates are inside the hole"""
+        y_cept = (cf.width / 2) ** 2 / (4 * self.focus) + self.tip
+        return (y < y_cept) & ((x**2 - 4 * self.focus * (y - self.tip)) >= 0)
+
     def scatter(self, ph, scattering_types, x, y, z, cf):
         """Calculate the new direction after scattering on the hole"""
 
@@ -562,15 +819,7 @@ class ParabolaBottom(Hole):
 
         # Diffuse scattering:
         else:
-            scattering_types.walls = Scattering.DIFFUSE
-            for _ in range(10):
-                # Lambertian distribution
-                ph.theta = normal_theta + asin(2 * random() - 1) - pi / 2
-                ph.phi = asin((asin(2 * random() - 1)) / (pi / 2))
-
-                # Accept the angles only if they do not immediately cause new scattering:
-                if no_new_scattering(ph, cf):
-                    break
+            scattering_types.walls = lambert_scattering(ph, normal_theta - pi / 2, cf)
 
     def get_patch(self, color_holes, cf):
         """Create a patch in the shape of the hole to use in the plots"""
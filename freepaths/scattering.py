@@ -7,7 +7,7 @@ call corresponding function for scattering on corresponding primitive.
 from math import sqrt
 
 from freepaths.config import cf
-from freepaths.move import move
+from freepaths.move import move, move_in_plane
 from freepaths.scattering_primitives import *
 
 
@@ -18,20 +18,27 @@ def internal_scattering(ph, flight, scattering_types):
         scattering_types.internal = random_scattering(ph)
 
 
-def reinitialization(ph, scattering_types):
-    """Re-thermalize (diffusely) phonon when it comes back to one of the hot sides"""
-    x, y, _ = move(ph, cf.timestep)
-
-    if cf.hot_side_position_bottom and y < 0:
+def rethermalization_on_bottom_side(ph, scattering_types, x, y):
+    """Re-thermalize (diffusely) phonon when it comes back to the bottom hot side"""
+    if y < 0:
         scattering_types.hot_side = horizontal_surface_up_scattering(ph, cf.side_wall_roughness, is_diffuse=True)
 
-    if cf.hot_side_position_top and y > cf.length:
+
+def rethermalization_on_top_side(ph, scattering_types, x, y):
+    """Re-thermalize (diffusely) phonon when it comes back to the top hot side"""
+    if y > cf.length:
         scattering_types.hot_side = horizontal_surface_down_scattering(ph, cf.side_wall_roughness, is_diffuse=True)
 
-    if cf.hot_side_position_right and x > cf.width / 2:
+
+def rethermalization_on_right_side(ph, scattering_types, x, y):
+    """Re-thermalize (diffusely) phonon when it comes back to the right hot side"""
+    if x > cf.width / 2:
         scattering_types.hot_side = vertical_surface_left_scattering(ph, cf.side_wall_roughness, cf, is_diffuse=True)
 
-    if cf.hot_side_position_left and x < -cf.width / 2:
+
+def rethermalization_on_left_side(ph, scattering_types, x, y):
+    """Re-thermalize (diffusely) phonon when it comes back to the left hot side"""
+    if x < -cf.width / 2:
         scattering_types.hot_side = vertical_surface_right_scattering(ph, cf.side_wall_roughness, cf, is_diffuse=True)
 
 
@@ -59,6 +66,16 @@ def scattering_on_bottom_sidewall(ph, scattering_types, x, y, z):
         scattering_types.walls = horizontal_surface_up_scattering(ph, cf.side_wall_roughness)
 
 
+def crossing_periodic_sidewalls(ph, flight, x):
+    """Move the phonon to the opposite side of the structure if it would cross a periodic sidewall and return new x"""
+    if abs(x) > cf.width / 2:
+        shift = cf.width if x > 0 else -cf.width
+        ph.x -= shift
+        flight.x_offset += shift
+        x -= shift
+    return x
+
+
 def floor_scattering(ph, scattering_types, x, y, z):
     """Check if the phonon hits the floor surface and calculate new angles"""
     if z < -cf.thickness / 2:
@@ -87,51 +104,108 @@ def ceiling_scattering(ph, scattering_types, x, y, z):
         scattering_types.top_bottom = in_plane_surface_scattering(ph, cf.top_roughness)
 
 
-def surface_scattering(ph, scattering_types, triangle_scattering_places):
-    """Check for a surface scattering on this step"""
-
-    # Preliminary move to see if phonon would cross something:
-    x, y, z = move(ph, cf.timestep)
-
-    # Scattering on top and bottom surfaces:
-    ceiling_scattering(ph, scattering_types, x, y, z)
-    floor_scattering(ph, scattering_types, x, y, z)
-
-    # Scattering on sidewalls:
-    if cf.include_right_sidewall:
-        scattering_on_right_sidewall(ph, scattering_types, x, y, z)
-    if cf.include_left_sidewall:
-        scattering_on_left_sidewall(ph, scattering_types, x, y, z)
-    if cf.include_top_sidewall:
-        scattering_on_top_sidewall(ph, scattering_types, x, y, z)
-    if cf.include_bottom_sidewall:
-        scattering_on_bottom_sidewall(ph, scattering_types, x, y, z)
+def build_holes_scattering(hole_index):
+    """Build a function that checks for scattering only on the holes near the phonon"""
 
-    # Scattering on holes:
-    if cf.holes:
-        # Check for each hole and each hole type:
-        for hole in cf.holes:
-            if hole.is_inside(x, y, z, cf):
+    def holes_scattering(ph, scattering_types, x, y, z):
+        """Check for scattering on each hole near the new position of the phonon"""
+        for hole in hole_index.holes_near(x, y):
+            if hole.is_crossed(ph, x, y, z, cf):
                 hole.scatter(ph, scattering_types, x, y, z, cf)
 
             # If there was any scattering, then no need to check rest of the holes:
             if scattering_types.holes is not None:
                 break
 
-    # Check for each pillar:
-    if cf.pillars:
-        for pillar in cf.pillars:
-            pillar.check_if_scattering(ph, scattering_types, x, y, z, cf)
+    return holes_scattering
 
-            # If there was any scattering, then no need to check other pillars:
-            if scattering_types.pillars is not None:
-                break
 
-    # Scattering on interfaces:
-    if cf.interfaces:
-        for interface in cf.interfaces:
-            if interface.is_crossed(ph, x, y, z) and interface.is_transmitted():
-                interface.scatter(ph, scattering_types, x, y, z, cf)
+def pillars_scattering(ph, scattering_types, x, y, z):
+    """Check for scattering on each pillar"""
+    for pillar in cf.pillars:
+        pillar.check_if_scattering(ph, scattering_types, x, y, z, cf)
+
+        # If there was any scattering, then no need to check other pillars:
+        if scattering_types.pillars is not None:
+            break
+
+
+def interfaces_scattering(ph, scattering_types, x, y, z):
+    """Check for scattering on each interface"""
+    for interface in cf.interfaces:
+        if interface.is_crossed(ph, x, y, z) and interface.is_transmitted():
+            interface.scatter(ph, scattering_types, x, y, z, cf)
+
+
+def build_surface_checks(hole_index):
+    """List of surface scattering checks that are enabled in the config"""
+    checks = []
 
-    # Correct angle if it became more than 180 degrees:
-    ph.correct_angle()
+    # Scattering on top and bottom surfaces, which do not exist in 2D materials:
+    if not cf.is_two_dimensional_material:
+        checks.extend([ceiling_scattering, floor_scattering])
+
+    # Scattering on sidewalls, where right and left sidewalls are replaced by periodic boundaries if requested:
+    if cf.include_right_sidewall and not cf.periodic_sidewalls:
+        checks.append(scattering_on_right_sidewall)
+    if cf.include_left_sidewall and not cf.periodic_sidewalls:
+        checks.append(scattering_on_left_sidewall)
+    if cf.include_top_sidewall:
+        checks.append(scattering_on_top_sidewall)
+    if cf.include_bottom_sidewall:
+        checks.append(scattering_on_bottom_sidewall)
+
+    # Scattering on holes, pillars, and interfaces:
+    if cf.holes:
+        checks.append(build_holes_scattering(hole_index))
+    if cf.pillars:
+        checks.append(pillars_scattering)
+    if cf.interfaces:
+        checks.append(interfaces_scattering)
+    return checks
+
+
+def build_hot_side_checks():
+    """List of re-thermalization checks on the hot sides that are set in the config"""
+    checks = []
+    if cf.hot_side_position_bottom:
+        checks.append(rethermalization_on_bottom_side)
+    if cf.hot_side_position_top:
+        checks.append(rethermalization_on_top_side)
+    if cf.hot_side_position_right:
+        checks.append(rethermalization_on_right_side)
+    if cf.hot_side_position_left:
+        checks.append(rethermalization_on_left_side)
+    return checks
+
+
+def build_scattering(hole_index):
+    """Build a function that checks for all scattering processes enabled in the config on one step"""
+    include_internal_scattering = cf.include_internal_scattering
+    periodic_sidewalls = cf.periodic_sidewalls
+    surface_checks = build_surface_checks(hole_index)
+    hot_side_checks = build_hot_side_checks()
+    move_phonon = move_in_plane if cf.is_two_dimensional_material else move
+
+    def scattering(ph, flight, scattering_types):
+        """Check if different scattering events happened during current time step"""
+        if include_internal_scattering:
+            internal_scattering(ph, flight, scattering_types)
+
+        # Preliminary move to see if phonon would cross something:
+        x, y, z = move_phonon(ph, cf.timestep)
+        if periodic_sidewalls:
+            x = crossing_periodic_sidewalls(ph, flight, x)
+        for check in surface_checks:
+            check(ph, scattering_types, x, y, z)
+
+        # Correct angle if it became more than 180 degrees:
+        ph.correct_angle()
+
+        # Re-thermalize phonon if it would come back to one of the hot sides:
+        if hot_side_checks:
+            x, y, _ = move_phonon(ph, cf.timestep)
+            for check in hot_side_checks:
+                check(ph, scattering_types, x, y)
+
+    return scattering
@@ -1,10 +1,9 @@
 """Module that provides scattering functions on basic objects like various walls"""
 
-from math import pi, cos, sin, tan, exp, sqrt, atan, asin, acos
+from math import pi, cos, sin, tan, exp, sqrt, atan, atan2, asin, acos
 from random import random
 from numpy import sign
 
-from freepaths.move import move
 from freepaths.scattering_types import Scattering
 
 
@@ -13,14 +12,68 @@ def specularity(angle, roughness, wavelength):
     return exp(-16 * pi**2 * roughness**2 * ((cos(angle))**2) / wavelength**2)
 
 
-def no_new_scattering(ph, cf):
+def uniform_in_ranges(ranges):
+    """Draw a random number uniformly distributed over the union of non-overlapping ranges"""
+    target = random() * sum(end - start for start, end in ranges)
+    for start, end in ranges:
+        if target <= end - start:
+            return start + target
+        target -= end - start
+    return ranges[-1][1]
+
+
+def in_plane_lambert_ranges(ph, normal_theta, step_length, cf):
+    """
+    Ranges of the random number u, for which the in-plane Lambert angle asin(2u - 1) around the normal
+    keeps the phonon inside the structure box after the next step. The step is taken in plane,
+    which is the longest in-plane step, so these directions are admissible for any out-of-plane angle.
+    """
+    def is_admissible(angle):
+        theta = normal_theta + angle
+        return (abs(ph.x + step_length * sin(theta)) < cf.width / 2 and
+                0 < ph.y + step_length * cos(theta) < cf.length)
+
+    # Directions in which the step ends exactly at one of the box boundaries:
+    critical_thetas = []
+    for bound in [(- cf.width / 2 - ph.x) / step_length, (cf.width / 2 - ph.x) / step_length]:
+        if abs(bound) <= 1:
+            critical_thetas.extend([asin(bound), pi - asin(bound)])
+    for bound in [- ph.y / step_length, (cf.length - ph.y) / step_length]:
+        if abs(bound) <= 1:
+            critical_thetas.extend([acos(bound), - acos(bound)])
+    critical_angles = [(theta - normal_theta + pi) % (2 * pi) - pi for theta in critical_thetas]
+
+    # Check the intervals between the critical angles and map admissible ones onto u:
+    angles = sorted([-pi/2, pi/2] + [angle for angle in critical_angles if abs(angle) < pi/2])
+    return [((1 + sin(start)) / 2, (1 + sin(end)) / 2) for start, end in zip(angles[:-1], angles[1:])
+            if end > start and is_admissible((start + end) / 2)]
+
+
+def out_of_plane_lambert_range(ph, step_length, cf):
+    """Range of the random number v, for which the angle asin(asin(2v - 1)/(pi/2)) keeps the phonon between top and bottom"""
+    if cf.is_two_dimensional_material:
+        return 0.0, 1.0
+    lower_bound = max(-1.0, min(1.0, (- cf.thickness / 2 - ph.z) / step_length))
+    upper_bound = max(-1.0, min(1.0, (cf.thickness / 2 - ph.z) / step_length))
+    return (1 + sin(pi/2 * lower_bound)) / 2, (1 + sin(pi/2 * upper_bound)) / 2
+
+
+def lambert_scattering(ph, normal_theta, cf):
     """
-    Check if new angles do not immediately lead to a new top/bottom or sidewall scattering event.
-    Such additional scatering event may cause troubles because at this stage we already checked the domain boundaries.
-    Thus, this check is necessary to prevent phonons leaving the structure boundaries.
+    Diffuse scattering with Lambert cosine distribution around the normal with in-plane angle normal_theta.
+    The distribution is truncated to directions which do not immediately lead to a new top/bottom or sidewall scattering,
+    so no new attempts are needed. If no such direction exists, the phonon is sent along the normal.
     """
-    x, y, z = move(ph, cf.timestep)
-    return abs(z) < cf.thickness / 2 and abs(x) < cf.width / 2 and cf.length > y > 0
+    step_length = ph.speed * cf.timestep
+    in_plane_ranges = in_plane_lambert_ranges(ph, normal_theta, step_length, cf)
+    v_start, v_end = out_of_plane_lambert_range(ph, step_length, cf)
+    if not in_plane_ranges or v_end <= v_start:
+        ph.theta = normal_theta
+        ph.phi = 0.0
+        return Scattering.DIFFUSE
+    ph.theta = normal_theta + asin(2 * uniform_in_ranges(in_plane_ranges) - 1)
+    ph.phi = asin((asin(2 * (v_start + random() * (v_end - v_start)) - 1)) / (pi / 2))
+    return Scattering.DIFFUSE
 
 
 def random_scattering(ph):
@@ -42,16 +95,8 @@ def vertical_surface_left_scattering(ph, roughness, cf, is_diffuse=False):
         ph.theta = - ph.theta
         return Scattering.SPECULAR
 
-    # Diffuse scattering:
-    for attempt in range(10):
-
-        # Lambert cosine distribution:
-        ph.theta = -pi/2 + asin(2*random() - 1)
-        ph.phi = asin((asin(2*random() - 1))/(pi/2))
-
-        # Accept the angles if they do not cause new scattering:
-        if no_new_scattering(ph, cf):
-            return Scattering.DIFFUSE
+    # Diffuse scattering with Lambert cosine distribution:
+    return lambert_scattering(ph, -pi/2, cf)
 
 
 def vertical_surface_right_scattering(ph, roughness, cf, is_diffuse=False):
@@ -66,16 +111,8 @@ def vertical_surface_right_scattering(ph, roughness, cf, is_diffuse=False):
         ph.theta = - ph.theta
         return Scattering.SPECULAR
 
-    # Diffuse scattering:
-    for attempt in range(10):
-
-        # Lambert cosine distribution:
-        ph.theta = +pi/2 + asin(2*random() - 1)
-        ph.phi = asin((asin(2*random() - 1))/(pi/2))
-
-        # Accept the angles if they do not cause new scattering:
-        if no_new_scattering(ph, cf):
-            return Scattering.DIFFUSE
+    # Diffuse scattering with Lambert cosine distribution:
+    return lambert_scattering(ph, +pi/2, cf)
 
 
 def horizontal_surface_down_scattering(ph, roughness, is_diffuse=False):
@@ -190,20 +227,55 @@ def circle_outer_scattering(ph, tangent_theta, y, y0, roughness, cf):
         ph.theta = - ph.theta - pi + 2*tangent_theta
         return Scattering.SPECULAR
 
-    # Diffuse scattering:
-    for attempt in range(10):
+    # Diffuse scattering with Lambert cosine distribution:
+    return lambert_scattering(ph, tangent_theta - pi*(y < y0), cf)
 
-        # Random distribution:
-        # theta = tangent_theta - (-pi/2 + pi*random()) - pi*(y < y0)
-        # phi = asin(2*random() - 1)
 
-        # Lambert cosine distribution:
-        ph.theta = tangent_theta - (asin(2*random() - 1)) - pi*(y < y0)
-        ph.phi = asin((asin(2*random() - 1))/(pi/2))
+def normal_scattering(ph, normal_theta, roughness, cf):
+    """Scattering from a surface with the in-plane normal at angle normal_theta pointing from the surface to the phonon"""
+
+    # Calculate angle to the surface and specular scattering probability:
+    a = acos(cos(ph.phi)*cos(ph.theta - normal_theta))
+    p = specularity(a, roughness, ph.wavelength)
 
-        # Accept the angles only if they do not immediately cause new scattering:
-        if no_new_scattering(ph, cf):
-            return Scattering.DIFFUSE
+    # Specular scattering:
+    if random() < p:
+        ph.theta = - ph.theta - pi + 2*normal_theta
+        return Scattering.SPECULAR
+
+    # Diffuse scattering with Lambert cosine distribution:
+    return lambert_scattering(ph, normal_theta, cf)
+
+
+def normal_3d_scattering(ph, normal, roughness):
+    """Scattering from a surface with the unit normal vector (n_x, n_y, n_z) pointing from the surface to the phonon"""
+    n_x, n_y, n_z = normal
+    d_x, d_y, d_z = ph.direction
+
+    # Calculate angle to the surface and specular scattering probability:
+    cos_a = d_x*n_x + d_y*n_y + d_z*n_z
+    p = specularity(acos(max(-1.0, min(1.0, cos_a))), roughness, ph.wavelength)
+
+    # Specular scattering:
+    if random() < p:
+        d_x, d_y, d_z = d_x - 2*cos_a*n_x, d_y - 2*cos_a*n_y, d_z - 2*cos_a*n_z
+        ph.theta = atan2(d_x, d_y)
+        ph.phi = asin(max(-1.0, min(1.0, d_z)))
+        return Scattering.SPECULAR
+
+    # Diffuse scattering with Lambert cosine distribution around the normal in its local basis:
+    t_x, t_y, t_z = (0.0, -n_z, n_y) if abs(n_x) < 0.9 else (n_z, 0.0, -n_x)
+    t_norm = sqrt(t_x**2 + t_y**2 + t_z**2)
+    t_x, t_y, t_z = t_x / t_norm, t_y / t_norm, t_z / t_norm
+    b_x, b_y, b_z = n_y*t_z - n_z*t_y, n_z*t_x - n_x*t_z, n_x*t_y - n_y*t_x
+    sin_angle = sqrt(random())
+    azimuth = 2*pi*random()
+    cos_angle = sqrt(1 - sin_angle**2)
+    a, b = sin_angle*cos(azimuth), sin_angle*sin(azimuth)
+    d_x, d_y, d_z = a*t_x + b*b_x + cos_angle*n_x, a*t_y + b*b_y + cos_angle*n_y, a*t_z + b*b_z + cos_angle*n_z
+    ph.theta = atan2(d_x, d_y)
+    ph.phi = asin(max(-1.0, min(1.0, d_z)))
+    return Scattering.DIFFUSE
 
 
 def circle_inner_scattering(ph, tangent_theta, y, y0, roughness):
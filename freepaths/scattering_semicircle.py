@@ -32,16 +32,8 @@ def scattering_on_semicircular_holes(ph, x0, y0, R, scattering_types, x, y, z, c
             # Diffuse scattering:
             else:
                 scattering_types.holes = Scattering.DIFFUSE
-                attempt = 0
-                while attempt < 10:
-                    attempt += 1
-                    # Lambert cosine distribution:
-                    ph.theta = -sign(sin(ph.theta)) * pi / 2 + asin(2 * random() - 1)
-                    ph.phi = asin((asin(2 * random() - 1)) / (pi / 2))
-
-                    # Accept the angles only if they do not lead to new scattering:
-                    if no_new_scattering(ph, cf):
-                        break
+                # Lambert cosine distribution:
+                lambert_scattering(ph, -sign(sin(ph.theta)) * pi / 2, cf)
         else:
             # Calculate angle to the surface and specular scattering probability:
             if y == y0:
@@ -58,21 +50,8 @@ def scattering_on_semicircular_holes(ph, x0, y0, R, scattering_types, x, y, z, c
             # Diffuse scattering:
             else:
                 scattering_types.holes = Scattering.DIFFUSE
-                attempt = 0
-                while attempt < 10:
-                    attempt += 1
-
-                    # Random distribution:
-                    # theta = tangent_theta - (-pi/2 + pi*random()) - pi*(y < y0)
-                    # phi = asin(2*random() - 1)
-
-                    # Lambert cosine distribution:
-                    ph.theta = tangent_theta - (asin(2 * random() - 1)) - pi * (y < y0)
-                    ph.phi = asin((asin(2 * random() - 1)) / (pi / 2))
-
-                    # Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph, cf):
-                        break
+                # Lambert cosine distribution:
+                lambert_scattering(ph, tangent_theta - pi * (y < y0), cf)
 
 
 def scattering_on_arccircular_v_holes(
@@ -166,20 +145,8 @@ def scattering_on_arccircular_v_holes(
                 scattering_types.holes = Scattering.SPECULAR
             else:
                 scattering_types.holes = Scattering.DIFFUSE
-                attempt = 0
-                while attempt < 10:
-                    attempt += 1
-
-                    # Random distribution:
-                    # theta = tangent_theta - (-pi/2 + pi*random()) - pi*(y < y0)
-                    # phi = asin(2*random() - 1)
-                    # #Lambert cosine distribution:
-                    ph.theta = tangent_theta - (asin(2 * random() - 1)) - pi * (y < y0)
-                    ph.phi = asin((asin(2 * random() - 1)) / (pi / 2))
-
-                    # Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph, cf):
-                        break
+                # Lambert cosine distribution:
+                lambert_scattering(ph, tangent_theta - pi * (y < y0), cf)
 
         if continu == 0:
             tangent_theta = atan((x - x0) / (y - y0))
@@ -329,20 +296,8 @@ def scattering_on_arccircular_v_demi_down_holes(
                 scattering_types.holes = Scattering.SPECULAR
             else:
                 scattering_types.holes = Scattering.DIFFUSE
-                attempt = 0
-                while attempt < 10:
-                    attempt += 1
-
-                    # Random distribution:
-                    # theta = tangent_theta - (-pi/2 + pi*random()) - pi*(y < y0)
-                    # phi = asin(2*random() - 1)
-                    # #Lambert cosine distribution:
-                    ph.theta = tangent_theta - (asin(2 * random() - 1)) - pi * (y < y0)
-                    ph.phi = asin((asin(2 * random() - 1)) / (pi / 2))
-
-                    # Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph, cf):
-                        break
+                # Lambert cosine distribution:
+                lambert_scattering(ph, tangent_theta - pi * (y < y0), cf)
 
         if continu == 0:
             tangent_theta = atan((x - x0) / (y - y0))
@@ -485,20 +440,8 @@ def scattering_on_arccircular_v_demi_up_holes(
                 scattering_types.holes = Scattering.SPECULAR
             else:
                 scattering_types.holes = Scattering.DIFFUSE
-                attempt = 0
-                while attempt < 10:
-                    attempt += 1
-
-                    # Random distribution:
-                    # theta = tangent_theta - (-pi/2 + pi*random()) - pi*(y < y0)
-                    # phi = asin(2*random() - 1)
-                    # #Lambert cosine distribution:
-                    ph.theta = tangent_theta - (asin(2 * random() - 1)) - pi * (y < y0)
-                    ph.phi = asin((asin(2 * random() - 1)) / (pi / 2))
-
-                    # Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph, cf):
-                        break
+                # Lambert cosine distribution:
+                lambert_scattering(ph, tangent_theta - pi * (y < y0), cf)
 
         if continu == 0:
             tangent_theta = atan((x - x0) / (y - y0))
@@ -637,20 +580,8 @@ def scattering_on_arccircular_h_holes(
                 scattering_types.holes = Scattering.SPECULAR
             else:
                 scattering_types.holes = Scattering.DIFFUSE
-                attempt = 0
-                while attempt < 10:
-                    attempt += 1
-
-                    # Random distribution:
-                    # theta = tangent_theta - (-pi/2 + pi*random()) - pi*(y < y0)
-                    # phi = asin(2*random() - 1)
-                    # #Lambert cosine distribution:
-                    ph.theta = tangent_theta - (asin(2 * random() - 1)) - pi * (y < y0)
-                    ph.phi = asin((asin(2 * random() - 1)) / (pi / 2))
-
-                    # Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph, cf):
-                        break
+                # Lambert cosine distribution:
+                lambert_scattering(ph, tangent_theta - pi * (y < y0), cf)
 
         if continu == 0:
             tangent_theta = atan((x - x0) / (y - y0))
@@ -789,20 +720,8 @@ def scattering_on_arccircular_h_reverse_holes(
                 scattering_types.holes = Scattering.SPECULAR
             else:
                 scattering_types.holes = Scattering.DIFFUSE
-                attempt = 0
-                while attempt < 10:
-                    attempt += 1
-
-                    # Random distribution:
-                    # theta = tangent_theta - (-pi/2 + pi*random()) - pi*(y < y0)
-                    # phi = asin(2*random() - 1)
-                    # #Lambert cosine distribution:
-                    ph.theta = tangent_theta - (asin(2 * random() - 1)) - pi * (y < y0)
-                    ph.phi = asin((asin(2 * random() - 1)) / (pi / 2))
-
-                    # Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph, cf):
-                        break
+                # Lambert cosine distribution:
+                lambert_scattering(ph, tangent_theta - pi * (y < y0), cf)
 
         if continu == 0:
             tangent_theta = atan((x - x0) / (y - y0))
@@ -2,95 +2,130 @@
 Module that provides types of phonon scattering that might occur.
 These scattering types are returned on each step
 so that higher level modules know what has happened.
+Scattering events of one step are stored as bits of a single integer,
+with two bits (diffuse and specular) per surface, so that the bit index is also the code of the event.
 """
 
 import enum
 
 
-class Scattering(enum.Enum):
+class Scattering(enum.IntEnum):
     """Possible scattering types"""
     DIFFUSE = 1
     SPECULAR = 2
 
 
+class Surface(enum.IntEnum):
+    """Surfaces and processes on which phonons scatter"""
+    WALLS = 0
+    TOP_BOTTOM = 1
+    HOLES = 2
+    PILLARS = 3
+    INTERFACES = 4
+    HOT_SIDE = 5
+    INTERNAL = 6
+
+
+class Place(enum.IntEnum):
+    """Places of scattering on a triangle"""
+    RIGHT_WALL = 0
+    LEFT_WALL = 1
+    FLOOR = 2
+
+
+def event_code(surface, scattering):
+    """Code of the scattering event, which is also its bit in the mask of events"""
+    return 2 * surface + scattering - 1
+
+
+NUMBER_OF_CODES = 2 * len(Surface)
+NUMBER_OF_PLACE_CODES = 2 * len(Place)
+DIFFUSE_MASK = sum(1 << event_code(surface, Scattering.DIFFUSE) for surface in Surface if surface != Surface.INTERNAL)
+INTERNAL_MASK = 3 << event_code(Surface.INTERNAL, Scattering.DIFFUSE)
+HOLE_DIFFUSE_MASK = 1 << event_code(Surface.HOLES, Scattering.DIFFUSE)
+HOLE_SPECULAR_MASK = 1 << event_code(Surface.HOLES, Scattering.SPECULAR)
+
+
+class Event:
+    """Scattering type on one surface, which is stored as two bits of the mask of events"""
+
+    def __init__(self, surface):
+        """Remember the position of the bits of this surface"""
+        self.shift = 2 * surface
+
+    def __get__(self, instance, owner=None):
+        """Return the scattering type on this surface or None if there was no scattering"""
+        bits = (instance.events >> self.shift) & 3
+        return Scattering(bits) if bits else None
+
+    def __set__(self, instance, scattering):
+        """Record the scattering type on this surface"""
+        instance.events &= ~(3 << self.shift)
+        if scattering:
+            instance.events |= scattering << self.shift
+
+
 class ScatteringTypes:
     """Phonon scattering types"""
 
+    holes = Event(Surface.HOLES)
+    pillars = Event(Surface.PILLARS)
+    top_bottom = Event(Surface.TOP_BOTTOM)
+    walls = Event(Surface.WALLS)
+    internal = Event(Surface.INTERNAL)
+    hot_side = Event(Surface.HOT_SIDE)
+    interfaces = Event(Surface.INTERFACES)
+
     def __init__(self):
-        """Initialize possible scattering type"""
-        self.holes = None
-        self.pillars = None
-        self.top_bottom = None
-        self.walls = None
-        self.internal = None
-        self.hot_side = None
-        self.interfaces = None
+        """Initialize the mask of scattering events"""
+        self.events = 0
 
     @property
     def is_diffuse(self):
         """Is any of the scattering types diffuse?"""
-        return any([self.holes == Scattering.DIFFUSE,
-                    self.pillars == Scattering.DIFFUSE,
-                    self.top_bottom == Scattering.DIFFUSE,
-                    self.walls == Scattering.DIFFUSE,
-                    self.hot_side == Scattering.DIFFUSE,
-                    self.interfaces == Scattering.DIFFUSE])
+        return self.events & DIFFUSE_MASK != 0
 
     @property
     def is_internal(self):
         """Is the scattering type internal?"""
-        return self.internal is not None
+        return self.events & INTERNAL_MASK != 0
 
     @property
     def is_diffuse_on_hole(self):
         """Was there a diffuse scattering on holes?"""
-        return self.holes == Scattering.DIFFUSE
+        return self.events & HOLE_DIFFUSE_MASK != 0
 
     @property
     def is_specular_on_hole(self):
         """Was there a specular scattering on holes?"""
-        return self.holes == Scattering.SPECULAR
+        return self.events & HOLE_SPECULAR_MASK != 0
 
     @property
     def is_scattered(self):
         """Has any of the scattering events occurred?"""
-        return any([self.holes,
-                    self.pillars,
-                    self.top_bottom,
-                    self.walls,
-                    self.internal,
-                    self.hot_side,
-                    self.interfaces])
+        return self.events != 0
 
     def reset(self):
-        """Reset all scattering types to None"""
-        self.holes = None
-        self.pillars = None
-        self.top_bottom = None
-        self.walls = None
-        self.internal = None
-        self.hot_side = None
-        self.interfaces = None
+        """Reset all scattering types"""
+        self.events = 0
 
 
 class ScatteringPlaces:
     """Phonon scattering places on a triangle"""
 
+    right_wall = Event(Place.RIGHT_WALL)
+    left_wall = Event(Place.LEFT_WALL)
+    floor = Event(Place.FLOOR)
+
     def __init__(self):
-        """Initialize possible scattering places"""
-        self.right_wall = None
-        self.left_wall = None
-        self.floor = None
+        """Initialize the mask of scattering events"""
+        self.events = 0
 
     @property
     def is_scattered(self):
         """Has any of the scattering events occurred?"""
-        return any([self.right_wall,
-                    self.left_wall,
-                    self.floor])
+        return self.events != 0
 
     def reset(self):
-        """Reset all scattering places to None"""
-        self.right_wall = None
-        self.left_wall = None
-        self.floor = None
+        """Reset all scattering places"""
+        self.events = 0
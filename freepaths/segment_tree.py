@@ -0,0 +1,170 @@
+"""
+Module that provides a tree of line segments for shapes defined by a thick line through points or by a polygon.
+A thick line is a union of capsules, i.e. of the areas within a given distance from each segment,
+so the distance to the shape and its normal are calculated analytically from the nearest segment.
+A polygon is defined by its edges, which are checked for crossings with the path of a phonon.
+Segments are grouped into a tree of bounding boxes, so that only a few segments near a phonon are checked.
+"""
+
+from math import sqrt, atan2, inf
+import numpy as np
+
+SEGMENTS_PER_LEAF = 4            # Maximal number of segments in the leaves of the tree
+SIMPLIFICATION_TOLERANCE = 0.01  # Maximal deviation of the simplified line from the points as a fraction of the thickness
+JOINING_DISTANCE = 0.2           # Maximal distance between neighbouring points joined into a line as a fraction of the thickness
+
+
+def simplify_polyline(points, tolerance):
+    """Remove the points which deviate from the simplified line by less than the tolerance (Ramer-Douglas-Peucker)"""
+    is_kept = np.zeros(len(points), dtype=bool)
+    is_kept[[0, -1]] = True
+    ranges = [(0, len(points) - 1)]
+    while ranges:
+        start, end = ranges.pop()
+        if end - start < 2:
+            continue
+        direction = points[end] - points[start]
+        length = np.hypot(*direction)
+        relative = points[start + 1:end] - points[start]
+        if length > 0:
+            deviations = np.abs(direction[0] * relative[:, 1] - direction[1] * relative[:, 0]) / length
+        else:
+            deviations = np.hypot(relative[:, 0], relative[:, 1])
+        index = int(np.argmax(deviations))
+        if deviations[index] > tolerance:
+            middle = start + 1 + index
+            is_kept[middle] = True
+            ranges.extend([(start, middle), (middle, end)])
+    return points[is_kept]
+
+
+def polyline_segments(points, thickness):
+    """
+    Convert points into segments of lines which the circles of given thickness around the points form.
+    Only closely spaced points are connected, so that between them the line is wider than the circles by at most 1%
+    of the thickness. Other points remain separate circles, which are segments of zero length.
+    """
+    gaps = np.hypot(*np.diff(points, axis=0).T)
+    breaks = np.flatnonzero(gaps > JOINING_DISTANCE * thickness) + 1
+    segments = []
+    for chain in np.split(points, breaks):
+        chain = simplify_polyline(chain, SIMPLIFICATION_TOLERANCE * thickness)
+        if len(chain) == 1:
+            segments.append((chain[0], chain[0]))
+        segments.extend(zip(chain[:-1], chain[1:]))
+    return np.array(segments, dtype=float).reshape(-1, 4)
+
+
+class SegmentTree:
+    """Tree of bounding boxes of segments, which finds the nearest segment within a given distance from a point"""
+
+    def __init__(self, segments, margin):
+        """Build the tree from the array of segments (x1, y1, x2, y2)"""
+        self.segments = segments
+        self.margin = margin
+        self.starts = segments[:, :2]
+        self.vectors = segments[:, 2:] - segments[:, :2]
+        lengths_squared = np.sum(self.vectors**2, axis=1)
+        self.inverse_lengths_squared = np.divide(1, lengths_squared, out=np.zeros_like(lengths_squared), where=lengths_squared > 0)
+        self.segment_list = [(x1, y1, x2 - x1, y2 - y1, inverse) for (x1, y1, x2, y2), inverse
+                             in zip(segments.tolist(), self.inverse_lengths_squared.tolist())]
+        self.segment_ends = segments.tolist()
+        self.root = self.build_node(np.arange(len(segments)))
+
+    def build_node(self, indexes):
+        """Build a node with the bounding box of the segments, expanded by the margin, and split them in two halves"""
+        x = self.segments[indexes][:, [0, 2]]
+        y = self.segments[indexes][:, [1, 3]]
+        box = (x.min() - self.margin, x.max() + self.margin, y.min() - self.margin, y.max() + self.margin)
+        if len(indexes) <= SEGMENTS_PER_LEAF:
+            return box, indexes.tolist(), None
+        centers = np.column_stack((x.mean(axis=1), y.mean(axis=1)))
+        axis = int(np.ptp(centers[:, 1]) > np.ptp(centers[:, 0]))
+        indexes = indexes[np.argsort(centers[:, axis])]
+        half = len(indexes) // 2
+        return box, None, (self.build_node(indexes[:half]), self.build_node(indexes[half:]))
+
+    def distance(self, x, y, index):
+        """Distance from a point to a segment and the in-plane angle of the normal from the segment to the point"""
+        x1, y1, d_x, d_y, inverse_length_squared = self.segment_list[index]
+        t = min(max(((x - x1) * d_x + (y - y1) * d_y) * inverse_length_squared, 0.0), 1.0)
+        normal_x = x - x1 - t * d_x
+        normal_y = y - y1 - t * d_y
+        return sqrt(normal_x**2 + normal_y**2), atan2(normal_x, normal_y)
+
+    def nearest(self, x, y):
+        """Return the distance to the nearest segment within the margin and its index, or infinity and None"""
+        nearest_distance, nearest_index = inf, None
+        nodes = [self.root]
+        while nodes:
+            (x_min, x_max, y_min, y_max), indexes, children = nodes.pop()
+            if not (x_min <= x <= x_max and y_min <= y <= y_max):
+                continue
+            if children:
+                nodes.extend(children)
+                continue
+            for index in indexes:
+                distance, _ = self.distance(x, y, index)
+                if distance < nearest_distance:
+                    nearest_distance, nearest_index = distance, index
+        if nearest_distance > self.margin:
+            return inf, None
+        return nearest_distance, nearest_index
+
+    def distances_array(self, x, y):
+        """Distances from arrays of points to the nearest segments"""
+        distances = np.full(np.shape(x), inf)
+        for (x1, y1), (d_x, d_y), inverse_length_squared in zip(self.starts, self.vectors, self.inverse_lengths_squared):
+            t = np.clip(((x - x1) * d_x + (y - y1) * d_y) * inverse_length_squared, 0.0, 1.0)
+            np.minimum(distances, np.hypot(x - x1 - t * d_x, y - y1 - t * d_y), out=distances)
+        return distances
+
+    def first_crossing(self, x1, y1, x2, y2):
+        """Return the index of the first segment crossed by the path from (x1, y1) to (x2, y2), or None"""
+        path_x, path_y = x2 - x1, y2 - y1
+        path_x_min, path_x_max = min(x1, x2), max(x1, x2)
+        path_y_min, path_y_max = min(y1, y2), max(y1, y2)
+        first_t, first_index = inf, None
+        nodes = [self.root]
+        while nodes:
+            (x_min, x_max, y_min, y_max), indexes, children = nodes.pop()
+            if x_max < path_x_min or x_min > path_x_max or y_max < path_y_min or y_min > path_y_max:
+                continue
+            if children:
+                nodes.extend(children)
+                continue
+            for index in indexes:
+                segment_x, segment_y, d_x, d_y, _ = self.segment_list[index]
+                denominator = path_x * d_y - path_y * d_x
+                if denominator == 0:
+                    continue
+                t = ((segment_x - x1) * d_y - (segment_y - y1) * d_x) / denominator
+                u = ((segment_x - x1) * path_y - (segment_y - y1) * path_x) / denominator
+                if 0 <= t <= 1 and 0 <= u <= 1 and t < first_t:
+                    first_t, first_index = t, index
+        return first_index
+
+    def count_ray_crossings(self, x, y):
+        """Number of segments crossed by the ray from a point along the x axis, counting the ends of segments once"""
+        count = 0
+        nodes = [self.root]
+        while nodes:
+            (x_min, x_max, y_min, y_max), indexes, children = nodes.pop()
+            if x_max < x or not y_min <= y <= y_max:
+                continue
+            if children:
+                nodes.extend(children)
+                continue
+            for index in indexes:
+                x1, y1, x2, y2 = self.segment_ends[index]
+                if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                    count += 1
+        return count
+
+    def count_ray_crossings_array(self, x, y):
+        """Numbers of segments crossed by the rays from arrays of points along the x axis"""
+        counts = np.zeros(np.shape(x), dtype=int)
+        for x1, y1, x2, y2 in self.segment_ends:
+            if y1 != y2:
+                counts += ((y1 > y) != (y2 > y)) & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+        return counts
@@ -1,9 +1,18 @@
-"""Module provides the phonon source object"""
+"""
+Module provides the phonon source object.
+The area of the source is rasterized once into cells, and the cells fully covered by holes are excluded.
+Coordinates are then drawn uniformly from the remaining cells,
+and only points in the cells that overlap with holes are checked against those holes.
+"""
 
 import enum
 
 from random import random
 from math import pi, asin
+import numpy as np
+
+SOURCE_RASTER_SIZE = 64     # Number of cells along each side of the source
+CELL_SUPERSAMPLING = 4      # Number of points along each side of a cell to check if it is covered by holes
 
 
 class Distributions(enum.Enum):
@@ -14,6 +23,11 @@ class Distributions(enum.Enum):
     UNIFORM = 4
 
 
+def sources_are_lambertian(sources):
+    """Check if all phonon sources emit phonons with the Lambert distribution, like a hot reservoir"""
+    return all(source.angle_distribution == Distributions.LAMBERT for source in sources)
+
+
 class Source:
     """Phonon source as rectangular are where phonons are initiated"""
     def __init__(self, x=0, y=0, z=0, size_x=0, size_y=0, size_z=0, angle_distribution="random_up", angle=0):
@@ -25,13 +39,65 @@ class Source:
         self.size_z = size_z
         self.angle_distribution = angle_distribution
         self.angle = angle
+        self.assign_free_area([], None)
 
-    def generate_coordinates(self):
-        """Generate coordinates of the phonon inside the source"""
-        phonon_x = self.x + 0.49 * self.size_x * (2 * random() - 1)
-        phonon_y = self.y + 0.49 * self.size_y * (2 * random() - 1)
-        phonon_z = self.z + 0.49 * self.size_z * (2 * random() - 1)
-        return phonon_x, phonon_y, phonon_z
+    def assign_free_area(self, holes, cf):
+        """Rasterize the source into cells, exclude the cells covered by holes, and return if any free area is left"""
+        self.number_of_cells_x = SOURCE_RASTER_SIZE if self.size_x else 1
+        self.number_of_cells_y = SOURCE_RASTER_SIZE if self.size_y else 1
+        self.x_edges = self.x + 0.49 * self.size_x * np.linspace(-1, 1, self.number_of_cells_x + 1)
+        self.y_edges = self.y + 0.49 * self.size_y * np.linspace(-1, 1, self.number_of_cells_y + 1)
+        self.cell_size_x = 0.98 * self.size_x / self.number_of_cells_x
+        self.cell_size_y = 0.98 * self.size_y / self.number_of_cells_y
+
+        # Points inside each cell, one point per cell if the source has no size along this axis:
+        supersampling_x = CELL_SUPERSAMPLING if self.size_x else 1
+        supersampling_y = CELL_SUPERSAMPLING if self.size_y else 1
+        x = self.x_edges[0] + self.cell_size_x / supersampling_x * (np.arange(self.number_of_cells_x * supersampling_x) + 0.5)
+        y = self.y_edges[0] + self.cell_size_y / supersampling_y * (np.arange(self.number_of_cells_y * supersampling_y) + 0.5)
+
+        # Find the cells that overlap with each hole and the points covered by holes:
+        is_covered = np.zeros((len(y), len(x)), dtype=bool)
+        self.hole_cells = []
+        for hole in holes:
+            bounding_box = hole.get_bounding_box(cf)
+            if bounding_box is None:
+                column_start, column_end, row_start, row_end = 0, self.number_of_cells_x, 0, self.number_of_cells_y
+            else:
+                x_min, x_max, y_min, y_max = bounding_box
+                column_start = max(np.searchsorted(self.x_edges, x_min, side='right') - 1, 0)
+                column_end = min(np.searchsorted(self.x_edges, x_max), self.number_of_cells_x)
+                row_start = max(np.searchsorted(self.y_edges, y_min, side='right') - 1, 0)
+                row_end = min(np.searchsorted(self.y_edges, y_max), self.number_of_cells_y)
+            if column_start < column_end and row_start < row_end:
+                self.hole_cells.append((hole, column_start, column_end, row_start, row_end))
+                points_x = slice(column_start * supersampling_x, column_end * supersampling_x)
+                points_y = slice(row_start * supersampling_y, row_end * supersampling_y)
+                x_grid, y_grid = np.meshgrid(x[points_x], y[points_y])
+                is_covered[points_y, points_x] |= hole.is_inside_array(x_grid, y_grid, cf)
+
+        # Cells where all points are covered by holes are excluded, and cells that overlap with holes need checks:
+        is_covered = is_covered.reshape(self.number_of_cells_y, supersampling_y, self.number_of_cells_x, supersampling_x)
+        self.free_cells = np.flatnonzero(~np.all(is_covered, axis=(1, 3)))
+        self.is_partial_cell = np.zeros(self.number_of_cells_x * self.number_of_cells_y, dtype=bool)
+        self.cell_holes = {}
+        for hole, column_start, column_end, row_start, row_end in self.hole_cells:
+            rows, columns = np.mgrid[row_start:row_end, column_start:column_end]
+            for cell in (rows * self.number_of_cells_x + columns).ravel().tolist():
+                self.cell_holes.setdefault(cell, []).append(hole)
+                self.is_partial_cell[cell] = True
+        return len(self.free_cells) > 0
+
+    def generate_coordinates(self, cf):
+        """Generate coordinates of the phonon inside the source but outside of the holes"""
+        while True:
+            cell = int(self.free_cells[int(random() * len(self.free_cells))])
+            row, column = divmod(cell, self.number_of_cells_x)
+            phonon_x = self.x_edges[column] + self.cell_size_x * random()
+            phonon_y = self.y_edges[row] + self.cell_size_y * random()
+            phonon_z = self.z + 0.49 * self.size_z * (2 * random() - 1)
+            if not any(hole.is_inside(phonon_x, phonon_y, None, cf) for hole in self.cell_holes.get(cell, [])):
+                return float(phonon_x), float(phonon_y), phonon_z
 
     def generate_angles(self):
         """Generate angles of the phonon inside the source"""
@@ -51,3 +117,47 @@ class Source:
             raise ValueError("Invalid distribution type")
 
         return theta, phi
+
+    def generate_coordinates_array(self, rng, number, cf):
+        """Generate arrays of coordinates of many phonons inside the source but outside of the holes"""
+        phonon_x, phonon_y = np.zeros((2, number))
+        phonon_z = self.z + 0.49 * self.size_z * (2 * rng.random(number) - 1)
+        is_pending = np.ones(number, dtype=bool)
+        while np.any(is_pending):
+            number_pending = np.count_nonzero(is_pending)
+            cells = rng.choice(self.free_cells, number_pending)
+            rows, columns = np.divmod(cells, self.number_of_cells_x)
+            x = self.x_edges[columns] + self.cell_size_x * rng.random(number_pending)
+            y = self.y_edges[rows] + self.cell_size_y * rng.random(number_pending)
+
+            # Only points in the cells overlapping with a hole are checked against this hole:
+            is_in_hole = np.zeros(number_pending, dtype=bool)
+            if np.any(self.is_partial_cell[cells]):
+                for hole, column_start, column_end, row_start, row_end in self.hole_cells:
+                    is_near_hole = ((columns >= column_start) & (columns < column_end) &
+                                    (rows >= row_start) & (rows < row_end) & ~is_in_hole)
+                    if np.any(is_near_hole):
+                        is_in_hole[is_near_hole] = hole.is_inside_array(x[is_near_hole], y[is_near_hole], cf)
+
+            phonon_x[is_pending], phonon_y[is_pending] = x, y
+            is_pending[is_pending] = is_in_hole
+        return phonon_x, phonon_y, phonon_z
+
+    def generate_angles_array(self, rng, number):
+        """Generate arrays of angles of many phonons inside the source"""
+        if self.angle_distribution == Distributions.RANDOM:
+            theta = -pi/2 + pi*rng.random(number) + self.angle
+            phi = np.arcsin(2*rng.random(number) - 1)
+        elif self.angle_distribution == Distributions.DIRECTIONAL:
+            theta = np.full(number, self.angle + 1e-10)
+            phi = -pi/2 + pi*rng.random(number)
+        elif self.angle_distribution == Distributions.LAMBERT:
+            theta = np.arcsin(2*rng.random(number) - 1) + self.angle
+            phi = np.arcsin((np.arcsin(2*rng.random(number) - 1))/(pi/2))
+        elif self.angle_distribution == Distributions.UNIFORM:
+            theta = -pi + 2*pi*rng.random(number)
+            phi = np.arcsin(2*rng.random(number) - 1)
+        else:
+            raise ValueError("Invalid distribution type")
+
+        return theta, phi
@@ -0,0 +1,49 @@
+"""
+Module that builds the functions executed on each step of a phonon flight.
+The functions are specialized for the current config once per run, so that scattering processes
+and checks which are disabled in the config are not evaluated on every step.
+Each mode or worker builds the kernel once, after the config is final, and passes it to the tracing functions.
+"""
+
+from freepaths.config import cf
+from freepaths.move import move, move_in_plane
+from freepaths.scattering import build_scattering
+from freepaths.hole_index import HoleIndex
+
+
+def build_cold_side_check():
+    """
+    Build a function that checks if the phonon did not cross any of the cold sides set in the config.
+    Phonons on a side, like those emitted by a source on an absorbing hot side, are still in the system.
+    """
+    checks = []
+    if cf.cold_side_position_top:
+        checks.append(lambda ph: ph.y <= cf.length)
+    if cf.cold_side_position_bottom:
+        checks.append(lambda ph: ph.y >= 0)
+    if cf.cold_side_position_right:
+        checks.append(lambda ph: ph.x <= cf.width / 2.0)
+    if cf.cold_side_position_left:
+        checks.append(lambda ph: ph.x >= - cf.width / 2.0)
+
+    if not checks:
+        return lambda ph: True
+    if len(checks) == 1:
+        return checks[0]
+    return lambda ph: all(check(ph) for check in checks)
+
+
+class StepKernel:
+    """Functions and flags of one step of a phonon flight specialized for the config"""
+
+    def __init__(self):
+        """Build the functions for the current config"""
+        self.is_in_system = build_cold_side_check()
+        self.move = move_in_plane if cf.is_two_dimensional_material else move
+        self.hole_index = HoleIndex(cf.holes + cf.hole_images, cf)
+        self.scattering = build_scattering(self.hole_index)
+        self.output_scattering_map = cf.output_scattering_map
+        self.output_path_animation = cf.output_path_animation
+        self.is_two_dimensional_material = cf.is_two_dimensional_material
+        self.terminate_stuck_phonons = cf.terminate_stuck_phonons
+
@@ -0,0 +1,95 @@
+"""
+Module that calculates the thermal conductivity at many temperatures from a single tracing of phonons.
+Phonons are traced only with boundary scattering, which does not depend on temperature.
+Then, for each temperature, the recorded free paths are combined with internal scattering
+and the thermal conductivity is obtained by integrating the phonon dispersion with the heat capacity at this temperature.
+"""
+
+from math import pi
+from scipy.constants import k, hbar
+import numpy as np
+
+from freepaths.config import cf
+from freepaths.data import Data
+from freepaths.materials import get_material
+from freepaths.mfp_cache import number_of_internal_scatterings
+
+
+def heat_capacity(frequencies, temp):
+    """Heat capacity of phonon modes at given temperature, Ref. PRB 88 155318 (2013)"""
+    part = hbar * 2 * pi * np.asarray(frequencies, dtype=float) / (k * temp)
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        return np.nan_to_num(k * part**2 * np.exp(part) / np.expm1(part)**2)
+
+
+class TemperatureSweep(Data):
+    """Boundary scattering statistics of phonons and the thermal conductivity reweighted to various temperatures"""
+
+    def __init__(self):
+        """Initialize arrays of mode properties and boundary free paths"""
+        self.frequencies = []
+        self.speeds = []
+        self.wavevectors = []
+        self.wavevector_steps = []
+        self.total_free_paths = []
+        self.numbers_of_free_paths = []
+        self.free_paths = []
+        self.travel_times = []
+
+    def save_phonon_data(self, ph, flight, k_vector, d_k_vector):
+        """Record mode properties of the phonon and free paths between boundary scattering events"""
+        self.frequencies.append(ph.f)
+        self.speeds.append(ph.speed)
+        self.wavevectors.append(k_vector)
+        self.wavevector_steps.append(d_k_vector)
+        self.total_free_paths.append(sum(flight.free_paths))
+        self.numbers_of_free_paths.append(len(flight.free_paths))
+        self.free_paths.append(list(flight.free_paths))
+        self.travel_times.append(flight.travel_time)
+
+    def number_of_internal_scatterings(self, internal_mean_free_paths):
+        """Expected number of internal scattering events along the recorded boundary free paths"""
+        return np.array([number_of_internal_scatterings(free_paths, internal_mean_free_path)
+                         for free_paths, internal_mean_free_path in zip(self.free_paths, internal_mean_free_paths)])
+
+    def calculate_thermal_conductivity(self, temperatures):
+        """Calculate the thermal conductivity at each temperature by reweighting the traced phonons"""
+        frequencies = np.array(self.frequencies)
+        speeds = np.array(self.speeds)
+        total_free_paths = np.array(self.total_free_paths)
+        numbers_of_free_paths = np.array(self.numbers_of_free_paths)
+        density = np.array(self.wavevectors)**2 * np.array(self.wavevector_steps) / (6 * pi**2)
+        self.temperatures = np.array(temperatures, dtype=float)
+        self.thermal_conductivity = np.zeros(len(temperatures))
+        self.boundary_thermal_conductivity = np.zeros(len(temperatures))
+        self.internal_share = np.zeros(len(temperatures))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            boundary_mean_free_paths = np.nan_to_num(total_free_paths / numbers_of_free_paths)
+
+        for index, temp in enumerate(temperatures):
+            material = get_material(cf.media, temp)
+            if cf.use_gray_approximation_mfp:
+                internal_mean_free_paths = np.full(len(frequencies), cf.gray_approximation_mfp)
+            else:
+                internal_mean_free_paths = speeds * material.relaxation_time(2 * pi * frequencies)
+
+            # Each internal scattering event splits one free path into two:
+            internal_scatterings = self.number_of_internal_scatterings(internal_mean_free_paths)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean_free_paths = np.nan_to_num(total_free_paths / (numbers_of_free_paths + internal_scatterings))
+                internal_fractions = np.nan_to_num(internal_scatterings / (numbers_of_free_paths + internal_scatterings))
+
+            # Thermal conductivity, Ref. Phys. Rev. 132 2461 (1963):
+            weights = heat_capacity(frequencies, temp) * speeds * density
+            contributions = weights * mean_free_paths
+            self.thermal_conductivity[index] = np.sum(contributions)
+            self.boundary_thermal_conductivity[index] = np.sum(weights * boundary_mean_free_paths)
+            if np.sum(contributions) > 0:
+                self.internal_share[index] = np.sum(contributions * internal_fractions) / np.sum(contributions)
+
+    def write_into_files(self):
+        """Write the thermal conductivity at various temperatures into a file"""
+        data = np.vstack((self.temperatures, self.thermal_conductivity, self.boundary_thermal_conductivity, self.internal_share)).T
+        header = "T (K), K (W/mK), K boundary only (W/mK), Share of internal scattering"
+        np.savetxt("Data/Thermal conductivity vs temperature.csv", data, fmt='%1.3e', delimiter=",", header=header, encoding='utf-8')
@@ -0,0 +1,71 @@
+"""
+Module that detects phonons which cannot reach the cold side anymore,
+i.e. phonons that escaped the structure, got inside an obstacle, or do not progress along the structure.
+Such phonons are terminated early instead of running until the end of the simulation.
+"""
+
+import enum
+
+from freepaths.config import cf
+
+
+class Termination(enum.Enum):
+    """Reasons of early termination of a phonon"""
+    OUT_OF_DOMAIN = 0
+    INSIDE_OBSTACLE = 1
+    NOT_PROGRESSING = 2
+
+
+class TerminationCheck:
+    """Checks of the phonon state which run periodically during the phonon flight"""
+
+    def __init__(self, ph, hole_index):
+        """Initialize the window in which the progress of the phonon is tracked"""
+        self.hole_index = hole_index
+        self.is_along_x = cf.cold_side_position_right or cf.cold_side_position_left
+        self.is_along_y = not self.is_along_x or cf.cold_side_position_top or cf.cold_side_position_bottom
+        self.start_window(ph)
+
+    def start_window(self, ph):
+        """Start tracking the range of coordinates along the transport direction"""
+        self.x_min = self.x_max = ph.x
+        self.y_min = self.y_max = ph.y
+
+    def update(self, ph):
+        """Extend the range of coordinates visited in the current window"""
+        if self.is_along_y:
+            if ph.y < self.y_min:
+                self.y_min = ph.y
+            elif ph.y > self.y_max:
+                self.y_max = ph.y
+        if self.is_along_x:
+            if ph.x < self.x_min:
+                self.x_min = ph.x
+            elif ph.x > self.x_max:
+                self.x_max = ph.x
+
+    def is_out_of_domain(self, ph, margin):
+        """Check if the phonon left the box of the structure"""
+        is_outside_x = abs(ph.x) > cf.width / 2 + margin
+        is_outside_y = ph.y < -margin or ph.y > cf.length + margin
+        is_outside_z = ph.z < -cf.thickness / 2 - margin or (ph.z > cf.thickness / 2 + margin and not cf.pillars)
+        return is_outside_x or is_outside_y or (is_outside_z and not cf.is_two_dimensional_material)
+
+    def is_not_progressing(self, margin):
+        """Check if the phonon did not move along the transport direction during the whole window"""
+        is_stuck_along_y = not self.is_along_y or self.y_max - self.y_min < margin
+        is_stuck_along_x = not self.is_along_x or self.x_max - self.x_min < margin
+        return is_stuck_along_y and is_stuck_along_x
+
+    def check(self, ph):
+        """Return the reason to terminate the phonon at the end of the window or None if it is fine"""
+        margin = ph.speed * cf.timestep
+        reason = None
+        if self.is_out_of_domain(ph, 2 * margin):
+            reason = Termination.OUT_OF_DOMAIN
+        elif any(hole.is_inside(ph.x, ph.y, ph.z, cf) for hole in self.hole_index.holes_near(ph.x, ph.y)):
+            reason = Termination.INSIDE_OBSTACLE
+        elif self.is_not_progressing(margin):
+            reason = Termination.NOT_PROGRESSING
+        self.start_window(ph)
+        return reason
@@ -24,6 +24,7 @@ setuptools.setup(
         ]
     },
     install_requires=['numpy', 'matplotlib', 'scipy', 'imageio', 'colorama'],
+    extras_require={'hdf5': ['h5py'], 'gds': ['gdstk']},
     version=version,
     python_requires='~=3.11',
     classifiers=[
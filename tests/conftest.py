@@ -0,0 +1,6 @@
+"""Configuration of the tests"""
+
+import sys
+
+# Config parses the command line when it is imported, so the tests run with the default configuration:
+sys.argv = sys.argv[:1]
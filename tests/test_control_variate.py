@@ -0,0 +1,75 @@
+"""Tests of the control variate estimator of the thermal conductivity"""
+
+import random
+import numpy as np
+import pytest
+
+from freepaths.config import cf
+from freepaths.sources import Source, Distributions
+from freepaths.materials import get_material
+from freepaths.phonon import Phonon
+from freepaths.flight import Flight
+from freepaths.run_phonon import run_phonon
+from freepaths.step_kernel import StepKernel
+from freepaths.data import ScatteringData, SegmentData, TriangleScatteringData
+from freepaths.maps import ScatteringMap, ThermalMaps
+from freepaths.control_variate import ControlVariate
+
+
+def synthetic_phonons(rng, number_of_phonons=2000, number_of_timeframes=4):
+    """Heat fluxes and temperature gradients of phonons in each timeframe, which correlate with their references"""
+    references = rng.exponential(1.0, number_of_phonons)
+    heat_fluxes = references[:, None] + rng.normal(0, 0.3, (number_of_phonons, number_of_timeframes))
+    temperature_gradients = rng.normal(0.01, 0.003, (number_of_phonons, number_of_timeframes))
+    return heat_fluxes, temperature_gradients, references
+
+
+def test_correction_reduces_variance():
+    """Corrected conductivity varies less between simulations, and the errors agree with the spread of timeframes"""
+    rng = np.random.default_rng(0)
+    uncorrected, corrected, frames, errors, uncorrected_errors = [], [], [], [], []
+    for _ in range(200):
+        heat_fluxes, temperature_gradients, references = synthetic_phonons(rng)
+        thermal_conductivities = np.sum(heat_fluxes, axis=0) / np.sum(temperature_gradients, axis=0)
+        value, error, uncorrected_error, correlation = ControlVariate.correct(heat_fluxes, temperature_gradients, references, 1.0)
+        uncorrected.append(np.mean(thermal_conductivities))
+        frames.append(thermal_conductivities[0])
+        corrected.append(value)
+        errors.append(error)
+        uncorrected_errors.append(uncorrected_error)
+
+    assert correlation > 0.5
+    assert np.mean(corrected) == pytest.approx(np.mean(uncorrected), rel=0.01)
+    assert np.std(corrected) < 0.5 * np.std(uncorrected)
+    assert np.mean(errors) < 0.5 * np.mean(uncorrected_errors)
+    assert np.mean(uncorrected_errors) == pytest.approx(np.std(frames), rel=0.2)
+
+
+def test_phonon_contributions_add_up_to_thermal_conductivity(monkeypatch):
+    """Heat fluxes and temperature gradients of individual phonons give the conductivity of each timeframe in the maps"""
+    source = Source(size_x=200e-9, size_z=100e-9)
+    source.angle_distribution = Distributions.LAMBERT
+    parameters = {
+        'width': 200e-9, 'length': 300e-9, 'thickness': 1e-3, 'periodic_sidewalls': True, 'phonon_sources': [source],
+        'timestep': 1e-12, 'number_of_timesteps': 4000, 'number_of_virtual_timesteps': 4000,
+        'number_of_timeframes': 8, 'number_of_stabilization_timeframes': 4,
+        'number_of_pixels_x': 5, 'number_of_pixels_y': 15, 'control_variate_reference': 'kinetic',
+        'use_gray_approximation_mfp': False, 'output_path_animation': False,
+    }
+    for name, value in parameters.items():
+        monkeypatch.setattr(cf, name, value)
+    random.seed(0)
+
+    material = get_material(cf.media, cf.temp)
+    kernel = StepKernel()
+    thermal_maps, control_variate = ThermalMaps(), ControlVariate()
+    for _ in range(300):
+        phonon = Phonon(material)
+        run_phonon(phonon, Flight(phonon), ScatteringData(), TriangleScatteringData(), SegmentData(), thermal_maps, ScatteringMap(), material, kernel)
+        control_variate.save_phonon_data(phonon, thermal_maps, material)
+    thermal_maps.calculate_thermal_conductivity()
+
+    heat_flux = np.sum(control_variate.heat_fluxes_effective, axis=0)
+    temperature_gradient = np.sum(control_variate.temperature_gradients, axis=0)
+    steady = slice(cf.number_of_stabilization_timeframes, cf.number_of_timeframes)
+    assert heat_flux / temperature_gradient == pytest.approx(thermal_maps.effective_thermal_conductivity[steady, 1])
@@ -0,0 +1,88 @@
+"""Tests of the deviational mode against the standard tracer"""
+
+import random
+import numpy as np
+import pytest
+
+from freepaths.config import cf
+from freepaths.sources import Source, Distributions
+from freepaths.materials import get_material
+from freepaths.phonon import Phonon
+from freepaths.flight import Flight
+from freepaths.run_phonon import run_phonon
+from freepaths.step_kernel import StepKernel
+from freepaths.data import ScatteringData, SegmentData, TriangleScatteringData
+from freepaths.maps import ScatteringMap, ThermalMaps
+from freepaths.deviational import DeviationalSampler, DeviationalPhonon, DeviationalThermalMaps, absorbing_hot_sides
+
+TEMPERATURE_DIFFERENCE = 10
+
+
+@pytest.fixture
+def film(monkeypatch):
+    """Wide film with a hot side at the bottom, which emits phonons with the Lambert distribution"""
+    source = Source(size_x=200e-9, size_z=100e-9)
+    source.angle_distribution = Distributions.LAMBERT
+    parameters = {
+        'width': 200e-9, 'length': 300e-9, 'thickness': 1e-3, 'periodic_sidewalls': True,
+        'phonon_sources': [source], 'temperature_difference': TEMPERATURE_DIFFERENCE,
+        'timestep': 1e-12, 'number_of_timesteps': 4000, 'number_of_virtual_timesteps': 4000,
+        'number_of_timeframes': 8, 'number_of_stabilization_timeframes': 4,
+        'number_of_pixels_x': 5, 'number_of_pixels_y': 15,
+        'use_gray_approximation_mfp': False, 'output_path_animation': False,
+    }
+    for name, value in parameters.items():
+        monkeypatch.setattr(cf, name, value)
+    random.seed(0)
+    return monkeypatch
+
+
+def trace(create_phonon, thermal_maps, number_of_phonons):
+    """Run phonons through the film and calculate the thermal conductivity from the maps"""
+    material = get_material(cf.media, cf.temp)
+    kernel = StepKernel()
+    scatter_stats, places_stats, segment_stats, scatter_maps = ScatteringData(), TriangleScatteringData(), SegmentData(), ScatteringMap()
+    for _ in range(number_of_phonons):
+        phonon = create_phonon(material)
+        run_phonon(phonon, Flight(phonon), scatter_stats, places_stats, segment_stats, thermal_maps, scatter_maps, material, kernel)
+    thermal_maps.calculate_thermal_conductivity()
+    return thermal_maps
+
+
+def trace_deviational(monkeypatch, number_of_phonons):
+    """Run deviational particles, which are absorbed by the hot side"""
+    monkeypatch.setattr(cf, 'number_of_phonons', number_of_phonons)
+    sampler = DeviationalSampler(get_material(cf.media, cf.temp))
+    for name, value in absorbing_hot_sides().items():
+        monkeypatch.setattr(cf, name, value)
+    return trace(lambda material: DeviationalPhonon(material, sampler), DeviationalThermalMaps(), number_of_phonons), sampler
+
+
+def test_ballistic_particles_carry_emitted_flux(film):
+    """
+    Without internal scattering, the heat flux is the one emitted by the hot side and the film is at about half of its temperature.
+    Grazing particles stay in the film longer than the simulated time, so the temperature approaches the half from below.
+    """
+    film.setattr(cf, 'include_internal_scattering', False)
+    thermal_maps, sampler = trace_deviational(film, 3000)
+    steady = slice(cf.number_of_stabilization_timeframes, cf.number_of_timeframes)
+    heat_flux = np.mean(thermal_maps.effective_heat_flux_profile_y[:, steady])
+    temperature = np.mean(thermal_maps.temperature_profile_y[:, steady])
+    assert heat_flux == pytest.approx(sampler.emitted_flux * TEMPERATURE_DIFFERENCE, rel=0.1)
+    assert 0.3 * TEMPERATURE_DIFFERENCE < temperature < 0.55 * TEMPERATURE_DIFFERENCE
+
+
+def test_deviational_mode_agrees_with_standard_tracer(film):
+    """
+    Thermal conductivity in both modes should agree within the difference of their models, i.e. the spectrum
+    of emitted phonons, the heat capacity used for temperature, and the hot side, which absorbs deviational particles
+    """
+    standard_maps = trace(lambda material: Phonon(material), ThermalMaps(), 1000)
+    deviational_maps, _ = trace_deviational(film, 3000)
+    standard = standard_maps.av_effective_thermal_conductivity
+    deviational = deviational_maps.av_effective_thermal_conductivity
+    assert deviational == pytest.approx(standard, rel=0.25)
+
+    # Deviational particles do not accumulate at the hot side, so the temperature stays within the applied difference:
+    steady = slice(cf.number_of_stabilization_timeframes, cf.number_of_timeframes)
+    assert np.max(np.mean(deviational_maps.temperature_profile_y[:, steady], axis=1)) < TEMPERATURE_DIFFERENCE
@@ -0,0 +1,44 @@
+"""Tests of the thick line holes made of segments"""
+
+import numpy as np
+
+from freepaths.scatterers import PointLineHole
+
+
+def circles_contain(points, thickness, x, y):
+    """Check which of the coordinates are inside the circles of given thickness around the points"""
+    distances = np.hypot(x[:, np.newaxis] - points[:, 0], y[:, np.newaxis] - points[:, 1])
+    return np.min(distances, axis=1) < thickness / 2
+
+
+def test_points_spaced_close_to_thickness_remain_circles():
+    """Points slightly closer than the thickness should not be bridged by a line"""
+    thickness = 100e-9
+    points = [(0.9 * thickness * number, 0) for number in range(5)]
+    hole = PointLineHole(points=points, thickness=thickness)
+
+    # Point between two circles, outside of both of them:
+    assert not hole.is_inside(0.45 * thickness, 0.3 * thickness, 0, None)
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-thickness, 4.6 * thickness, 10000)
+    y = rng.uniform(-thickness, thickness, 10000)
+    expected = circles_contain(np.array(points), thickness, x, y)
+    assert np.array_equal(hole.is_inside_array(x, y, None), expected)
+    assert all(hole.is_inside(x_i, y_i, 0, None) == is_inside for x_i, y_i, is_inside in zip(x, y, expected))
+
+
+def test_dense_points_form_a_line():
+    """Densely sampled points should form a line that deviates from the circles by at most 1% of the thickness"""
+    thickness = 100e-9
+    angles = np.linspace(0, np.pi, 200)
+    points = np.column_stack((1e-6 * np.cos(angles), 1e-6 * np.sin(angles)))
+    hole = PointLineHole(points=points, thickness=thickness)
+    assert len(hole.segments) < len(points) - 1
+
+    rng = np.random.default_rng(1)
+    x = rng.uniform(-1.1e-6, 1.1e-6, 20000)
+    y = rng.uniform(-0.1e-6, 1.1e-6, 20000)
+    circle_distances = np.min(np.hypot(x[:, np.newaxis] - points[:, 0], y[:, np.newaxis] - points[:, 1]), axis=1)
+    is_different = hole.is_inside_array(x, y, None) != circles_contain(points, thickness, x, y)
+    assert np.all(np.abs(circle_distances[is_different] - thickness / 2) < 0.02 * thickness)